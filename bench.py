@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Micro-benchmarks for the converter, run with:
+#   python3 bench.py [-n <count>] [benchmark ...]
+# Without any benchmark name, all of them are run.
+
+import sys, os, getopt
+import time
+import tracemalloc
+import subprocess, tempfile, statistics
+
+import docxWriter
+import xml2docx
+
+def measure(function, *args):
+	# Returns (elapsed seconds, allocated blocks, peak bytes) for one call of function
+	tracemalloc.start()
+	before = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+	start = time.perf_counter()
+	function(*args)
+	elapsed = time.perf_counter() - start
+	after = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return elapsed, after - before, peak
+
+def report(label, elapsed, blocks, peak):
+	print(f'\t{label:<24} {elapsed * 1000:10.1f} ms {blocks:10d} live blocks {peak / 1024 / 1024:8.1f} MB peak')
+
+def _writeParagraphs(writer, count):
+	# Mimic the mix of paragraphs of a draft: body text, bullets, headings and artwork
+	for i in range(count):
+		if i % 10 == 0:
+			writer.newParagraph('Section ' + str(i), 'Heading' + str(1 + i % 3), unnumbered = (i % 20 == 0))
+		elif i % 5 == 0:
+			writer.newParagraph('Bullet item ' + str(i), style = 'ListParagraph', numberingID = '2', indentationLevel = '0')
+		elif i % 7 == 0:
+			writer.newParagraph('  +--- ' + str(i) + ' ---+', style = 'Code', removeEmpty = False, language = None, cdataSection = True)
+		else:
+			writer.newParagraph('Lorem ipsum dolor sit amet, paragraph number ' + str(i) + '.')
+	writer.docxRoot.toprettyxml()
+
+def benchFlyweight(count):
+	print(f'Paragraph property blocks, {count} paragraphs built and serialized:')
+	for shared in (False, True):
+		writer = docxWriter.docxWriter()
+		writer.sharedProperties = shared
+		report('shared pPr/rPr' if shared else 'fresh pPr/rPr', *measure(_writeParagraphs, writer, count))
+
+def syntheticDraft(sections, paragraphs = 20, artworkLines = 10):
+	# A draft made of <sections> top-level sections, each one with text, a list, a figure and a subsection
+	parts = ['<?xml version="1.0" encoding="utf-8"?>\n<rfc category="info" docName="draft-bench-00">\n<front><title>Benchmark</title>',
+		'<author fullname="A. Bench"><organization>Bench</organization></author><date day="1" month="January" year="2026"/>',
+		'<abstract><t>Synthetic draft.</t></abstract></front>\n<middle>\n']
+	for section in range(sections):
+		parts.append(f'<section anchor="section-{section}" title="Section {section}">\n')
+		for paragraph in range(paragraphs):
+			parts.append(f'<t>Paragraph {paragraph} of section {section}: the implementation <bcp14>MUST</bcp14> follow <xref target="section-0"/> and the text goes on.</t>\n')
+		parts.append('<ul><li>First item</li><li>Second item</li></ul>\n')
+		parts.append(f'<figure><name>Figure of section {section}</name><artwork type="ascii-art"><![CDATA[\n')
+		for line in range(artworkLines):
+			parts.append(f'  +-------+   line {line}   +-------+\n')
+		parts.append(']]></artwork></figure>\n')
+		parts.append(f'<section title="Details {section}"><t>Some details.</t></section>\n</section>\n')
+	parts.append('</middle>\n<back>\n<section title="Appendix"><figure><artwork>+--+</artwork></figure><t>The end.</t></section>\n</back>\n</rfc>\n')
+	return ''.join(parts).encode('utf-8')
+
+def _documentXML(docx):
+	import zipfile, io
+	with zipfile.ZipFile(io.BytesIO(docx)) as package:
+		return package.read('word/document.xml')
+
+def benchParallel(count):
+	sections = max(count // 50, 1)
+	draft = syntheticDraft(sections)
+	print(f'Section-parallel rendering of {sections} sections ({len(draft) // 1024} KB), {os.cpu_count()} CPU(s):')
+	for outputFormat in ('docx', 'md'):
+		serial = None
+		for jobs in sorted({1, 2, 4, os.cpu_count() or 1}):
+			start = time.perf_counter()
+			output = xml2docx.convert(draft, outputFormat, jobs = jobs)
+			elapsed = time.perf_counter() - start
+			if outputFormat == 'docx':
+				output = _documentXML(output)
+			if serial is None:
+				serial, serialElapsed = output, elapsed
+			print(f'\t{outputFormat:<5} {jobs:3d} job(s) {elapsed * 1000:10.1f} ms  speedup {serialElapsed / elapsed:5.2f}  ' + ('identical' if output == serial else 'DIFFERENT'))
+
+def benchArtwork(count):
+	# Figures rendered as one paragraph per line or as one paragraph with line breaks
+	sections = max(count // 100, 1)
+	draft = syntheticDraft(sections, paragraphs = 2, artworkLines = 150)
+	print(f'ASCII artwork of {sections} figures of 150 lines:')
+	xml2docx.convert(minimalDraft.encode('utf-8'))  # The template is loaded once, before measuring
+	for lineBreaks in (False, True):
+		docxWriter.docxWriter.artworkLineBreaks = lineBreaks
+		elapsed = None
+		for run in range(3):  # Best of 3, the garbage collector adds a lot of noise
+			start = time.perf_counter()
+			docx = xml2docx.convert(draft)
+			elapsed = min(time.perf_counter() - start, elapsed or float('inf'))
+		documentXML = _documentXML(docx)
+		from xml.dom import minidom
+		nodes = minidom.parseString(documentXML).getElementsByTagName('*').length
+		print(f'\t{"line breaks" if lineBreaks else "paragraph per line":<20} {elapsed * 1000:10.1f} ms {nodes:10d} elements {len(documentXML) / 1024:10.1f} KB document.xml {len(docx) / 1024:8.1f} KB docx')
+	docxWriter.docxWriter.artworkLineBreaks = True
+
+def _pathologicalElement(tag, count):
+	# Element with <count> children: CDATA chunks for artwork, inline elements for text
+	from xml.dom import minidom
+	if tag == 'artwork':
+		inner = ''.join(f'line {i} +--+ <![CDATA[|chunk {i}|]]>\n' for i in range(count))
+	else:
+		inner = ''.join(f'word {i} <bcp14>MUST</bcp14> <xref target="s{i}"/> ' for i in range(count))
+	return minidom.parseString(f'<{tag}>{inner}</{tag}>').documentElement
+
+def _parseArtwork(elem):
+	# The rows are only split when iterated over, as a writer does
+	figure = xml2docx.figureFigure()
+	xml2docx.parseArtWork(elem, figure)
+	for row in figure.rows:
+		pass
+
+def benchTextJoin(count):
+	# Time per child node must stay flat when the element grows if the text accumulation is linear
+	print(f'Text accumulation on pathological elements, time per child node:')
+	handlers = {
+		'artwork': _parseArtwork,
+		't': lambda elem: xml2docx.parseText(elem),
+		'li': lambda elem: xml2docx.parseListItem(elem),
+	}
+	xml2docx.writer = xml2docx.xmlWriter()  # Null writer, only the parsing is measured
+	for tag, handler in handlers.items():
+		line = []
+		for size in (count, count * 4, count * 16):
+			elem = _pathologicalElement(tag, size)
+			children = elem.childNodes.length
+			start = time.perf_counter()
+			handler(elem)
+			elapsed = time.perf_counter() - start
+			line.append(f'{children:8d} nodes {elapsed / children * 1e6:6.2f} us')
+		print(f'\t{tag:<8}' + '  '.join(line))
+
+minimalDraft = '''<?xml version="1.0" encoding="utf-8"?>
+<rfc><front><title>Startup</title></front>
+<middle><section title="Introduction"><t>Hello.</t></section></middle>
+<back/></rfc>
+'''
+
+def benchStartup(count):
+	# Cold start of one CLI conversion of a minimal draft as done by process.php, using python -X importtime
+	runs = 10
+	script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xml2docx.py')
+	print(f'Startup of xml2docx.py, median of {runs} runs:')
+	with tempfile.TemporaryDirectory() as directory:
+		inFilename = os.path.join(directory, 'draft.xml')
+		with open(inFilename, 'w', encoding='utf-8') as f:
+			f.write(minimalDraft)
+		for outputOption in ('--docx', '--md'):
+			elapsed = []
+			for run in range(runs):
+				start = time.perf_counter()
+				result = subprocess.run([sys.executable, '-X', 'importtime', script, '-i', inFilename,
+					outputOption, os.path.join(directory, 'output'), '-o', os.path.join(directory, 'document.xml')],
+					capture_output = True, text = True, check = True)
+				elapsed.append(time.perf_counter() - start)
+			# Lines are 'import time: <self us> | <cumulative us> | <indented module name>'
+			imports = []
+			for line in result.stderr.splitlines():
+				if line.startswith('import time:') and not line.endswith('imported package'):
+					fields = line[len('import time:'):].split('|')
+					if fields[0].strip().isdigit():
+						imports.append((int(fields[0]), int(fields[1]), fields[2].rstrip()))
+			selfTotal = sum(selfTime for selfTime, cumulative, name in imports)
+			loads = sum(1 for selfTime, cumulative, name in imports if name.strip() == 'xml2docx')
+			print(f'\t{outputOption:<8} {statistics.median(elapsed) * 1000:8.1f} ms wall, {selfTotal / 1000:6.1f} ms in {len(imports)} imports, xml2docx loaded {loads + 1} time(s)')
+			for selfTime, cumulative, name in sorted(imports, key = lambda entry: entry[1], reverse = True)[0:5]:
+				if not name.startswith('  '):  # Only the top level imports
+					print(f'\t\t{cumulative / 1000:6.1f} ms {name.strip()}')
+
+benchmarks = {
+	'flyweight': benchFlyweight,
+	'artwork': benchArtwork,
+	'startup': benchStartup,
+	'parallel': benchParallel,
+	'textjoin': benchTextJoin,
+}
+
+if __name__ == '__main__':
+	count = 5000
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hn:")
+	except getopt.GetoptError:
+		print('bench.py [-n <count>] [' + '|'.join(benchmarks) + ' ...]')
+		sys.exit(2)
+	for opt, arg in opts:
+		if opt == '-h':
+			print('bench.py [-n <count>] [' + '|'.join(benchmarks) + ' ...]')
+			sys.exit()
+		elif opt == '-n':
+			count = int(arg)
+	for name in args if args else benchmarks:
+		if name not in benchmarks:
+			print('Unknown benchmark: ' + name)
+			sys.exit(2)
+		benchmarks[name](count)
@@ -0,0 +1,346 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Tracked changes between two revisions of a draft, both rendered by docxWriter
+# The w:body children (paragraphs and tables) of both revisions are hashed and diffed as sequences (patience diff),
+# only the changed blocks are then paired and diffed word by word, so most of a large draft is never looked at twice.
+# See http://officeopenxml.com/WPtrackingChanges.php for the w:ins and w:del revision marks
+
+import bisect, difflib, hashlib, re, logging
+import xml.dom
+
+logger = logging.getLogger('xml2docx.docxDiff')
+
+# The bookmark, hyperlink anchor and drawing ids are numbered in document order, they all shift after an insertion
+_numberedIds = re.compile(r'(\bid="|_Ref)\d+')
+
+def _blockHash(block):
+    return hashlib.blake2b(_numberedIds.sub(r'\1', block.toxml()).encode('utf-8'), digest_size = 16).digest()
+
+def _blockText(block):
+    return ''.join(node.data for t in block.getElementsByTagName('w:t') for node in t.childNodes)
+
+def _patienceOpcodes(old, new):
+    # Same opcodes as difflib.SequenceMatcher.get_opcodes(), by patience diff: the blocks found once in both
+    # revisions anchor the longest common subsequence, then the regions between anchors are diffed the same way.
+    # Every region costs about its length, so a 300-page draft stays linear-ish; a region without any unique
+    # block left is a single replace
+    matches = []  # (old index, new index) of the equal blocks, in order
+    tasks = [(0, len(old), 0, len(new))]  # A region, or a match when a single (old index, new index) pair
+    while tasks:
+        task = tasks.pop()
+        if len(task) == 2:
+            matches.append(task)
+            continue
+        oldLo, oldHi, newLo, newHi = task
+        while oldLo < oldHi and newLo < newHi and old[oldLo] == new[newLo]:
+            matches.append((oldLo, newLo))
+            oldLo, newLo = oldLo + 1, newLo + 1
+        tail = []
+        while oldLo < oldHi and newLo < newHi and old[oldHi - 1] == new[newHi - 1]:
+            oldHi, newHi = oldHi - 1, newHi - 1
+            tail.append((oldHi, newHi))
+        anchors = _uniqueAnchors(old, new, oldLo, oldHi, newLo, newHi)
+        # Pushed in reverse order: the tail, the last region, the last anchor, ..., the first region
+        tasks.extend(tail)
+        bounds = [(oldLo - 1, newLo - 1)] + anchors + [(oldHi, newHi)]
+        for k in range(len(bounds) - 1, 0, -1):
+            if anchors:
+                tasks.append((bounds[k - 1][0] + 1, bounds[k][0], bounds[k - 1][1] + 1, bounds[k][1]))
+            if k > 1:
+                tasks.append(bounds[k - 1])
+    opcodes = []
+    oldStart = newStart = 0
+    for oldIndex, newIndex in matches + [(len(old), len(new))]:
+        if oldIndex > oldStart or newIndex > newStart:
+            operation = 'replace' if oldIndex > oldStart and newIndex > newStart else ('delete' if oldIndex > oldStart else 'insert')
+            opcodes.append((operation, oldStart, oldIndex, newStart, newIndex))
+        if oldIndex < len(old):
+            if opcodes and opcodes[-1][0] == 'equal':
+                opcodes[-1] = ('equal', opcodes[-1][1], oldIndex + 1, opcodes[-1][3], newIndex + 1)
+            else:
+                opcodes.append(('equal', oldIndex, oldIndex + 1, newIndex, newIndex + 1))
+        oldStart, newStart = oldIndex + 1, newIndex + 1
+    return opcodes
+
+def _uniqueAnchors(old, new, oldLo, oldHi, newLo, newHi):
+    # The longest increasing sequence of the (old index, new index) pairs of the blocks found once on each side
+    oldCounts = {}
+    for index in range(oldLo, oldHi):
+        oldCounts[old[index]] = index if old[index] not in oldCounts else None
+    newCounts = {}
+    for index in range(newLo, newHi):
+        newCounts[new[index]] = index if new[index] not in newCounts else None
+    pairs = [(oldIndex, newCounts[value]) for value, oldIndex in oldCounts.items()
+        if oldIndex is not None and newCounts.get(value) is not None]
+    pairs.sort(key = lambda pair: pair[1])
+    # Patience sorting: piles of decreasing old indexes, each card linked to the top of the previous pile
+    tops = []
+    piles = []
+    links = {}
+    for pair in pairs:
+        pile = bisect.bisect_left(tops, pair[0])
+        links[pair] = piles[pile - 1] if pile > 0 else None
+        if pile == len(tops):
+            tops.append(pair[0])
+            piles.append(pair)
+        else:
+            tops[pile] = pair[0]
+            piles[pile] = pair
+    anchors = []
+    pair = piles[-1] if piles else None
+    while pair is not None:
+        anchors.append(pair)
+        pair = links[pair]
+    return anchors[::-1]
+
+pairWindow = 8  # Blocks looked ahead on each side for the most similar one, when pairing replaced blocks
+
+def _similarity(matcher, oldBlock, oldWords, newBlock, newWords):
+    if oldBlock.nodeName != newBlock.nodeName:
+        return 0
+    matcher.set_seqs(oldWords, newWords)
+    if matcher.real_quick_ratio() <= 0.5 or matcher.quick_ratio() <= 0.5:
+        return 0
+    return matcher.ratio()
+
+def _pairBlocks(oldBlocks, newBlocks):
+    # [(old, new)] for a replaced region, None on one side for a deleted or inserted block.
+    # In document order, a block is paired with the most similar one (ratio over 0.5, else it is rather deleted
+    # and inserted) among the next pairWindow blocks of the other side, so the cost is linear in the region.
+    # A block moved further away than pairWindow, or a region rewritten from end to end, is deleted and inserted.
+    oldWords = [_words(_blockText(block)) for block in oldBlocks]
+    newWords = [_words(_blockText(block)) for block in newBlocks]
+    matcher = difflib.SequenceMatcher(None, autojunk = False)
+    pairs = []
+    oldIndex = newIndex = 0
+    while oldIndex < len(oldBlocks) and newIndex < len(newBlocks):
+        best = (0.5, None, None)
+        for oldNext in range(oldIndex, min(oldIndex + pairWindow, len(oldBlocks))):
+            ratio = _similarity(matcher, oldBlocks[oldNext], oldWords[oldNext], newBlocks[newIndex], newWords[newIndex])
+            if ratio > best[0]:
+                best = (ratio, oldNext, newIndex)
+        for newNext in range(newIndex + 1, min(newIndex + pairWindow, len(newBlocks))):
+            ratio = _similarity(matcher, oldBlocks[oldIndex], oldWords[oldIndex], newBlocks[newNext], newWords[newNext])
+            if ratio > best[0]:
+                best = (ratio, oldIndex, newNext)
+        ratio, oldPaired, newPaired = best
+        if oldPaired is None:
+            pairs.extend([(oldBlocks[oldIndex], None), (None, newBlocks[newIndex])])
+            oldIndex, newIndex = oldIndex + 1, newIndex + 1
+            continue
+        pairs.extend((block, None) for block in oldBlocks[oldIndex:oldPaired])
+        pairs.extend((None, block) for block in newBlocks[newIndex:newPaired])
+        pairs.append((oldBlocks[oldPaired], newBlocks[newPaired]))
+        oldIndex, newIndex = oldPaired + 1, newPaired + 1
+    pairs.extend((block, None) for block in oldBlocks[oldIndex:])
+    pairs.extend((None, block) for block in newBlocks[newIndex:])
+    return pairs
+
+def _words(text):
+    # Words and the spaces between them, so that joining the tokens gives back the text
+    return re.findall(r'\s+|\S+', text)
+
+class changeMarker:
+
+    def __init__(self, docxRoot, author, date, firstId):
+        self.docxRoot = docxRoot
+        self.author = author
+        self.date = date
+        self.nextId = firstId  # Revision ids must not collide with the bookmark ones
+
+    def newMark(self, kind):
+        # kind is 'w:ins' or 'w:del'
+        mark = self.docxRoot.createElement(kind)
+        mark.setAttribute('w:id', str(self.nextId))
+        mark.setAttribute('w:author', self.author)
+        mark.setAttribute('w:date', self.date)
+        self.nextId += 1
+        return mark
+
+    def markBlock(self, block, kind):
+        # The whole paragraph or table (already owned by docxRoot) is inserted or deleted
+        for bookmark in block.getElementsByTagName('w:bookmarkStart') + block.getElementsByTagName('w:bookmarkEnd'):
+            if kind == 'w:del':  # The bookmarks are in the new revision only
+                bookmark.parentNode.removeChild(bookmark)
+        for row in block.getElementsByTagName('w:tr'):
+            trPr = row.getElementsByTagName('w:trPr')
+            if trPr:
+                trPr = trPr[0]
+            else:
+                trPr = self.docxRoot.createElement('w:trPr')
+                row.insertBefore(trPr, row.firstChild)
+            trPr.appendChild(self.newMark(kind))
+        paragraphs = [block] if block.nodeName == 'w:p' else block.getElementsByTagName('w:p')
+        for paragraph in paragraphs:
+            self._markParagraphMark(paragraph, kind)
+        for run in block.getElementsByTagName('w:r'):
+            if kind == 'w:del':
+                for t in run.getElementsByTagName('w:t'):
+                    t.tagName = t.nodeName = 'w:delText'
+            mark = self.newMark(kind)
+            run.parentNode.replaceChild(mark, run)
+            mark.appendChild(run)
+        return block
+
+    def _markParagraphMark(self, paragraph, kind):
+        #   <w:pPr>...<w:rPr><w:ins w:id=... /></w:rPr></w:pPr>
+        pPr = paragraph.getElementsByTagName('w:pPr')
+        if pPr:
+            pPr = pPr[0]
+        else:
+            pPr = self.docxRoot.createElement('w:pPr')
+            paragraph.insertBefore(pPr, paragraph.firstChild)
+        rPr = self.docxRoot.createElement('w:rPr')
+        rPr.appendChild(self.newMark(kind))
+        pPr.appendChild(rPr)
+
+    def markWords(self, oldParagraph, newParagraph):
+        # Returns newParagraph with word-level w:ins/w:del, or None when the paragraphs are too different to be
+        # compared word by word (other paragraph properties, runs with more than text...)
+        oldTokens = _paragraphTokens(oldParagraph)
+        newTokens = _paragraphTokens(newParagraph)
+        if oldTokens is None or newTokens is None or _paragraphProperties(oldParagraph) != _paragraphProperties(newParagraph):
+            return None
+        matcher = difflib.SequenceMatcher(None, [token for token, run in oldTokens], [token for token, run in newTokens], autojunk = False)
+        if matcher.ratio() < 0.5:  # Mostly rewritten, a deleted and an inserted paragraph are easier to review
+            return None
+        paragraph = self.docxRoot.createElement('w:p')
+        for child in newParagraph.childNodes:
+            if child.nodeName in ('w:pPr', 'w:bookmarkStart'):
+                paragraph.appendChild(child.cloneNode(True))
+        for operation, oldStart, oldEnd, newStart, newEnd in matcher.get_opcodes():
+            if operation in ('delete', 'replace'):
+                self._appendTokens(paragraph, oldTokens[oldStart:oldEnd], 'w:del')
+            if operation in ('insert', 'replace'):
+                self._appendTokens(paragraph, newTokens[newStart:newEnd], 'w:ins')
+            if operation == 'equal':
+                self._appendTokens(paragraph, newTokens[newStart:newEnd], None)
+        for child in newParagraph.childNodes:
+            if child.nodeName == 'w:bookmarkEnd':
+                paragraph.appendChild(child.cloneNode(True))
+        return paragraph
+
+    def _appendTokens(self, paragraph, tokens, kind):
+        # Consecutive tokens of the same source run are written as one run, keeping its properties and hyperlink
+        start = 0
+        while start < len(tokens):
+            run = tokens[start][1]
+            end = start
+            while end < len(tokens) and tokens[end][1] is run:
+                end += 1
+            newRun = self.docxRoot.createElement('w:r')
+            for child in run.childNodes:
+                if child.nodeName == 'w:rPr':
+                    newRun.appendChild(self.docxRoot.importNode(child, True))
+            t = self.docxRoot.createElement('w:delText' if kind == 'w:del' else 'w:t')
+            t.setAttribute('xml:space', 'preserve')
+            t.appendChild(self.docxRoot.createTextNode(''.join(token for token, tokenRun in tokens[start:end])))
+            newRun.appendChild(t)
+            node = newRun
+            if kind is not None:
+                node = self.newMark(kind)
+                node.appendChild(newRun)
+            if run.parentNode.nodeName == 'w:hyperlink':
+                hyperlink = self.docxRoot.importNode(run.parentNode, False)
+                hyperlink.appendChild(node)
+                node = hyperlink
+            paragraph.appendChild(node)
+            start = end
+
+def _paragraphProperties(paragraph):
+    for child in paragraph.childNodes:
+        if child.nodeName == 'w:pPr':
+            return child.toxml()
+    return None
+
+def _paragraphTokens(paragraph):
+    # [(word, source run)] or None if the paragraph has anything else than runs of text, hyperlinks and bookmarks
+    tokens = []
+    for child in paragraph.childNodes:
+        if child.nodeName in ('w:pPr', 'w:bookmarkStart', 'w:bookmarkEnd'):
+            continue
+        if child.nodeName == 'w:hyperlink':
+            runs = child.childNodes
+        elif child.nodeName == 'w:r':
+            runs = [child]
+        else:
+            return None
+        for run in runs:
+            if run.nodeName != 'w:r':
+                return None
+            for element in run.childNodes:
+                if element.nodeName == 'w:t':
+                    tokens.extend((word, run) for word in _words(''.join(text.data for text in element.childNodes)))
+                elif element.nodeName != 'w:rPr':
+                    return None
+    return tokens
+
+def _renumberDrawings(block, writer):
+    # A deleted image needs a drawing id not used by the new revision
+    for inline in block.getElementsByTagName('wp:inline'):
+        writer.drawingIndex += 1
+        for element in inline.getElementsByTagName('wp:docPr') + inline.getElementsByTagName('pic:cNvPr'):
+            element.setAttribute('id', str(writer.drawingIndex))
+    return block
+
+def markChanges(oldWriter, newWriter, author = 'xml2docx', date = None):
+    # Replaces the body of newWriter by the new revision with the changes from oldWriter as tracked changes
+    # Both writers must have rendered their body as a DOM, i.e., without jobs, memory budget nor shared properties
+    if date is None:
+        date = newWriter.buildDate().strftime('%Y-%m-%dT%H:%M:%SZ')
+    docxRoot = newWriter.docxRoot
+    marker = changeMarker(docxRoot, author, date, len(newWriter.anchors) + 1)
+    oldBlocks = list(oldWriter.docxBody.childNodes)
+    newBlocks = list(newWriter.docxBody.childNodes)
+    for block in oldBlocks + newBlocks:
+        if block.nodeType != xml.dom.Node.ELEMENT_NODE:
+            raise ValueError('Tracked changes need both revisions rendered in memory')
+    if oldWriter.sharedProperties or newWriter.sharedProperties:
+        raise ValueError('Tracked changes need the paragraph and run properties of both revisions as DOM nodes')
+    oldHashes = [_blockHash(block) for block in oldBlocks]
+    newHashes = [_blockHash(block) for block in newBlocks]
+    body = newWriter.docxBody
+    changed = unchanged = 0
+    for operation, oldStart, oldEnd, newStart, newEnd in _patienceOpcodes(oldHashes, newHashes):
+        if operation == 'equal':
+            unchanged += newEnd - newStart
+            continue
+        # The deleted blocks go before the next block of the new revision, the first unchanged one at the latest
+        following = newBlocks[newEnd] if newEnd < len(newBlocks) else None
+        deleted = []
+        # Replaced blocks are paired by similarity, a paragraph edited in place gets word-level marks
+        for oldBlock, newBlock in _pairBlocks(oldBlocks[oldStart:oldEnd], newBlocks[newStart:newEnd]):
+            changed += 1
+            if oldBlock is not None:
+                deleted.append(oldBlock)
+            if newBlock is None:
+                continue
+            paragraph = None
+            if oldBlock is not None and oldBlock.nodeName == 'w:p' and newBlock.nodeName == 'w:p':
+                paragraph = marker.markWords(oldBlock, newBlock)
+            if paragraph is not None:
+                deleted.pop()
+            for oldBlock in deleted:
+                body.insertBefore(marker.markBlock(_renumberDrawings(docxRoot.importNode(oldBlock, True), newWriter), 'w:del'), newBlock)
+            deleted = []
+            if paragraph is not None:
+                body.replaceChild(paragraph, newBlock)
+            else:
+                marker.markBlock(newBlock, 'w:ins')
+        for oldBlock in deleted:
+            body.insertBefore(marker.markBlock(_renumberDrawings(docxRoot.importNode(oldBlock, True), newWriter), 'w:del'), following)
+    for digest, image in oldWriter.media.items():  # The deleted images are still shown
+        newWriter.media.setdefault(digest, image)
+    logger.info('Tracked changes: %d changed block(s) out of %d, %d unchanged', changed, len(newBlocks), unchanged)
@@ -14,22 +14,121 @@
    
 # A lot of information in http://officeopenxml.com/anatomyofOOXML.php
 
-import zipfile, os, sys, io
-from xml2docx import xmlWriter, myParseDate
-from pprint import pprint
+import os, sys, io, re, logging
+from xmlWriter import xmlWriter, myParseDate, linkStart, splitLinks
+import templateRegistry
 #import xmlcore
-from xml.dom import minidom
 import xml.dom
-import datetime
+
+logger = logging.getLogger('xml2docx.docxWriter')
+
+class serializedNodes:
+    # w:body children already serialized by the docxWriter of a worker process, written as is
+    nodeType = xml.dom.Node.DOCUMENT_FRAGMENT_NODE
+
+    def __init__(self, text):
+        self.text = text
+
+    def writexml(self, writer, indent = '', addindent = '', newl = ''):
+        writer.write(self.text)
+
+class spooledNodes:
+    # w:body children already serialized into a temporary file to bound the memory, copied as is
+    nodeType = xml.dom.Node.DOCUMENT_FRAGMENT_NODE
+
+    def __init__(self, spool):
+        self.spool = spool
+
+    def writexml(self, writer, indent = '', addindent = '', newl = ''):
+        import shutil
+        self.spool.seek(0)
+        shutil.copyfileobj(self.spool, writer)
+
+class internedProperties:
+    # A w:pPr or w:rPr block built once per writer, serialized once per indentation
+    def __init__(self, element):
+        self.element = element
+        self.texts = {}
+
+class propertiesNode:
+    # The w:pPr or w:rPr of one paragraph or run, a child appended as any other one, written as the interned
+    # text of its block: the many paragraphs with the same properties never share a DOM node
+    __slots__ = ('properties', 'parentNode', 'previousSibling', 'nextSibling')
+    nodeType = xml.dom.Node.ELEMENT_NODE
+
+    def __init__(self, properties):
+        self.properties = properties
+        self.parentNode = self.previousSibling = self.nextSibling = None
+
+    @property
+    def nodeName(self):
+        return self.properties.element.nodeName
+
+    def writexml(self, writer, indent = '', addindent = '', newl = ''):
+        texts = self.properties.texts
+        text = texts.get((indent, addindent, newl))
+        if text is None:
+            f = io.StringIO()
+            self.properties.element.writexml(f, indent, addindent, newl)
+            text = texts[(indent, addindent, newl)] = f.getvalue()
+        writer.write(text)
+
+drawingIdMarker = '\ue003'  # Stands for the w:docPr id in the fragments, only numbered when merged
+
+emuPerPixel = 9525  # At 96 dpi
+maxImageWidth = 5943600  # EMU, the text width of the page (12240 - 2 * 1440 twips)
+cssPixels = {'': 1, 'px': 1, 'pt': 96 / 72, 'pc': 16, 'in': 96, 'cm': 96 / 2.54, 'mm': 96 / 25.4}
+mediaExtensions = {'image/svg+xml': 'svg', 'image/png': 'png'}
+
+def _svgLength(value):
+    # In pixels, None for a relative length such as '100%'
+    match = re.match(r'\s*([0-9.]+)\s*([a-z]*)\s*$', value)
+    if match is None or match.group(2) not in cssPixels:
+        return None
+    return float(match.group(1)) * cssPixels[match.group(2)]
+
+def _imageSize(image):
+    # (width, height) in pixels or None when unknown
+    import struct
+    head = next(image.chunks(), b'')
+    if image.contentType == 'image/png':
+        if head[0:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        return None
+    root = re.search(r'<svg\b[^>]*>', head.decode('utf-8', 'ignore'))
+    if root is None:
+        return None
+    attributes = dict(re.findall(r'([\w:-]+)\s*=\s*["\']([^"\']*)["\']', root.group(0)))
+    width = _svgLength(attributes.get('width', ''))
+    height = _svgLength(attributes.get('height', ''))
+    viewBox = attributes.get('viewBox', '').replace(',', ' ').split()
+    if (width is None or height is None) and len(viewBox) == 4:
+        try:
+            boxWidth, boxHeight = float(viewBox[2]), float(viewBox[3])
+        except ValueError:
+            return None
+        if width is None and height is None:
+            width, height = boxWidth, boxHeight
+        elif width is None and boxHeight > 0:
+            width = height * boxWidth / boxHeight
+        elif height is None and boxWidth > 0:
+            height = width * boxHeight / boxWidth
+    if width is None or height is None or width <= 0 or height <= 0:
+        return None
+    return width, height
 
 class docxWriter(xmlWriter):
   
     # This class is used to write the XML file in the docx format
-    templateDirectory = None
+    templateDirectory = None  # A template directory or a name registered in templateRegistry, None for the default one
+    template = None  # The templateRegistry.docxTemplate used when saving
     openXML = None  # file path for the core OpenXML document
     docxBody = None
     docxDocument = None
     figureIndex = 1  # Used to generate unique figure names
+    sharedProperties = True  # Build identical w:pPr/w:rPr blocks once and write their interned text, off for tracked changes which edit them
+    artworkLineBreaks = True  # One paragraph with w:br per figure rather than one paragraph per artwork line
+    deferredFigures = None  # When rendering a fragment: (body position, name, anchor) of the figures to be numbered by the main writer
 
     def __init__(self, filename = None):
         super().__init__(filename)
@@ -73,6 +172,11 @@ class docxWriter(xmlWriter):
         
         self.docxBody = self.docxRoot.createElement('w:body')
         self.docxDocument.appendChild(self.docxBody)
+        # Flyweight cache: only a handful of (style, justification, numbering, language) combinations exist
+        self.propertiesCache = {}
+        self.spool = None  # Temporary file with the w:body children serialized when over the memory budget
+        self.media = {}  # The figureImage of every word/media part by content hash, an image used twice is stored once
+        self.drawingIndex = 0  # Last w:docPr id
     
     def setMetaData(self, slug, value):
         super().setMetaData(slug, value)
@@ -82,7 +186,7 @@ class docxWriter(xmlWriter):
             self.newParagraph(value, justification= 'right')
 
     def _generateDocPropsCore(self):
-        xmlcore = minidom.parse(self.templateDirectory + '/docProps/core.xml')
+        xmlcore = self.template.newCoreProperties()
 
         if self.getMetaData('authors'):
             creatorElem = xmlcore.getElementsByTagName('dc:creator')[0]
@@ -95,7 +199,7 @@ class docxWriter(xmlWriter):
             for child in createdElem.childNodes:
                 createdElem.removeChild(child)
             if self.getMetaData('date') is not None:
-                createdDate = myParseDate(self.getMetaData('date')[0]) # Normaly only one date	
+                createdDate = myParseDate(self.getMetaData('date')[0], self.buildDate()) # Normaly only one date	
                 text = xmlcore.createTextNode(createdDate.strftime('%Y-%m-%dT%H:%M:%SZ'))
                 createdElem.appendChild(text)
         if self.getMetaData('keywords') is not None:
@@ -119,13 +223,15 @@ class docxWriter(xmlWriter):
         modifiedElem = xmlcore.getElementsByTagName('dcterms:modified')[0]
         for child in modifiedElem.childNodes:
             modifiedElem.removeChild(child)
-        now = datetime.datetime.utcnow()
+        now = self.buildDate()
         text = xmlcore.createTextNode(now.strftime('%Y-%m-%dT%H:%M:%SZ'))
         modifiedElem.appendChild(text)
         
         return xmlcore.toprettyxml().replace('<?xml version="1.0" ?>', '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
 
-    def save(self): 
+    def save(self, stream = None): 
+        # The package goes to self.filename or, if specified, to the binary stream (no file written at all)
+        import zipfile
         super().save()
         sectPrElem = self.docxRoot.createElement('w:sectPr')
 	
@@ -155,41 +261,101 @@ class docxWriter(xmlWriter):
         
         self.docxBody.appendChild(sectPrElem)
 
-        if self.templateDirectory is None: 
-            self.templateDirectory = os.path.dirname(os.path.abspath(sys.argv[0])) + '/template' # default template is in the executable directory
-        if self.openXML is None:
-            self.openXML = self.templateDirectory + '/word/document.xml'
+        self.template = templateRegistry.get(self.templateDirectory)  # Already in memory in long-running processes
+        self.templateDirectory = self.template.directory
 
-        docxFile = io.open(self.openXML, 'w', encoding='utf-8')
-        # Ugly but no other way to put attributes in the top XML 
-        docxFile.write(self.docxRoot.toprettyxml().replace('<?xml version="1.0" ?>', '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'))
-        docxFile.close()
-        print('OpenXML document.xml file is at', self.openXML)
+        if stream is None:
+            if self.openXML is None:
+                self.openXML = self.templateDirectory + '/word/document.xml'
+            docxFile = io.open(self.openXML, 'w', encoding='utf-8')
+            self._writeDocument(docxFile)
+            docxFile.close()
+            logger.info('OpenXML document.xml file is at %s', self.openXML)
 
-        print('Generating OpenXML packaging file', self.filename)
-        print("\tUsing template in" + self.templateDirectory)
+            logger.info('Generating OpenXML packaging file %s', self.filename)
+            logger.info('\tUsing template in %s', self.templateDirectory)
         coreXML = self._generateDocPropsCore()
-        with zipfile.ZipFile(self.filename, 'w', compression=zipfile.ZIP_DEFLATED) as docx:
-            files = [ '[Content_Types].xml', '_rels/.rels', 'docProps/app.xml', 
-                # Should not move the output in template directory... 'word/document.xml', 	
-                'word/fontTable.xml', 'word/settings.xml', 'word/numbering.xml', 'word/webSettings.xml',
-                'word/styles.xml', 'word/theme/theme1.xml', 'word/_rels/document.xml.rels']
-            for file in files:
-                docx.write(self.templateDirectory + '/' + file, arcname = file)
-            docx.write(self.openXML, arcname = 'word/document.xml')
-            docx.writestr('docProps/core.xml', coreXML)
+        templateParts = self.template.parts
+        if self.media:
+            templateParts = self._mediaParts(templateParts)
+        with zipfile.ZipFile(self.filename if stream is None else stream, 'w', compression=zipfile.ZIP_DEFLATED) as docx:
+            for part in templateRegistry.parts:
+                docx.writestr(self._zipInfo(part), templateParts[part])
+            for digest in sorted(self.media):  # Decoded and compressed chunk by chunk
+                image = self.media[digest]
+                with docx.open(self._zipInfo('word/' + self._mediaName(digest, image)), 'w') as entry:
+                    for chunk in image.chunks():
+                        entry.write(chunk)
+            if stream is None:
+                import shutil
+                with io.open(self.openXML, 'rb') as docxFile, docx.open(self._zipInfo('word/document.xml'), 'w') as entry:
+                    shutil.copyfileobj(docxFile, entry)
+            else:  # Serialized directly into the zip entry, without a string holding the whole document
+                with docx.open(self._zipInfo('word/document.xml'), 'w') as entry:
+                    docxFile = io.TextIOWrapper(entry, encoding='utf-8')
+                    self._writeDocument(docxFile)
+                    docxFile.flush()
+                    docxFile.detach()
+            docx.writestr(self._zipInfo('docProps/core.xml'), coreXML)
 
-    def newParagraph(self, textValue, style = 'Normal', justification = None, unnumbered = None, 
-				  numberingID = None, indentationLevel = None, removeEmpty = True, 
-				  language = 'en-US', cdataSection = None):
-        if textValue is None:
-            return None
-        if cdataSection is None:  # remove extra spaces only if CDATA is not requested
-            textValue = ' '.join(textValue.split())
-        if textValue == '' and removeEmpty:
-            return None
-        docxP = self.docxRoot.createElement('w:p')
-        
+    def _zipInfo(self, name):
+        # Fixed timestamp in reproducible mode, else the local time as zipfile.writestr()
+        import zipfile, time
+        if self.reproducible:
+            dateTime = max(self.buildDate().timetuple()[0:6], (1980, 1, 1, 0, 0, 0))
+        else:
+            dateTime = time.localtime()[0:6]
+        info = zipfile.ZipInfo(name, dateTime)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o600 << 16  # As zipfile.writestr()
+        return info
+
+    def _mediaName(self, digest, image):
+        return 'media/image-' + digest + '.' + mediaExtensions[image.contentType]
+
+    def _mediaParts(self, parts):
+        # The template relationships and content types with the media parts
+        parts = dict(parts)
+        relationships = ''.join('\t<Relationship Id="rIdImage' + digest + '" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" Target="' +
+            self._mediaName(digest, self.media[digest]) + '"/>\n' for digest in sorted(self.media))
+        parts['word/_rels/document.xml.rels'] = parts['word/_rels/document.xml.rels'].replace(b'</Relationships>', relationships.encode('utf-8') + b'</Relationships>')
+        types = ''.join('\t<Default Extension="' + extension + '" ContentType="' + contentType + '"/>\n'
+            for contentType, extension in sorted(mediaExtensions.items()) if any(image.contentType == contentType for image in self.media.values()))
+        parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(b'</Types>', types.encode('utf-8') + b'</Types>')
+        return parts
+
+    def _writeDocument(self, f):
+        # Same output as toprettyxml() but streamed into f
+        # Ugly but no other way to put attributes in the top XML 
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n')
+        self.docxDocument.writexml(f, '', '\t', '\n')
+
+    def _checkMemoryBudget(self):
+        # Once too many w:body children are pending, serialize them into the spool (in memory then on disk)
+        if self.memoryBudget is None or self.deferredFigures is not None:
+            return
+        if self.spool is None:
+            pending = len(self.docxBody.childNodes)
+        else:
+            pending = len(self.docxBody.childNodes) - 1  # The first child is the spool itself
+        if not self.overMemoryBudget(pending):
+            return
+        if self.spool is None:
+            self.spool = self.newSpool()
+            self.docxBody.childNodes.insert(0, spooledNodes(self.spool))
+        self.spool.seek(0, io.SEEK_END)
+        for node in self.docxBody.childNodes[1:]:
+            node.writexml(self.spool, '\t\t', '\t', '\n')  # Same indentation as toprettyxml() for w:body children
+        del self.docxBody.childNodes[1:]
+
+    def _getParagraphProperties(self, style, justification, unnumbered, numberingID, indentationLevel, keepNext = False, keepLines = False):
+        if unnumbered:  # Try to override the default numbering in the style
+            numberingID, indentationLevel = '0', '0'
+        elif numberingID == None or indentationLevel == None:
+            numberingID, indentationLevel = None, None
+        key = ('pPr', style, justification, numberingID, indentationLevel, keepNext, keepLines)
+        if self.sharedProperties and key in self.propertiesCache:
+            return propertiesNode(self.propertiesCache[key])
     # First handle the style or justification
     #	<w:pPr>
     #			<w:pStyle w:val="Title"/>
@@ -203,20 +369,16 @@ class docxWriter(xmlWriter):
             pStyle =  self.docxRoot.createElement('w:pStyle')
             pStyle.setAttribute('w:val', style) 
             pPr.appendChild(pStyle)
+    # Then the pagination, e.g., for a figure: <w:keepNext/><w:keepLines/>
+        if keepNext:
+            pPr.appendChild(self.docxRoot.createElement('w:keepNext'))
+        if keepLines:
+            pPr.appendChild(self.docxRoot.createElement('w:keepLines'))
         if justification != None:
             jc =  self.docxRoot.createElement('w:jc')
             jc.setAttribute('w:val', justification) 
             pPr.appendChild(jc)
-        if unnumbered:  # Try to override the default numbering in the style
-            numPr = self.docxRoot.createElement('w:numPr')
-            ilvl = self.docxRoot.createElement('w:ilvl')
-            ilvl.setAttribute('w:val', '0')
-            numPr.appendChild(ilvl)
-            numId = self.docxRoot.createElement('w:numId')
-            numId.setAttribute('w:val', '0')
-            numPr.appendChild(numId)
-            pPr.appendChild(numPr)
-        elif numberingID != None and indentationLevel != None:
+        if numberingID != None:
     #				<w:numPr>
     #					<w:ilvl w:val="0"/>
     #					<w:numId w:val="2"/>
@@ -229,8 +391,15 @@ class docxWriter(xmlWriter):
             numId.setAttribute('w:val', numberingID)
             numPr.appendChild(numId)
             pPr.appendChild(numPr)
-        docxP.appendChild(pPr)
-        
+        if self.sharedProperties:
+            self.propertiesCache[key] = internedProperties(pPr)
+            return propertiesNode(self.propertiesCache[key])
+        return pPr
+
+    def _getRunProperties(self, style, language, characterStyle = False):
+        key = ('rPr', style if language == None or characterStyle else None, language)
+        if self.sharedProperties and key in self.propertiesCache:
+            return propertiesNode(self.propertiesCache[key])
     # Then handle the actual text
     #	<w:r w:rsidRPr="00C46909">
     #		<w:rPr>
@@ -238,17 +407,65 @@ class docxWriter(xmlWriter):
     #		</w:rPr>
     #		<w:t>Title</w:t>
     #	</w:r>
-        r = self.docxRoot.createElement('w:r')
         rPr = self.docxRoot.createElement('w:rPr')
+        if characterStyle:  # e.g., Hyperlink for a cross-reference run
+            rStyle = self.docxRoot.createElement('w:rStyle')
+            rStyle.setAttribute('w:val', style)
+            rPr.appendChild(rStyle)
         if language != None:
             lang = 	self.docxRoot.createElement('w:lang')
             lang.setAttribute('w:val', language)
             rPr.appendChild(lang)
-        elif style != None:  # Seems mandatory for figure ASCII art to repeat the style per run
+        elif style != None and not characterStyle:  # Seems mandatory for figure ASCII art to repeat the style per run
             rStyle = self.docxRoot.createElement('w:rStyle')
             rStyle.setAttribute('w:val', style)
             rPr.appendChild(rStyle)
-        r.appendChild(rPr)
+        if self.sharedProperties:
+            self.propertiesCache[key] = internedProperties(rPr)
+            return propertiesNode(self.propertiesCache[key])
+        return rPr
+
+    def newParagraph(self, textValue, style = 'Normal', justification = None, unnumbered = None, 
+				  numberingID = None, indentationLevel = None, removeEmpty = True, 
+				  language = 'en-US', cdataSection = None, anchor = None):
+        if textValue is None:
+            return None
+        if cdataSection is None:  # remove extra spaces only if CDATA is not requested
+            textValue = ' '.join(textValue.split())
+        if textValue == '' and removeEmpty:
+            return None
+        docxP = self.docxRoot.createElement('w:p')
+        docxP.appendChild(self._getParagraphProperties(style, justification, unnumbered, numberingID, indentationLevel))
+        bookmark = self.anchors.get(anchor) if anchor is not None else None
+        if bookmark is not None:
+    #   <w:bookmarkStart w:id="3" w:name="_Ref3"/> ... <w:bookmarkEnd w:id="3"/>
+            bookmarkStart = self.docxRoot.createElement('w:bookmarkStart')
+            bookmarkStart.setAttribute('w:id', str(bookmark.id))
+            bookmarkStart.setAttribute('w:name', '_Ref' + str(bookmark.id))  # Hidden bookmark as for Word cross-references
+            docxP.appendChild(bookmarkStart)
+        if linkStart not in textValue:
+            docxP.appendChild(self._newRun(textValue, style, language, cdataSection))
+        else:  # Cross-references, let's have one run per piece of text, with spaces kept at their ends
+            for target, text in splitLinks(textValue):
+                if target is None or target not in self.anchors:
+                    docxP.appendChild(self._newRun(text, style, language, True))
+                    continue
+    #   <w:hyperlink w:anchor="_Ref3" w:history="1"><w:r>...</w:r></w:hyperlink>
+                hyperlink = self.docxRoot.createElement('w:hyperlink')
+                hyperlink.setAttribute('w:anchor', '_Ref' + str(self.anchors[target].id))
+                hyperlink.setAttribute('w:history', '1')
+                hyperlink.appendChild(self._newRun(text, 'Hyperlink', language, True, characterStyle = True))
+                docxP.appendChild(hyperlink)
+        if bookmark is not None:
+            bookmarkEnd = self.docxRoot.createElement('w:bookmarkEnd')
+            bookmarkEnd.setAttribute('w:id', str(bookmark.id))
+            docxP.appendChild(bookmarkEnd)
+        self.docxBody.appendChild(docxP)
+        self._checkMemoryBudget()
+
+    def _newRun(self, textValue, style, language, cdataSection, characterStyle = False):
+        r = self.docxRoot.createElement('w:r')
+        r.appendChild(self._getRunProperties(style, language, characterStyle))
         t = self.docxRoot.createElement('w:t')
         if cdataSection is None:
             text = self.docxRoot.createTextNode(textValue)
@@ -257,8 +474,7 @@ class docxWriter(xmlWriter):
             text = self.docxRoot.createTextNode(textValue)
         t.appendChild(text)
         r.appendChild(t) 
-        docxP.appendChild(r)
-        self.docxBody.appendChild(docxP)
+        return r
 
     def newTable(self, table):
         docxTable = self.docxRoot.createElement('w:tbl')
@@ -290,14 +506,154 @@ class docxWriter(xmlWriter):
             docxTable.appendChild(docxRow)
         
         self.docxBody.appendChild(docxTable)
+        self._checkMemoryBudget()
         # Write the table caption if any
         if table.name:
-            self.newParagraph(table.name, style = 'Caption', justification = 'center')
+            self.newParagraph(table.name, style = 'Caption', justification = 'center', anchor = table.anchor)
 
     def newFigure(self, figure):
-        for row in figure.rows:
-            self.newParagraph(row, style = 'Code', removeEmpty = False, language = None, cdataSection = True)
-        # Write the table caption if any
-        if figure.name:
-            self.newParagraph('Figure ' + str(self.figureIndex) +  ' : ' + figure.name, style = 'Caption', justification = 'center')
+        if figure.images:  # Rather than their ASCII art alternative if any
+            for image in figure.images:
+                self._newImage(image, keepNext = bool(figure.name))
+        elif self.artworkLineBreaks:
+            self._newArtwork(figure.rows, keepNext = bool(figure.name))
+        else:
+            for row in figure.rows:
+                self.newParagraph(row, style = 'Code', removeEmpty = False, language = None, cdataSection = True)
+        if self.deferredFigures is not None:  # The figure number is only known when merging the fragments
+            self.deferredFigures.append((len(self.docxBody.childNodes), figure.name, figure.anchor))
+        else:
+            self._captionFigure(figure.name, figure.anchor)
+
+    def _newArtwork(self, rows, keepNext):
+        # The whole artwork in a single run, kept on one page (and with its caption if any)
+    #   <w:p>
+    #       <w:pPr><w:pStyle w:val="Code"/><w:keepNext/><w:keepLines/></w:pPr>
+    #       <w:r><w:rPr><w:rStyle w:val="Code"/></w:rPr><w:t xml:space="preserve">+--+</w:t><w:br/><w:t xml:space="preserve">|  |</w:t>...</w:r>
+    #   </w:p>
+        docxP = self.docxRoot.createElement('w:p')
+        docxP.appendChild(self._getParagraphProperties('Code', None, None, None, None, keepNext = keepNext, keepLines = True))
+        r = self.docxRoot.createElement('w:r')
+        r.appendChild(self._getRunProperties('Code', None))
+        index = -1
+        for index, row in enumerate(rows):
+            if index > 0:
+                r.appendChild(self.docxRoot.createElement('w:br'))
+            if row != '':
+                t = self.docxRoot.createElement('w:t')
+                t.setAttribute('xml:space', 'preserve')
+                t.appendChild(self.docxRoot.createTextNode(row))
+                r.appendChild(t)
+        if index < 0:  # No rows at all
+            return
+        docxP.appendChild(r)
+        self.docxBody.appendChild(docxP)
+        self._checkMemoryBudget()
+
+    def _newImage(self, image, keepNext):
+        # The image is stored once per content in word/media, the drawing only refers to it
+    #   <w:p><w:pPr>...</w:pPr><w:r><w:drawing>
+    #       <wp:inline><wp:extent cx="..." cy="..."/><wp:docPr id="1" name="Picture 1"/>
+    #           <a:graphic><a:graphicData uri=".../picture"><pic:pic>
+    #               <pic:nvPicPr><pic:cNvPr id="1" name="image-....svg"/><pic:cNvPicPr/></pic:nvPicPr>
+    #               <pic:blipFill><a:blip r:embed="rIdImage..."/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>
+    #               <pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="..." cy="..."/></a:xfrm><a:prstGeom prst="rect"/></pic:spPr>
+    #           </pic:pic></a:graphicData></a:graphic>
+    #   </wp:inline></w:drawing></w:r></w:p>
+    # See http://officeopenxml.com/drwPic.php
+        import hashlib
+        digest = hashlib.sha256()
+        for chunk in image.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()[0:16]
+        self.media.setdefault(digest, image)
+        size = _imageSize(image)
+        if size is None:
+            logger.warning('Unknown size for the image %s, using 400x300 pixels', self._mediaName(digest, image))
+            size = (400, 300)
+        width, height = size[0] * emuPerPixel, size[1] * emuPerPixel
+        if width > maxImageWidth:
+            width, height = maxImageWidth, height * maxImageWidth / width
+        if self.deferredFigures is not None:
+            drawingId = drawingIdMarker
+        else:
+            self.drawingIndex += 1
+            drawingId = str(self.drawingIndex)
+
+        docxP = self.docxRoot.createElement('w:p')
+        docxP.appendChild(self._getParagraphProperties(None, 'center', None, None, None, keepNext = keepNext))
+        inline = self._appendElement('wp:inline', self._appendElement('w:drawing', self._appendElement('w:r', docxP)), distT = '0', distB = '0', distL = '0', distR = '0')
+        self._appendElement('wp:extent', inline, cx = str(int(width)), cy = str(int(height)))
+        docPr = self._appendElement('wp:docPr', inline, id = drawingId, name = self._mediaName(digest, image)[6:])
+        if image.alt:
+            docPr.setAttribute('descr', image.alt)
+        graphicData = self._appendElement('a:graphicData', self._appendElement('a:graphic', inline, xmlns_a = 'http://schemas.openxmlformats.org/drawingml/2006/main'),
+            uri = 'http://schemas.openxmlformats.org/drawingml/2006/picture')
+        pic = self._appendElement('pic:pic', graphicData, xmlns_pic = 'http://schemas.openxmlformats.org/drawingml/2006/picture')
+        nvPicPr = self._appendElement('pic:nvPicPr', pic)
+        self._appendElement('pic:cNvPr', nvPicPr, id = drawingId, name = self._mediaName(digest, image)[6:])
+        self._appendElement('pic:cNvPicPr', nvPicPr)
+        blipFill = self._appendElement('pic:blipFill', pic)
+        blip = self._appendElement('a:blip', blipFill, r_embed = 'rIdImage' + digest)
+        if image.contentType == 'image/svg+xml':  # Word 2016 and later, the blip itself is for the other readers
+            self._appendElement('asvg:svgBlip', self._appendElement('a:ext', self._appendElement('a:extLst', blip), uri = '{96DAC541-7B7A-43D3-8B79-37D633B846F1}'),
+                xmlns_asvg = 'http://schemas.microsoft.com/office/drawing/2016/SVG/main', r_embed = 'rIdImage' + digest)
+        self._appendElement('a:fillRect', self._appendElement('a:stretch', blipFill))
+        spPr = self._appendElement('pic:spPr', pic)
+        xfrm = self._appendElement('a:xfrm', spPr)
+        self._appendElement('a:off', xfrm, x = '0', y = '0')
+        self._appendElement('a:ext', xfrm, cx = str(int(width)), cy = str(int(height)))
+        self._appendElement('a:avLst', self._appendElement('a:prstGeom', spPr, prst = 'rect'))
+        self.docxBody.appendChild(docxP)
+        self._checkMemoryBudget()
+
+    def _appendElement(self, tag, parent, **attributes):
+        # xmlns_a = '...' is the xmlns:a attribute
+        child = self.docxRoot.createElement(tag)
+        for attribute, value in attributes.items():
+            child.setAttribute(attribute.replace('_', ':'), value)
+        parent.appendChild(child)
+        return child
+
+    def _captionFigure(self, name, anchor = None):
+        # Write the figure caption if any
+        if name:
+            self.newParagraph('Figure ' + str(self.figureIndex) +  ' : ' + name, style = 'Caption', justification = 'center', anchor = anchor)
         self.figureIndex += 1
+
+    def startFragment(self):
+        self.deferredFigures = []
+
+    def getFragment(self):
+        # The body is returned as a list of serialized XML strings and ('figure', name, anchor) captions to be numbered
+        fragment = super().getFragment()
+        body = []
+        start = 0
+        for position, name, anchor in self.deferredFigures + [(len(self.docxBody.childNodes), None, None)]:
+            text = io.StringIO()
+            for node in self.docxBody.childNodes[start:position]:
+                node.writexml(text, '\t\t', '\t', '\n')  # Same indentation as toprettyxml() for w:body children
+            if text.getvalue() != '':
+                body.append(text.getvalue())
+            body.append(('figure', name, anchor))
+            start = position
+        fragment['body'] = body[:-1]  # The last one is only the end marker
+        fragment['media'] = self.media
+        return fragment
+
+    def addFragment(self, fragment):
+        super().addFragment(fragment)
+        self.media.update(fragment['media'])
+        for item in fragment['body']:
+            if isinstance(item, str):
+                if drawingIdMarker in item:  # The drawings are numbered in document order
+                    pieces = item.split(drawingIdMarker)
+                    item = pieces[0]
+                    for index in range(1, len(pieces)):
+                        if index % 2 == 1:  # Same id for w:docPr and pic:cNvPr
+                            self.drawingIndex += 1
+                        item += str(self.drawingIndex) + pieces[index]
+                self.docxBody.childNodes.append(serializedNodes(item))
+                self._checkMemoryBudget()
+            else:
+                self._captionFigure(item[1], item[2])
@@ -0,0 +1,103 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Waits for the changes of a file being edited, for the --watch mode
+# On Linux, inotify (through the C library, no extra module) watches the directory of the file as
+# many editors save by writing a new file then renaming it. Elsewhere, the file is polled.
+
+import os, sys, time, select, struct
+from typing import Optional, Tuple
+
+debounce = 0.3  # Seconds without any new change before converting, editors often write a file in several steps
+pollInterval = 0.5  # Seconds between two checks of the file when inotify is not available
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+class pollingWatcher:
+	method = 'polling'
+
+	def __init__(self, filename: str) -> None:
+		self.filename = filename
+		self.signature = self._signature()
+
+	def _signature(self) -> Optional[Tuple[int, int, int]]:
+		try:
+			stat = os.stat(self.filename)
+		except OSError:  # Being replaced
+			return None
+		return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+	def wait(self, timeout: Optional[float] = None) -> bool:
+		# True when the file has changed, False after timeout seconds without any change
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			signature = self._signature()
+			if signature != self.signature:
+				self.signature = signature
+				return True
+			if deadline is not None and time.monotonic() >= deadline:
+				return False
+			time.sleep(pollInterval if deadline is None else min(pollInterval, max(deadline - time.monotonic(), 0)))
+
+	def waitForChange(self) -> None:
+		# Returns once the file has changed and has not changed anymore for debounce seconds
+		self.wait()
+		while self.wait(debounce):
+			pass
+
+class inotifyWatcher(pollingWatcher):
+	method = 'inotify'
+
+	def __init__(self, filename: str) -> None:
+		import ctypes, ctypes.util
+		super().__init__(filename)
+		self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+		self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), 'inotify_init1')
+		directory = os.path.dirname(os.path.abspath(filename))
+		if self.libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+			os.close(self.fd)
+			raise OSError(ctypes.get_errno(), 'inotify_add_watch ' + directory)
+		self.name = os.fsencode(os.path.basename(filename))
+
+	def wait(self, timeout: Optional[float] = None) -> bool:
+		deadline = None if timeout is None else time.monotonic() + timeout
+		while True:
+			remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+			readable, writable, exceptional = select.select([self.fd], [], [], remaining)
+			if not readable:
+				return False
+			events = os.read(self.fd, 64 * 1024)
+			offset = 0
+			changed = False
+			while offset < len(events):  # struct inotify_event: int wd, uint32 mask, cookie, len then the name
+				wd, mask, cookie, length = struct.unpack_from('iIII', events, offset)
+				name = events[offset + 16:offset + 16 + length].rstrip(b'\0')
+				offset += 16 + length
+				if name == self.name:
+					changed = True
+			if changed:
+				return True
+
+def newWatcher(filename: str) -> pollingWatcher:
+	if sys.platform.startswith('linux'):
+		try:
+			return inotifyWatcher(filename)
+		except (OSError, AttributeError) as err:  # e.g., no more inotify instances
+			print('Cannot use inotify, polling ' + filename + ' instead: ', err)
+	return pollingWatcher(filename)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Asynchronous conversion jobs for the web front-end (see jobs.php), run with:
+#   python3 jobServer.py [-p <port>] [-w <workers>] [-q <queued jobs>] [-r <retention seconds>] [-b <budget>] [-t <name>=<template directory> ...]
+# POST /jobs?format=docx|md[&template=<name>] with the XML as body -> 202 {"id": ..., "status": "queued"}, 503 when the queue is full,
+#                                                        411/400/413 for a missing/invalid/too large Content-Length
+# GET /jobs/<id>                                      -> {"id": ..., "status": "queued"|"running"|"done"|"failed", ...}
+# GET /jobs/<id>/result                               -> the .docx or .md once done
+# GET /metrics                                        -> Prometheus metrics of the conversions, the fetches and the queue
+# The conversions run in a fixed pool of processes, renewed if one of them dies. An upload identical to a queued,
+# running or successfully converted job (same content and format) gets the id of that job rather than a new conversion.
+
+import sys, os, io, getopt, json, time, hashlib, threading, logging
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import http.server
+import urllib.parse
+from typing import Optional, Dict, Tuple, Any
+
+import metrics
+
+logger = logging.getLogger('xml2docx.jobServer')
+
+port = 8089
+workers = os.cpu_count() or 1  # Conversions running at the same time
+queueLength = 16  # Jobs waiting for a worker, more uploads are refused with a 503 (backpressure)
+retention = 3600  # Seconds a finished job, and its result, are kept
+maxUpload = 16 * 1024 * 1024  # Bytes
+budget = None  # Limits of every conversion as for the xml2docx.py --budget option, None for the resourceBudget defaults
+templates: Dict[str, str] = {}  # The .docx templates that an upload may ask for, by name, see templateRegistry.register()
+
+contentTypes = {
+	'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+	'md': 'text/markdown; charset=utf-8',
+}
+
+def _registerTemplates(templates: Dict[str, str]) -> None:
+	# Initializer of the worker processes
+	import templateRegistry
+	for name, directory in templates.items():
+		templateRegistry.register(name, directory)
+
+def _convertJob(source: bytes, outputFormat: str, budget: Optional[str], template: Optional[str]) -> Tuple[bytes, Dict[str, Any]]:
+	# Runs in a worker process, where the modules and templates stay loaded from one job to the next
+	# Returns the result and the metrics of this job, to be added to those of the server process
+	import xml2docx
+	from resourceBudget import resourceBudget
+	metrics.reset()
+	try:
+		# Reproducible, so that the job id (a hash of the upload) is also a valid ETag of the result
+		result = xml2docx.convert(source, outputFormat, templateDirectory = template,
+			budget = resourceBudget.fromString(budget) if budget else resourceBudget(), reproducible = True)
+	except Exception as err:
+		err.metrics = metrics.snapshot()  # Pickled with the exception
+		raise
+	return result, metrics.snapshot()
+
+class conversionJob:
+
+	def __init__(self, jobId: str, outputFormat: str, template: Optional[str], future: concurrent.futures.Future) -> None:
+		self.id = jobId
+		self.format = outputFormat
+		self.template = template
+		self.future = future
+		self.submitted = time.time()
+		self.finished = None  # Time when the conversion has ended, for the retention
+
+	def failed(self) -> bool:
+		return self.future.done() and (self.future.cancelled() or self.future.exception() is not None)
+
+	def status(self) -> Dict[str, object]:
+		if not self.future.done():
+			state = 'running' if self.future.running() else 'queued'
+		elif self.failed():
+			state = 'failed'
+		else:
+			state = 'done'
+		result = {'id': self.id, 'status': state, 'format': self.format, 'submitted': self.submitted}
+		if self.template is not None:
+			result['template'] = self.template
+		if self.finished is not None:
+			result['finished'] = self.finished
+			result['expires'] = self.finished + retention
+		if state == 'failed' and self.future.cancelled():
+			result['error'] = 'cancelled'
+		elif state == 'failed':
+			result['error'] = str(self.future.exception())
+			if hasattr(self.future.exception(), 'asDict'):  # budgetExceeded
+				result['budget'] = self.future.exception().asDict()
+		return result
+
+class jobQueue:
+
+	def __init__(self, workers: int, queueLength: int) -> None:
+		self.workers = workers
+		self.pool = self._newPool()
+		self.capacity = workers + queueLength
+		self.jobs: Dict[str, conversionJob] = {}
+		self.pending = 0  # Jobs queued or running
+		self.lock = threading.Lock()
+
+	def _newPool(self) -> concurrent.futures.ProcessPoolExecutor:
+		return concurrent.futures.ProcessPoolExecutor(max_workers = self.workers, initializer = _registerTemplates, initargs = (templates,))
+
+	def _renewPool(self, brokenPool: concurrent.futures.ProcessPoolExecutor) -> None:
+		# With the lock held. When a worker dies (e.g., killed by the OOM killer), the pool fails its queued and
+		# running jobs and refuses any other one: a new pool is needed
+		if self.pool is brokenPool:
+			logger.warning('A worker process died, starting a new pool of workers')
+			self.pool = self._newPool()
+			brokenPool.shutdown(wait = False, cancel_futures = True)
+
+	def _finished(self, job: conversionJob, pool: concurrent.futures.ProcessPoolExecutor) -> None:
+		with self.lock:
+			job.finished = time.time()
+			self.pending -= 1
+			if not job.future.cancelled() and isinstance(job.future.exception(), BrokenProcessPool):
+				self._renewPool(pool)
+		if job.future.cancelled():
+			metrics.conversions.inc(job.format, 'failed')
+			return
+		error = job.future.exception()
+		if error is None:
+			metrics.merge(job.future.result()[1])
+		elif hasattr(error, 'metrics'):
+			metrics.merge(error.metrics)
+		else:  # e.g., a worker process killed by the OOM killer
+			metrics.conversions.inc(job.format, 'failed')
+
+	def updateMetrics(self) -> None:
+		with self.lock:
+			self._expire()
+			counts = {'queued': 0, 'running': 0, 'retained': 0}
+			for job in self.jobs.values():
+				if job.finished is not None:
+					counts['retained'] += 1
+				elif job.future.running():
+					counts['running'] += 1
+				else:
+					counts['queued'] += 1
+		for status, count in counts.items():
+			metrics.jobs.set(count, status)
+
+	def _expire(self) -> None:
+		now = time.time()
+		for jobId in [jobId for jobId, job in self.jobs.items() if job.finished is not None and job.finished + retention < now]:
+			del self.jobs[jobId]
+
+	def submit(self, source: bytes, outputFormat: str, template: Optional[str] = None) -> Tuple[Optional[conversionJob], bool]:
+		# Returns (job, is a new job), the job is None when the queue is full
+		jobId = hashlib.sha256(outputFormat.encode('utf-8') + b'\0' + (template or '').encode('utf-8') + b'\0' + source).hexdigest()[0:32]
+		with self.lock:
+			self._expire()
+			job = self.jobs.get(jobId)
+			if job is not None and not job.failed():  # Identical upload, let's share the conversion
+				return job, False
+			if self.pending >= self.capacity:  # A failed job is kept, so that its status can still be read
+				return None, False
+			pool = self.pool
+			try:
+				future = pool.submit(_convertJob, source, outputFormat, budget, template)
+			except BrokenProcessPool:  # Not yet noticed by _finished()
+				self._renewPool(pool)
+				pool = self.pool
+				future = pool.submit(_convertJob, source, outputFormat, budget, template)
+			job = conversionJob(jobId, outputFormat, template, future)
+			self.jobs[jobId] = job  # Replaces a failed one, e.g., after a transient failure of a reference host
+			self.pending += 1
+		job.future.add_done_callback(lambda future: self._finished(job, pool))
+		return job, True
+
+	def get(self, jobId: str) -> Optional[conversionJob]:
+		with self.lock:
+			self._expire()
+			return self.jobs.get(jobId)
+
+class jobRequestHandler(http.server.BaseHTTPRequestHandler):
+	queue: jobQueue = None
+
+	def _send(self, code: int, body: bytes, contentType: str = 'application/json', headers: Dict[str, str] = {}) -> None:
+		self.send_response(code)
+		self.send_header('Content-Type', contentType)
+		self.send_header('Content-Length', str(len(body)))
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _sendJSON(self, code: int, value: Dict[str, object], headers: Dict[str, str] = {}) -> None:
+		self._send(code, json.dumps(value).encode('utf-8'), headers = headers)
+
+	def do_POST(self) -> None:
+		path, _, query = self.path.partition('?')
+		if path != '/jobs':
+			self._sendJSON(404, {'error': 'unknown path ' + path})
+			return
+		parameters = {name: values[-1] for name, values in urllib.parse.parse_qs(query).items()}
+		outputFormat = parameters.get('format', 'docx')
+		if outputFormat not in contentTypes:
+			self._sendJSON(400, {'error': 'unsupported format ' + outputFormat})
+			return
+		template = parameters.get('template')
+		if template is not None and (template not in templates or outputFormat != 'docx'):  # Never a directory given by the client
+			self._sendJSON(400, {'error': 'unknown template ' + template + ' for the ' + outputFormat + ' format'})
+			return
+		# Checked before reading anything of the body
+		if self.headers.get('Content-Length') is None:  # e.g., chunked
+			self._sendJSON(411, {'error': 'the Content-Length of the XML document is required'})
+			return
+		try:
+			length = int(self.headers.get('Content-Length'))
+		except ValueError:
+			length = -1
+		if length <= 0:
+			self._sendJSON(400, {'error': 'invalid Content-Length ' + self.headers.get('Content-Length')})
+			return
+		if length > maxUpload:
+			self._sendJSON(413, {'error': f'the XML document must have at most {maxUpload} bytes'})
+			return
+		source = self.rfile.read(length)
+		job, isNew = self.queue.submit(source, outputFormat, template)
+		if job is None:
+			self._sendJSON(503, {'error': 'too many conversions in progress, retry later'}, {'Retry-After': '5'})
+			return
+		status = job.status()
+		status['deduplicated'] = not isNew
+		self._sendJSON(202 if status['status'] in ('queued', 'running') else 200, status, {'Location': '/jobs/' + job.id})
+
+	def do_GET(self) -> None:
+		if self.path == '/metrics':
+			self.queue.updateMetrics()
+			self._send(200, metrics.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+			return
+		parts = self.path.strip('/').split('/')
+		job = self.queue.get(parts[1]) if len(parts) in (2, 3) and parts[0] == 'jobs' else None
+		if job is None:
+			self._sendJSON(404, {'error': 'unknown or expired job'})
+		elif len(parts) == 2:
+			self._sendJSON(200, job.status())
+		elif parts[2] != 'result':
+			self._sendJSON(404, {'error': 'unknown path ' + self.path})
+		elif not job.future.done():
+			self._sendJSON(409, job.status(), {'Retry-After': '1'})
+		elif job.failed():
+			self._sendJSON(500, job.status())
+		elif self.headers.get('If-None-Match') == '"' + job.id + '"':
+			self.send_response(304)
+			self.send_header('ETag', '"' + job.id + '"')
+			self.end_headers()
+		else:
+			self._send(200, job.future.result()[0], contentTypes[job.format], {'ETag': '"' + job.id + '"'})
+
+	def log_message(self, format: str, *args) -> None:
+		print(self.address_string() + ' ' + format % args)
+
+def main(argv) -> None:
+	global port, workers, queueLength, retention, budget
+	usage = 'jobServer.py [-p <port>] [-w <workers>] [-q <queued jobs>] [-r <retention seconds>] [-b <budget>] [-t <name>=<template directory> ...]'
+	try:
+		opts, args = getopt.getopt(argv, "b:hp:q:r:t:w:")
+	except getopt.GetoptError:
+		print(usage)
+		sys.exit(2)
+	for opt, arg in opts:
+		if opt == '-h':
+			print(usage)
+			sys.exit()
+		elif opt == '-p':
+			port = int(arg)
+		elif opt == '-w':
+			workers = int(arg)
+		elif opt == '-q':
+			queueLength = int(arg)
+		elif opt == '-r':
+			retention = int(arg)
+		elif opt == '-b':  # e.g., input=8M,elements=100000,depth=64,fetches=50,deadline=60
+			budget = arg
+		elif opt == '-t':  # e.g., -t ietf=template -t corporate=/srv/templates/corporate
+			name, _, directory = arg.partition('=')
+			if name == '' or not os.path.isfile(os.path.join(directory, 'word', 'styles.xml')):
+				print('Invalid template ' + arg + ', expecting <name>=<template directory>')
+				sys.exit(2)
+			templates[name] = os.path.abspath(directory)
+	logging.basicConfig(format = '%(message)s', level = logging.INFO)
+	jobRequestHandler.queue = jobQueue(workers, queueLength)
+	server = http.server.ThreadingHTTPServer(('127.0.0.1', port), jobRequestHandler)  # Only for the local front-end
+	print(f'Serving conversion jobs on http://127.0.0.1:{port}/jobs with {workers} worker(s)')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	server.server_close()
+	jobRequestHandler.queue.pool.shutdown(cancel_futures = True)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
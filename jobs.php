@@ -0,0 +1,75 @@
+<?php
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+# Non-blocking alternative to process.php, relaying to jobServer.py running on the same host:
+#	POST jobs.php with the 'xmlfile' upload (and optional 'format' = docx or md, 'template' = a name given to jobServer.py) returns the job as JSON
+#	GET jobs.php?id=<id> returns the job status as JSON
+#	GET jobs.php?id=<id>&download=<file name> returns the converted file once done
+#
+$service = 'http://127.0.0.1:8089/jobs' ;
+
+function relay($url, $context, $download = NULL) {
+	$body = @file_get_contents($url, false, $context) ;
+	if ($body === false) {
+		http_response_code(502) ;
+		header('Content-Type: application/json') ;
+		print(json_encode(array('error' => 'the conversion service is not available'))) ;
+		exit ;
+	}
+	# Status line and headers of jobServer.py are copied
+	preg_match('/^HTTP\/\S+ (\d+)/', $http_response_header[0], $matches) ;
+	http_response_code(intval($matches[1])) ;
+	foreach ($http_response_header as $line) {
+		if (preg_match('/^(Content-Type|Retry-After):/i', $line))
+			header($line) ;
+	}
+	if ($download != NULL and $matches[1] == '200')
+		header("Content-Disposition: attachment; filename=\"$download\"");
+	print($body) ;
+	exit ;
+}
+
+if ($_SERVER['REQUEST_METHOD'] == 'POST') {
+	if (!isset($_FILES['xmlfile']) or $_FILES['xmlfile']['error'] != UPLOAD_ERR_OK) {
+		http_response_code(400) ;
+		die(json_encode(array('error' => 'cannot upload file'))) ;
+	}
+	$format = (isset($_POST['format']) and $_POST['format'] == 'md') ? 'md' : 'docx' ;
+	if (isset($_POST['template']) and $_POST['template'] != '') {	// A name given to jobServer.py with -t
+		if (!preg_match('/^[A-Za-z0-9_-]+$/', $_POST['template'])) {
+			http_response_code(400) ;
+			die(json_encode(array('error' => 'invalid template name'))) ;
+		}
+		$format .= '&template=' . $_POST['template'] ;
+	}
+	$context = stream_context_create(array('http' => array(
+		'method' => 'POST',
+		'header' => "Content-Type: application/xml\r\n",
+		'content' => file_get_contents($_FILES['xmlfile']['tmp_name']),
+		'ignore_errors' => true))) ;
+	relay("$service?format=$format", $context) ;
+}
+
+if (!isset($_GET['id']) or !preg_match('/^[0-9a-f]+$/', $_GET['id'])) {
+	http_response_code(400) ;
+	die(json_encode(array('error' => 'missing or invalid job id'))) ;
+}
+$context = stream_context_create(array('http' => array('ignore_errors' => true))) ;
+if (isset($_GET['download'])) {
+	$download = preg_replace('/[^\w.-]/', '_', basename($_GET['download'])) ;
+	relay("$service/$_GET[id]/result", $context, $download) ;
+}
+relay("$service/$_GET[id]", $context) ;
+?>
@@ -0,0 +1,33 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# The logging module imports threading, traceback, re... about 10 ms for each new interpreter.
+# The loggers of the conversion path only import it for their first message (or when they are configured),
+# so that a conversion without any warning does not pay for it.
+
+class lazyLogger:
+	# Stands for logging.getLogger(name), the 'xml2docx' logger gets a NullHandler as soon as logging is imported
+
+	def __init__(self, name: str):
+		self._name = name
+		self._logger = None
+
+	def __getattr__(self, attribute: str):
+		if self._logger is None:
+			import logging
+			top = logging.getLogger('xml2docx')
+			if not any(isinstance(handler, logging.NullHandler) for handler in top.handlers):
+				top.addHandler(logging.NullHandler())  # Else a library user would get the warnings on stderr
+			self._logger = logging.getLogger(self._name)
+		return getattr(self._logger, attribute)
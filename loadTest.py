@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Load test of the upload-to-docx path, run with:
+#   python3 loadTest.py [-m service|cli] [-c <concurrency>] [-n <requests>] [-w <workers>] [-f docx|md]
+#                       [-s <stub delay ms>] [-o <report.json>] [corpus directory or drafts ...]
+# The drafts are replayed in turn by <concurrency> clients, either against jobServer.py (service, started with
+# <workers> processes) or by running xml2docx.py once per request as process.php does (cli).
+# The references are served by a local stub (see urlCache.mirror) after <stub delay> ms, with an empty cache, so
+# that two runs only differ by the converter. Without any corpus, synthetic drafts of several sizes are used.
+
+import sys, os, getopt, json, time, glob, tempfile, threading, subprocess, resource
+import concurrent.futures
+import http.server
+import urllib.request, urllib.error
+from typing import List, Dict, Tuple, Any
+
+here = os.path.dirname(os.path.abspath(__file__))
+stubDelay = 0.05  # Seconds before the stub answers, about a nearby server
+
+class stubRequestHandler(http.server.BaseHTTPRequestHandler):
+	# Any /<host>/<path>/reference.<type>.<name>.xml gets a minimal <reference>
+
+	def do_GET(self) -> None:
+		time.sleep(stubDelay)
+		name = os.path.basename(self.path)
+		if not name.endswith('.xml'):
+			self.send_error(404)
+			return
+		anchor = name[:-4].replace('reference.', '', 1).replace('RFC.', 'RFC', 1)
+		body = ('<?xml version="1.0" encoding="UTF-8"?>\n<reference anchor="' + anchor + '"><front><title>Stub of ' + anchor +
+			'</title><author fullname="A. Stub"/><date year="2026"/></front><seriesInfo name="RFC" value="0"/></reference>\n').encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/xml')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format: str, *args) -> None:
+		pass
+
+def syntheticCorpus() -> List[Tuple[str, bytes]]:
+	# Drafts of several sizes, each one with some references to be fetched
+	import bench
+	corpus = []
+	for sections in (5, 20, 80):
+		draft = bench.syntheticDraft(sections).decode('utf-8')
+		references = ''.join(f"<?rfc include='reference.RFC.{8000 + number}'?>\n" for number in range(sections))
+		draft = draft.replace('<back>\n', '<back>\n<references title="Normative References">\n' + references + '</references>\n', 1)
+		corpus.append((f'synthetic-{sections}', draft.encode('utf-8')))
+	return corpus
+
+def loadCorpus(paths: List[str]) -> List[Tuple[str, bytes]]:
+	corpus = []
+	for path in paths:
+		for filename in sorted(glob.glob(os.path.join(path, '*.xml'))) if os.path.isdir(path) else [path]:
+			with open(filename, 'rb') as f:
+				corpus.append((os.path.basename(filename), f.read()))
+	return corpus
+
+def unique(draft: bytes, index: int) -> bytes:
+	# jobServer.py shares the job of identical uploads, every request must be a new conversion
+	return draft + f'<!-- load test request {index} -->\n'.encode('utf-8')
+
+class cliTarget:
+	# One interpreter per conversion, as process.php
+	name = 'cli'
+
+	def __init__(self, outputFormat: str, workers: int, environment: Dict[str, str]) -> None:
+		self.option = '--docx' if outputFormat == 'docx' else '--md'
+		self.environment = environment
+		self.directory = tempfile.TemporaryDirectory()
+
+	def convert(self, draft: bytes, index: int) -> int:
+		inFilename = os.path.join(self.directory.name, f'upload-{index}.xml')
+		with open(inFilename, 'wb') as f:
+			f.write(unique(draft, index))
+		try:
+			result = subprocess.run([sys.executable, os.path.join(here, 'xml2docx.py'), '-i', inFilename, self.option, '-', '--no-local-includes'],
+				stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, env = self.environment)
+		finally:
+			os.remove(inFilename)
+		if result.returncode != 0 or len(result.stdout) == 0:
+			raise RuntimeError(f'xml2docx.py exited with {result.returncode}')
+		return len(result.stdout)
+
+	def peakMemory(self) -> Dict[str, int]:
+		# Largest of the conversions, in bytes (kilobytes on Linux)
+		peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+		return {'conversion': peak if sys.platform == 'darwin' else peak * 1024}
+
+	def stop(self) -> None:
+		self.directory.cleanup()
+
+class serviceTarget:
+	# jobServer.py with its pool of worker processes, polled as jobs.php does
+	name = 'service'
+	pollInterval = 0.02
+
+	def __init__(self, outputFormat: str, workers: int, environment: Dict[str, str]) -> None:
+		import socket
+		self.outputFormat = outputFormat
+		with socket.socket() as s:  # A free port
+			s.bind(('127.0.0.1', 0))
+			port = s.getsockname()[1]
+		self.url = f'http://127.0.0.1:{port}/jobs'
+		self.server = subprocess.Popen([sys.executable, os.path.join(here, 'jobServer.py'), '-p', str(port), '-w', str(workers), '-q', '1000'],
+			stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, env = environment)
+		for attempt in range(100):
+			try:
+				urllib.request.urlopen(self.url + '/none', timeout = 1)
+			except urllib.error.HTTPError:  # 404, so it is up
+				break
+			except OSError:
+				time.sleep(0.1)
+
+	def convert(self, draft: bytes, index: int) -> int:
+		request = urllib.request.Request(self.url + '?format=' + self.outputFormat, data = unique(draft, index), method = 'POST')
+		job = json.load(urllib.request.urlopen(request, timeout = 60))
+		while job['status'] in ('queued', 'running'):
+			time.sleep(self.pollInterval)
+			job = json.load(urllib.request.urlopen(self.url + '/' + job['id'], timeout = 60))
+		if job['status'] != 'done':
+			raise RuntimeError(job.get('error', job['status']))
+		return len(urllib.request.urlopen(self.url + '/' + job['id'] + '/result', timeout = 60).read())
+
+	def peakMemory(self) -> Dict[str, int]:
+		# Peak resident set size (VmHWM) of the server and of each worker, only on Linux
+		peaks = {}
+		pids = [(self.server.pid, 'server')]
+		try:
+			with open(f'/proc/{self.server.pid}/task/{self.server.pid}/children') as f:
+				pids.extend((int(pid), f'worker {number + 1}') for number, pid in enumerate(f.read().split()))
+			for pid, name in pids:
+				with open(f'/proc/{pid}/status') as f:
+					for line in f:
+						if line.startswith('VmHWM:'):
+							peaks[name] = int(line.split()[1]) * 1024
+		except OSError:
+			pass
+		return peaks
+
+	def stop(self) -> None:
+		self.server.terminate()
+		self.server.wait()
+
+def percentile(values: List[float], rank: float) -> float:
+	# Nearest rank
+	ordered = sorted(values)
+	return ordered[min(int(len(ordered) * rank / 100), len(ordered) - 1)]
+
+def run(target: Any, corpus: List[Tuple[str, bytes]], concurrency: int, requests: int) -> Dict[str, Any]:
+	latencies = []
+	errors = {}
+	lock = threading.Lock()
+
+	def oneRequest(index: int) -> None:
+		name, draft = corpus[index % len(corpus)]
+		start = time.perf_counter()
+		try:
+			target.convert(draft, index)
+		except Exception as err:
+			with lock:
+				errors[name] = errors.get(name, 0) + 1
+				print(f'\t{name}: {err}')
+			return
+		with lock:
+			latencies.append(time.perf_counter() - start)
+
+	start = time.perf_counter()
+	with concurrent.futures.ThreadPoolExecutor(max_workers = concurrency) as pool:
+		list(pool.map(oneRequest, range(requests)))
+	elapsed = time.perf_counter() - start
+	report = {'target': target.name, 'concurrency': concurrency, 'requests': requests, 'drafts': len(corpus),
+		'elapsed': elapsed, 'throughput': len(latencies) / elapsed, 'errorRate': sum(errors.values()) / requests, 'errors': errors,
+		'peakMemory': target.peakMemory()}
+	if latencies:
+		report.update({'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95), 'p99': percentile(latencies, 99),
+			'mean': sum(latencies) / len(latencies), 'max': max(latencies)})
+	return report
+
+def printReport(report: Dict[str, Any]) -> None:
+	print(f"{report['requests']} requests on {report['drafts']} draft(s), {report['target']}, concurrency {report['concurrency']}: "
+		f"{report['elapsed']:.1f} s, {report['throughput']:.2f} conversions/s, error rate {report['errorRate'] * 100:.1f} %")
+	if 'p50' in report:
+		print(f"\tlatency p50 {report['p50'] * 1000:.0f} ms  p95 {report['p95'] * 1000:.0f} ms  p99 {report['p99'] * 1000:.0f} ms  max {report['max'] * 1000:.0f} ms")
+	for name, peak in report['peakMemory'].items():
+		print(f'\tpeak memory {name:<12} {peak / 1024 / 1024:8.1f} MB')
+
+def main(argv: List[str]) -> None:
+	global stubDelay
+	usage = 'loadTest.py [-m service|cli] [-c <concurrency>] [-n <requests>] [-w <workers>] [-f docx|md] [-s <stub delay ms>] [-o <report.json>] [corpus directory or drafts ...]'
+	mode = 'service'
+	concurrency = 4
+	requests = 100
+	workers = os.cpu_count() or 1
+	outputFormat = 'docx'
+	reportFilename = None
+	try:
+		opts, args = getopt.getopt(argv, "c:f:hm:n:o:s:w:")
+	except getopt.GetoptError:
+		print(usage)
+		sys.exit(2)
+	for opt, arg in opts:
+		if opt == '-h':
+			print(usage)
+			sys.exit()
+		elif opt == '-m':
+			mode = arg
+		elif opt == '-c':
+			concurrency = int(arg)
+		elif opt == '-n':
+			requests = int(arg)
+		elif opt == '-w':
+			workers = int(arg)
+		elif opt == '-f':
+			outputFormat = arg
+		elif opt == '-s':
+			stubDelay = int(arg) / 1000
+		elif opt == '-o':
+			reportFilename = arg
+	if mode not in ('service', 'cli') or outputFormat not in ('docx', 'md'):
+		print(usage)
+		sys.exit(2)
+	corpus = loadCorpus(args) if args else syntheticCorpus()
+	if not corpus:
+		print('No draft found in ' + ', '.join(args))
+		sys.exit(2)
+
+	stub = http.server.ThreadingHTTPServer(('127.0.0.1', 0), stubRequestHandler)
+	threading.Thread(target = stub.serve_forever, daemon = True).start()
+	with tempfile.TemporaryDirectory() as cacheDirectory:
+		environment = dict(os.environ, XML2DOCX_MIRROR = f'http://127.0.0.1:{stub.server_address[1]}', XML2DOCX_CACHE = cacheDirectory)
+		target = (serviceTarget if mode == 'service' else cliTarget)(outputFormat, workers, environment)
+		try:
+			report = run(target, corpus, concurrency, requests)
+		finally:
+			target.stop()
+			stub.shutdown()
+	report['stubDelay'] = stubDelay
+	printReport(report)
+	if reportFilename is not None:
+		with open(reportFilename, 'w', encoding='utf-8') as f:
+			json.dump(report, f, indent = 1)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -14,8 +14,11 @@
    
 # A lot of information in https://github.com/cabo/kramdown-rfc/wiki/Syntax2 
 
-from xml2docx import xmlWriter
-import textwrap
+from xmlWriter import xmlWriter, plainText
+from lazyLogging import lazyLogger
+import textwrap, io, shutil
+
+logger = lazyLogger('xml2docx.mdWriter')
 
 class mdWriter(xmlWriter):
   
@@ -25,6 +28,8 @@ class mdWriter(xmlWriter):
         super().__init__(filename)
         self.mdMiddleText = [] # A list of all the paragraphs in the middle part
         self.mdBackText = []  # A list of all the paragraphs in the back part
+        self.mdMiddleSpool = None  # Temporary files with the paragraphs already written when over the memory budget
+        self.mdBackSpool = None
     
     def setMetaData(self, slug, value):
         super().setMetaData(slug, value)
@@ -62,26 +67,76 @@ class mdWriter(xmlWriter):
                 f.write('\n\n')
         f.write('\n--- middle\n\n')
 
-    def save(self): 
+    def _saveMiddle(self, f, paragraphs):
+        for paragraph in paragraphs:
+            f.write(textwrap.fill(paragraph, width=72))
+            if paragraph.endswith('\n'):
+                f.write('\n')  # as textwrap.fill remove the trailing new line if any (e.g., tables/figures do not have a trailing new line)
+            f.write('\n')  # Add one new line between paragraphs (not the newParagraph also adds a new line but not newTable)
+
+    def _saveBack(self, f, paragraphs):
+        for paragraph in paragraphs:
+            f.write(textwrap.fill(paragraph, width=72))
+            f.write('\n')
+
+    def _checkMemoryBudget(self):
+        # The front matter is written first but only known at the end, so the middle and back parts are spooled
+        if not self.overMemoryBudget(len(self.mdMiddleText) + len(self.mdBackText)):
+            return
+        if self.mdMiddleText:
+            if self.mdMiddleSpool is None:
+                self.mdMiddleSpool = self.newSpool()
+            self._saveMiddle(self.mdMiddleSpool, self.mdMiddleText)
+            self.mdMiddleText = []
+        if self.mdBackText:
+            if self.mdBackSpool is None:
+                self.mdBackSpool = self.newSpool()
+            self._saveBack(self.mdBackSpool, self.mdBackText)
+            self.mdBackText = []
+
+    def save(self, stream = None): 
+        # The kramdown goes to self.filename or, if specified, to the binary stream
         super().save()
-        print('Generating kramdown file', self.filename)
-        with open(self.filename, 'w', encoding='utf-8') as f:
+        if stream is None:
+            logger.info('Generating kramdown file %s', self.filename)
+            f = open(self.filename, 'w', encoding='utf-8')
+        else:
+            f = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
             self._saveFront(f)
-            for paragraph in self.mdMiddleText:
-                f.write(textwrap.fill(paragraph, width=72))
-                if paragraph.endswith('\n'):
-                    f.write('\n')  # as textwrap.fill remove the trailing new line if any (e.g., tables/figures do not have a trailing new line)
-                f.write('\n')  # Add one new line between paragraphs (not the newParagraph also adds a new line but not newTable)
+            if self.mdMiddleSpool is not None:
+                self.mdMiddleSpool.seek(0)
+                shutil.copyfileobj(self.mdMiddleSpool, f)
+            self._saveMiddle(f, self.mdMiddleText)
             f.write('\n--- back\n\n')
-            for paragraph in self.mdBackText:
-                f.write(textwrap.fill(paragraph, width=72))
-                f.write('\n')
+            if self.mdBackSpool is not None:
+                self.mdBackSpool.seek(0)
+                shutil.copyfileobj(self.mdBackSpool, f)
+            self._saveBack(f, self.mdBackText)
+        finally:
+            if stream is None:
+                f.close()
+            else:
+                f.flush()
+                f.detach()  # Leave the caller stream open
+
+    def getFragment(self):
+        fragment = super().getFragment()
+        fragment['body'] = (self.mdMiddleText, self.mdBackText)
+        return fragment
+
+    def addFragment(self, fragment):
+        super().addFragment(fragment)
+        self.mdMiddleText.extend(fragment['body'][0])
+        self.mdBackText.extend(fragment['body'][1])
+        self._checkMemoryBudget()
 
     def newParagraph(self, textValue, style = 'Normal', justification = None, unnumbered = None, 
 				  numberingID = None, indentationLevel = None, removeEmpty = True, 
-				  language = 'en-US', cdataSection = None):
+				  language = 'en-US', cdataSection = None, anchor = None):
         if textValue is None:
             return
+        textValue = plainText(textValue)  # Kramdown gets the text of the cross-references
         if cdataSection is None:  # remove extra spaces only if CDATA is not requested
             textValue = ' '.join(textValue.split())
         if textValue == '' and removeEmpty:
@@ -111,6 +166,7 @@ class mdWriter(xmlWriter):
             self.mdMiddleText.append(textValue + '\n')
         else:
             self.mdBackText.append(textValue + '\n')
+        self._checkMemoryBudget()
 
     def newTable(self, table):
         needHeaderSeparator = False
@@ -131,7 +187,7 @@ class mdWriter(xmlWriter):
                 # Add a body row
                 textValue = "| " + " | ".join([cell.text for cell in row.cells]) + " |"
             else: 
-                print('newTable: rowType not handled:', row.rowType)
+                logger.warning('newTable: rowType not handled: %s', row.rowType)
             if self.inMiddle:
                 self.mdMiddleText.append(textValue)
             else:
@@ -139,6 +195,7 @@ class mdWriter(xmlWriter):
         # Write the table caption if any
         if table.name:
             self.newParagraph(table.name, style = 'Caption', justification = 'center')
+        self._checkMemoryBudget()
 
     def newFigure(self, figure):
         if self.inMiddle:
@@ -162,3 +219,4 @@ class mdWriter(xmlWriter):
                 self.mdMiddleText.append('{:fig title="' + figure.name + '"}')
             else:
                 self.mdBackText.append('{:fig title="' + figure.name + '"}')
+        self._checkMemoryBudget()
@@ -0,0 +1,159 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Prometheus metrics of the conversions and of the fetches, without any client library
+# jobServer.py serves them on GET /metrics, xml2docx.py --metrics <file> adds those of every run into a file
+# for the textfile collector of the node exporter.
+# See https://prometheus.io/docs/instrumenting/exposition_formats/ for the text format
+
+import os, json, threading
+from typing import Dict, List, Tuple, Optional, Any
+
+lock = threading.Lock()  # The fetches are done by several threads
+registry: List['metric'] = []
+
+class metric:
+	kind = 'untyped'
+
+	def __init__(self, name: str, help: str, labelNames: Tuple[str, ...] = ()) -> None:
+		self.name = name
+		self.help = help
+		self.labelNames = labelNames
+		self.values: Dict[Tuple[str, ...], Any] = {}  # By label values
+		registry.append(self)
+
+	def _labels(self, labelValues: Tuple[str, ...], extra: str = '') -> str:
+		pairs = [name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for name, value in zip(self.labelNames, labelValues)]
+		if extra:
+			pairs.append(extra)
+		return '{' + ','.join(pairs) + '}' if pairs else ''
+
+	def render(self) -> List[str]:
+		lines = ['# HELP ' + self.name + ' ' + self.help, '# TYPE ' + self.name + ' ' + self.kind]
+		for labelValues, value in sorted(self.values.items()):
+			lines.append(self.name + self._labels(labelValues) + ' ' + _number(value))
+		return lines
+
+	def merge(self, values: Dict[Tuple[str, ...], Any]) -> None:
+		for labelValues, value in values.items():
+			self.values[labelValues] = self.values.get(labelValues, 0) + value
+
+class counter(metric):
+	kind = 'counter'
+
+	def inc(self, *labelValues: str, amount: float = 1) -> None:
+		with lock:
+			self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+class gauge(metric):
+	kind = 'gauge'
+
+	def set(self, value: float, *labelValues: str) -> None:
+		with lock:
+			self.values[labelValues] = value
+
+	def merge(self, values: Dict[Tuple[str, ...], Any]) -> None:
+		self.values.update(values)  # The last known value
+
+class histogram(metric):
+	kind = 'histogram'
+
+	def __init__(self, name: str, help: str, labelNames: Tuple[str, ...], buckets: Tuple[float, ...]) -> None:
+		super().__init__(name, help, labelNames)
+		self.buckets = buckets  # Upper bounds, +Inf is implicit
+
+	def observe(self, value: float, *labelValues: str) -> None:
+		with lock:
+			counts = self.values.get(labelValues)
+			if counts is None:
+				counts = self.values[labelValues] = [0] * len(self.buckets) + [0, 0]  # Then the sum and the count
+			for index, bound in enumerate(self.buckets):
+				if value <= bound:
+					counts[index] += 1
+			counts[-2] += value
+			counts[-1] += 1
+
+	def render(self) -> List[str]:
+		lines = ['# HELP ' + self.name + ' ' + self.help, '# TYPE ' + self.name + ' ' + self.kind]
+		for labelValues, counts in sorted(self.values.items()):
+			for bound, count in zip(self.buckets, counts):
+				lines.append(self.name + '_bucket' + self._labels(labelValues, 'le="' + _number(bound) + '"') + ' ' + _number(count))
+			lines.append(self.name + '_bucket' + self._labels(labelValues, 'le="+Inf"') + ' ' + _number(counts[-1]))
+			lines.append(self.name + '_sum' + self._labels(labelValues) + ' ' + _number(counts[-2]))
+			lines.append(self.name + '_count' + self._labels(labelValues) + ' ' + _number(counts[-1]))
+		return lines
+
+	def merge(self, values: Dict[Tuple[str, ...], Any]) -> None:
+		for labelValues, counts in values.items():
+			current = self.values.get(labelValues)
+			self.values[labelValues] = list(counts) if current is None else [a + b for a, b in zip(current, counts)]
+
+def _number(value: float) -> str:
+	return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+conversionSeconds = histogram('xml2docx_conversion_seconds', 'Duration of the conversions by output format.', ('format',),
+	(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+conversions = counter('xml2docx_conversions_total', 'Conversions by output format and result (ok or failed).', ('format', 'result'))
+inputBytes = histogram('xml2docx_input_bytes', 'Size of the converted XML documents.', (),
+	(4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864))
+fetches = counter('xml2docx_fetches_total', 'Drafts and references by host and source: memory, cache (offline or host failing), revalidated (304), downloaded, error or rejected (circuit breaker open).', ('host', 'source'))
+fetchRetries = counter('xml2docx_fetch_retries_total', 'Retries of the network fetches by host.', ('host',))
+fetchSeconds = histogram('xml2docx_fetch_seconds', 'Duration of the network fetches by host.', ('host',),
+	(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+jobs = gauge('xml2docx_jobs', 'Jobs of jobServer.py by status (queued, running or retained).', ('status',))
+
+def render() -> str:
+	with lock:
+		return '\n'.join(line for item in registry for line in item.render()) + '\n'
+
+def snapshot() -> Dict[str, Dict[Tuple[str, ...], Any]]:
+	# Picklable copy of all the values, e.g., to be merged by the process running the pool of workers
+	with lock:
+		return {item.name: {labelValues: (list(value) if isinstance(value, list) else value) for labelValues, value in item.values.items()} for item in registry}
+
+def merge(values: Dict[str, Dict[Tuple[str, ...], Any]]) -> None:
+	with lock:
+		for item in registry:
+			item.merge(values.get(item.name, {}))
+
+def reset() -> None:
+	with lock:
+		for item in registry:
+			item.values.clear()
+
+def addToFile(filename: str) -> None:
+	# The values of this process (since the previous call) are added to those of the previous runs, kept in
+	# filename + '.json', then all of them are written into filename. Both are replaced atomically, under a lock
+	# for the concurrent runs.
+	current = snapshot()
+	statePath = filename + '.json'
+	with open(filename + '.lock', 'a') as lockFile:
+		try:
+			import fcntl
+			fcntl.flock(lockFile, fcntl.LOCK_EX)
+		except ImportError:  # Windows, let's hope there is a single run at a time
+			pass
+		reset()
+		try:
+			with open(statePath, 'r', encoding='utf-8') as f:
+				merge({name: {tuple(labelValues): value for labelValues, value in values} for name, values in json.load(f).items()})
+		except (OSError, ValueError):
+			pass
+		merge(current)
+		state = {name: [[list(labelValues), value] for labelValues, value in values.items()] for name, values in snapshot().items()}
+		for path, text in ((statePath, json.dumps(state)), (filename, render())):
+			with open(path + '.tmp', 'w', encoding='utf-8') as f:
+				f.write(text)
+			os.replace(path + '.tmp', path)
+		reset()
@@ -23,16 +23,39 @@ $local_xmlfname = $_FILES['xmlfile']['tmp_name'] ;
 $local_file_type = $_FILES['xmlfile']['type'] ;
 $local_file_size = $_FILES['xmlfile']['size'] ;
 
-$local_word_xml = tempnam(sys_get_temp_dir(), 'XML') . ".xml" ;
-$local_docx = tempnam(sys_get_temp_dir(), 'DOC') . ".docx" ;
-
-$shell_command = escapeshellcmd("/usr/bin/python3 ./xml2docx.py --docx $local_docx --ifile $local_xmlfname  --ofile $local_word_xml") ;
-exec($shell_command, $output, $return_code) ;
+# The upload is piped into the converter, the .docx and the errors go to temporary files: the headers are only
+# sent once the exit status of the converter is known
+$local_docx = tempnam(sys_get_temp_dir(), 'xml2docx') ;
+$local_errors = tempnam(sys_get_temp_dir(), 'xml2docx') ;
+$descriptors = array(
+	0 => array('file', $local_xmlfname, 'r'),
+	1 => array('file', $local_docx, 'w'),
+	2 => array('file', $local_errors, 'w')) ;
+$process = proc_open(array('/usr/bin/python3', './xml2docx.py', '--ifile', '-', '--docx', '-', '--no-local-includes'), $descriptors, $pipes) ;
+if (!is_resource($process)) {
+	unlink($local_docx) ;
+	unlink($local_errors) ;
+	die("Cannot start the conversion") ;
+}
+$status = proc_close($process) ;
+clearstatcache() ;  # The sizes of the files written by the converter
+if ($status != 0 or filesize($local_docx) == 0) {
+	http_response_code(500) ;
+	header('Content-Type: text/plain; charset=utf-8') ;
+	print("Cannot convert $remote_xmlfname (exit status $status)\n") ;
+	readfile($local_errors) ;
+	unlink($local_docx) ;
+	unlink($local_errors) ;
+	exit ;
+}
 
 # Send the right headers
 header('Content-Type: application/vnd.openxmlformats-officedocument.wordprocessingml.document');
 header("Content-Disposition: attachment; filename=\"$remote_docx\"");
+header('Content-Length: ' . filesize($local_docx)) ;
 readfile($local_docx) ;
+unlink($local_docx) ;
+unlink($local_errors) ;
 
 exit ;
 ?>
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Regression gate over the drafts of the regression directory, run with:
+#   python3 regression.py [-r <runs>] [-t <time threshold %>] [-M <memory threshold %>] [-u] [draft ...]
+# Every draft is converted into .docx and .md (in reproducible mode) and:
+#	word/document.xml and the .md must be identical to regression/golden/<draft>.document.xml and <draft>.md
+#	the best time of <runs> conversions and the peak memory (tracemalloc) must not exceed regression/baseline.json
+#	by more than the thresholds. The times are stored relative to a calibration loop, so that the baseline
+#	remains meaningful on another machine.
+# With -u, the golden outputs and the baseline are rewritten from the current code, to be committed with the change
+# that intentionally modifies the output or the performance. The exit code is 1 when anything regressed.
+
+import sys, os, getopt, json, time, glob, difflib, tracemalloc, zipfile, io
+from typing import List, Tuple, Optional
+
+import xml2docx
+
+here = os.path.dirname(os.path.abspath(__file__))
+corpusDirectory = os.path.join(here, 'regression')
+goldenDirectory = os.path.join(corpusDirectory, 'golden')
+baselineFilename = os.path.join(corpusDirectory, 'baseline.json')
+outputFormats = ('docx', 'md')
+
+def calibrate(runs: int) -> float:
+	# Best time of a fixed pure Python workload close to a conversion: parsing and serializing a DOM
+	from xml.dom import minidom
+	document = ''.join(f'<t anchor="t{i}">Paragraph {i} with <xref target="t0"/> some text.</t>' for i in range(2000))
+	elapsed = float('inf')
+	for run in range(runs):
+		start = time.perf_counter()
+		minidom.parseString('<middle>' + document + '</middle>').toxml()
+		elapsed = min(elapsed, time.perf_counter() - start)
+	return elapsed
+
+def output(draft: bytes, outputFormat: str) -> bytes:
+	result = xml2docx.convert(draft, outputFormat, reproducible = True)
+	if outputFormat == 'docx':  # The other parts come from the template, only the document is compared
+		with zipfile.ZipFile(io.BytesIO(result)) as package:
+			return package.read('word/document.xml')
+	return result
+
+def measure(draft: bytes, outputFormat: str, runs: int) -> Tuple[bytes, float, int]:
+	# Returns the output, the best time of runs conversions and the peak of allocated bytes (measured apart, as
+	# tracemalloc slows everything down)
+	result = output(draft, outputFormat)  # Warm up, e.g., the template is loaded once
+	elapsed = float('inf')
+	for run in range(runs):
+		start = time.perf_counter()
+		output(draft, outputFormat)
+		elapsed = min(elapsed, time.perf_counter() - start)
+	tracemalloc.start()
+	output(draft, outputFormat)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return result, elapsed, peak
+
+def goldenFilename(name: str, outputFormat: str) -> str:
+	return os.path.join(goldenDirectory, name + ('.document.xml' if outputFormat == 'docx' else '.md'))
+
+def compareOutput(name: str, outputFormat: str, result: bytes) -> bool:
+	try:
+		with open(goldenFilename(name, outputFormat), 'rb') as f:
+			golden = f.read()
+	except OSError:
+		print(f'\t{name}: no golden {outputFormat} output, run regression.py -u')
+		return False
+	if result == golden:
+		return True
+	print(f'\t{name}: the {outputFormat} output differs from {os.path.relpath(goldenFilename(name, outputFormat))}')
+	# document.xml is a single line, let's break it at every element to get a readable diff
+	lines = lambda text: text.decode('utf-8', 'replace').replace('><', '>\n<').splitlines()
+	for line in list(difflib.unified_diff(lines(golden), lines(result), 'golden', 'current', n = 1, lineterm = ''))[0:40]:
+		print('\t\t' + line)
+	return False
+
+def compareBaseline(label: str, value: float, baseline: Optional[float], threshold: float, unit: str) -> bool:
+	if baseline is None:
+		print(f'\t{label}: no baseline, run regression.py -u')
+		return False
+	change = (value - baseline) / baseline * 100
+	regressed = change > threshold
+	print(f'\t{label:<24} {value:12.3f} {unit} baseline {baseline:12.3f} {unit} {change:+7.1f} %' + ('  REGRESSION' if regressed else ''))
+	return not regressed
+
+def main(argv: List[str]) -> None:
+	usage = 'regression.py [-r <runs>] [-t <time threshold %>] [-M <memory threshold %>] [-u] [draft ...]'
+	runs = 5
+	timeThreshold = 25.0
+	memoryThreshold = 10.0
+	update = False
+	try:
+		opts, args = getopt.getopt(argv, "hM:r:t:u")
+	except getopt.GetoptError:
+		print(usage)
+		sys.exit(2)
+	for opt, arg in opts:
+		if opt == '-h':
+			print(usage)
+			sys.exit()
+		elif opt == '-r':
+			runs = int(arg)
+		elif opt == '-t':
+			timeThreshold = float(arg)
+		elif opt == '-M':
+			memoryThreshold = float(arg)
+		elif opt == '-u':
+			update = True
+	drafts = sorted(glob.glob(os.path.join(corpusDirectory, '*.xml')))
+	if args:
+		drafts = [filename for filename in drafts if os.path.basename(filename)[:-4] in args]
+	if not drafts:
+		print('No draft to check in ' + corpusDirectory)
+		sys.exit(2)
+	try:
+		with open(baselineFilename, 'r', encoding='utf-8') as f:
+			baseline = json.load(f)
+	except (OSError, ValueError):
+		baseline = {'drafts': {}}
+
+	calibration = calibrate(runs)
+	print(f'Calibration {calibration * 1000:.1f} ms, best of {runs} runs, thresholds {timeThreshold:g} % for the time and {memoryThreshold:g} % for the memory')
+	passed = True
+	for filename in drafts:
+		name = os.path.basename(filename)[:-4]
+		with open(filename, 'rb') as f:
+			draft = f.read()
+		print(name + ':')
+		for outputFormat in outputFormats:
+			result, elapsed, peak = measure(draft, outputFormat, runs)
+			if update:
+				os.makedirs(goldenDirectory, exist_ok = True)
+				with open(goldenFilename(name, outputFormat), 'wb') as f:
+					f.write(result)
+				baseline['drafts'].setdefault(name, {})[outputFormat] = {'time': round(elapsed / calibration, 4), 'peak': peak}
+				print(f'\t{outputFormat:<5} {elapsed * 1000:10.1f} ms {peak / 1024:10.1f} KB peak, golden output and baseline updated')
+				continue
+			expected = baseline['drafts'].get(name, {}).get(outputFormat, {})
+			passed &= compareOutput(name, outputFormat, result)
+			passed &= compareBaseline(outputFormat + ' time', elapsed / calibration, expected.get('time'), timeThreshold, 'cal')
+			passed &= compareBaseline(outputFormat + ' peak memory', peak / 1024, expected['peak'] / 1024 if 'peak' in expected else None, memoryThreshold, 'KB')
+	if update:
+		baseline['python'] = sys.version.split()[0]  # tracemalloc counts differ between Python versions
+		with open(baselineFilename, 'w', encoding='utf-8') as f:
+			json.dump(baseline, f, indent = 1, sort_keys = True)
+			f.write('\n')
+		return
+	if baseline.get('python') not in (None, sys.version.split()[0]):
+		print(f"The baseline was measured with Python {baseline['python']}, the memory figures may differ")
+	print('PASSED' if passed else 'FAILED')
+	sys.exit(0 if passed else 1)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
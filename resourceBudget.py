@@ -0,0 +1,160 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Limits of the resources used by one conversion, so that a hostile or broken draft cannot stall a server
+# The XML is counted while expat parses it (bytes, elements, depth and the text after entity expansion),
+# the fetches are counted by xml2docx.fetchURL() and the deadline is checked all along the conversion.
+
+import time
+from xml.dom import expatbuilder, minidom
+from typing import Optional, Dict, Union
+
+class budgetExceeded(Exception):
+	# limit is one of 'input', 'elements', 'depth', 'expansion', 'fetches' or 'deadline'
+
+	def __init__(self, limit: str, value: Union[int, float], maximum: Union[int, float]) -> None:
+		super().__init__(limit, value, maximum)  # Keeps the exception picklable for the process pools
+		self.limit = limit
+		self.value = value
+		self.maximum = maximum
+
+	def __str__(self) -> str:
+		return f'{self.limit} budget exceeded: {self.value} > {self.maximum}'
+
+	def asDict(self) -> Dict[str, Union[str, int, float]]:
+		return {'limit': self.limit, 'value': self.value, 'maximum': self.maximum}
+
+class resourceBudget:
+	# None means no limit
+	maxInputBytes: Optional[int] = 32 * 1024 * 1024  # For the draft and for every fetched document
+	maxElements: Optional[int] = 2000000  # Sum over the draft and the fetched documents
+	maxDepth: Optional[int] = 256
+	maxFetches: Optional[int] = 500
+	deadline: Optional[float] = 300  # Seconds for the whole conversion
+	expansionFactor = 10  # Text allowed after entity expansion, relative to maxInputBytes
+
+	# Names used by fromString(), e.g., 'input=8M,elements=100000,depth=64,fetches=0,deadline=30'
+	names = {'input': 'maxInputBytes', 'elements': 'maxElements', 'depth': 'maxDepth', 'fetches': 'maxFetches', 'deadline': 'deadline'}
+
+	def __init__(self, **limits) -> None:
+		for name, value in limits.items():
+			if not hasattr(self, name):
+				raise ValueError('Unknown budget ' + name)
+			setattr(self, name, value)
+		self.start()
+
+	@classmethod
+	def fromString(cls, text: str) -> 'resourceBudget':
+		limits = {}
+		for item in text.split(','):
+			name, _, value = item.partition('=')
+			if name not in cls.names:
+				raise ValueError('Unknown budget ' + name + ', expecting ' + ', '.join(cls.names))
+			multiplier = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}.get(value[-1:].upper(), 1)
+			if multiplier > 1:
+				value = value[:-1]
+			limits[cls.names[name]] = None if value in ('', 'none') else (float(value) if name == 'deadline' else int(value) * multiplier)
+		return cls(**limits)
+
+	def start(self) -> None:
+		# To be called at the beginning of every conversion
+		self.deadlineTime = None if self.deadline is None else time.monotonic() + self.deadline
+		self.elements = 0
+		self.fetches = 0
+
+	def remaining(self) -> Optional[float]:
+		# Seconds left before the deadline
+		return None if self.deadlineTime is None else self.deadlineTime - time.monotonic()
+
+	def checkDeadline(self) -> None:
+		if self.deadlineTime is not None and time.monotonic() > self.deadlineTime:
+			raise budgetExceeded('deadline', round(self.deadline - self.remaining(), 3), self.deadline)
+
+	def countFetch(self) -> None:
+		self.checkDeadline()
+		self.fetches += 1
+		if self.maxFetches is not None and self.fetches > self.maxFetches:
+			raise budgetExceeded('fetches', self.fetches, self.maxFetches)
+
+	def fetchTimeout(self, timeout: float) -> float:
+		# A fetch must not outlive the conversion
+		remaining = self.remaining()
+		return timeout if remaining is None else max(min(timeout, remaining), 0.1)
+
+	def parse(self, stream, builder: Optional['budgetedBuilder'] = None) -> minidom.Document:
+		# Same as minidom.parse() for a binary stream, within the budget
+		if builder is None:
+			builder = budgetedBuilder(self)
+		return builder.parseFile(_countingStream(stream, self))
+
+	def parseString(self, data: bytes, builder: Optional['budgetedBuilder'] = None) -> minidom.Document:
+		if self.maxInputBytes is not None and len(data) > self.maxInputBytes:
+			raise budgetExceeded('input', len(data), self.maxInputBytes)
+		if builder is None:
+			builder = budgetedBuilder(self)
+		return builder.parseString(data)
+
+class _countingStream:
+
+	def __init__(self, stream, budget: resourceBudget) -> None:
+		self.stream = stream
+		self.budget = budget
+		self.count = 0
+
+	def read(self, size: int = -1) -> bytes:
+		data = self.stream.read(size)
+		self.count += len(data)
+		if self.budget.maxInputBytes is not None and self.count > self.budget.maxInputBytes:
+			raise budgetExceeded('input', self.count, self.budget.maxInputBytes)
+		return data
+
+class budgetedBuilder(expatbuilder.ExpatBuilderNS):
+	# The DOM builder used by minidom.parse(), counting along the expat callbacks
+
+	def __init__(self, budget: resourceBudget) -> None:
+		super().__init__()
+		self.budget = budget
+		self.depth = 0
+		self.text = 0
+		self.maxText = None if budget.maxInputBytes is None else budget.maxInputBytes * budget.expansionFactor
+
+	def start_element_handler(self, name, attributes):
+		budget = self.budget
+		budget.elements += 1
+		self.depth += 1
+		if budget.maxElements is not None and budget.elements > budget.maxElements:
+			raise budgetExceeded('elements', budget.elements, budget.maxElements)
+		if budget.maxDepth is not None and self.depth > budget.maxDepth:
+			raise budgetExceeded('depth', self.depth, budget.maxDepth)
+		if budget.elements % 1000 == 0:
+			budget.checkDeadline()
+		return super().start_element_handler(name, attributes)
+
+	def end_element_handler(self, name):
+		self.depth -= 1
+		return super().end_element_handler(name)
+
+	def _countText(self, data: str) -> None:
+		# Internal entities are expanded by expat before this point, a small input may still give a lot of text
+		self.text += len(data)
+		if self.maxText is not None and self.text > self.maxText:
+			raise budgetExceeded('expansion', self.text, self.maxText)
+
+	def character_data_handler(self, data):
+		self._countText(data)
+		return super().character_data_handler(data)
+
+	def character_data_handler_cdata(self, data):
+		self._countText(data)
+		return super().character_data_handler_cdata(data)
@@ -0,0 +1,115 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Analysis only: a JSON report of the metadata and statistics of a draft, without any rendering
+
+from xmlWriter import xmlWriter, plainText
+import io, json, re, logging
+
+logger = logging.getLogger('xml2docx.statsWriter')
+
+# Per RFC 2119 and RFC 8174, the quoted keywords (e.g., in the boilerplate) are not counted
+bcp14Pattern = re.compile(r'(?<!["\w])(MUST NOT|MUST|REQUIRED|SHALL NOT|SHALL|SHOULD NOT|SHOULD|NOT RECOMMENDED|RECOMMENDED|MAY|OPTIONAL)(?!["\w])')
+
+class statsWriter(xmlWriter):
+    # The included references are only counted by their names (see xml2docx.countInclude()), their words are not
+    resolvesIncludes = False
+
+    def __init__(self, filename = None):
+        super().__init__(filename)
+        self.words = {'abstract': 0, 'middle': 0, 'back': 0}
+        self.paragraphs = 0
+        self.headings = 0
+        self.figures = 0
+        self.tables = 0
+        self.bcp14 = {}  # Count by keyword
+
+    def report(self):
+        return {
+            'metadata': self.metaData,
+            'normativeReferences': self.normativeReferences,
+            'informativeReferences': self.informativeReferences,
+            'words': dict(self.words, total = sum(self.words.values())),
+            'paragraphs': self.paragraphs,
+            'sections': self.headings,
+            'figures': self.figures,
+            'tables': self.tables,
+            'bcp14': self.bcp14,
+        }
+
+    def save(self, stream = None):
+        # The JSON report goes to self.filename or, if specified, to the binary stream
+        super().save()
+        if stream is None:
+            logger.info('Generating statistics file %s', self.filename)
+            f = open(self.filename, 'w', encoding='utf-8')
+        else:
+            f = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
+            json.dump(self.report(), f, indent = 1)
+            f.write('\n')
+        finally:
+            if stream is None:
+                f.close()
+            else:
+                f.flush()
+                f.detach()  # Leave the caller stream open
+
+    def getFragment(self):
+        fragment = super().getFragment()
+        fragment['stats'] = (self.words, self.paragraphs, self.headings, self.figures, self.tables, self.bcp14)
+        return fragment
+
+    def addFragment(self, fragment):
+        super().addFragment(fragment)
+        words, paragraphs, headings, figures, tables, bcp14 = fragment['stats']
+        for part, count in words.items():
+            self.words[part] += count
+        self.paragraphs += paragraphs
+        self.headings += headings
+        self.figures += figures
+        self.tables += tables
+        for keyword, count in bcp14.items():
+            self.bcp14[keyword] = self.bcp14.get(keyword, 0) + count
+
+    def newParagraph(self, textValue, style = 'Normal', justification = None, unnumbered = None,
+                  numberingID = None, indentationLevel = None, removeEmpty = True,
+                  language = 'en-US', cdataSection = None, anchor = None):
+        super().newParagraph(textValue, style = style, justification = justification, unnumbered = unnumbered,
+                  numberingID = numberingID, indentationLevel = indentationLevel, removeEmpty = removeEmpty,
+                  language = language, cdataSection = cdataSection, anchor = anchor)
+        if textValue is None:
+            return
+        if style is not None and style.startswith('Heading'):
+            self.headings += 1
+            return
+        if cdataSection:  # Artwork and source code are not prose
+            return
+        textValue = plainText(textValue)
+        words = len(textValue.split())
+        if words == 0:
+            return
+        self.paragraphs += 1
+        if style == 'Abstract':
+            self.words['abstract'] += words
+        else:
+            self.words['middle' if self.inMiddle else 'back'] += words
+        for keyword in bcp14Pattern.findall(textValue):
+            self.bcp14[keyword] = self.bcp14.get(keyword, 0) + 1
+
+    def newTable(self, table):
+        self.tables += 1
+
+    def newFigure(self, figure):
+        self.figures += 1
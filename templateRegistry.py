@@ -0,0 +1,93 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# In-memory registry of the .docx templates for long-running processes
+# A template directory is read once (raw parts and parsed docProps/core.xml) and then served from memory.
+# Its files are checked for changes at most every checkInterval seconds and a changed template is
+# loaded again in full before replacing the old one, so a conversion never sees a half-loaded template.
+
+import os, time, threading, logging
+from xml.dom import minidom
+from typing import Optional, Dict, List
+
+logger = logging.getLogger('xml2docx.templateRegistry')
+
+# The parts copied as is into every .docx, docProps/core.xml and word/document.xml are generated
+parts = [ '[Content_Types].xml', '_rels/.rels', 'docProps/app.xml',
+	'word/fontTable.xml', 'word/settings.xml', 'word/numbering.xml', 'word/webSettings.xml',
+	'word/styles.xml', 'word/theme/theme1.xml', 'word/_rels/document.xml.rels']
+
+defaultDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template')  # Next to this module
+checkInterval = 2.0  # Seconds between two checks of the template files
+
+class docxTemplate:
+	directory: str
+	parts: Dict[str, bytes]  # Raw content of the parts copied as is
+	coreProperties: minidom.Document  # Parsed docProps/core.xml, to be cloned before any change
+
+	def __init__(self, directory: str) -> None:
+		self.directory = directory
+		self.parts = {}
+		for part in parts:
+			with open(os.path.join(directory, part), 'rb') as f:
+				self.parts[part] = f.read()
+		self.coreProperties = minidom.parse(os.path.join(directory, 'docProps', 'core.xml'))
+		self.modificationTimes = self._modificationTimes()
+		self.checked = time.monotonic()
+
+	def _modificationTimes(self) -> List[float]:
+		return [os.stat(os.path.join(self.directory, part)).st_mtime_ns for part in parts + ['docProps/core.xml']]
+
+	def isStale(self) -> bool:
+		try:
+			return self._modificationTimes() != self.modificationTimes
+		except OSError:  # Being replaced, let's keep the current one until the next check
+			return False
+
+	def newCoreProperties(self) -> minidom.Document:
+		return self.coreProperties.cloneNode(True)
+
+templates: Dict[str, docxTemplate] = {}  # Loaded templates by name or absolute directory
+directories: Dict[str, str] = {}  # Registered template names and their directories
+lock = threading.Lock()
+
+def register(name: str, directory: str) -> None:
+	# Makes a template available by name, e.g., jobServer.py -t for the uploads to pick one per request
+	with lock:
+		directories[name] = os.path.abspath(directory)
+		templates.pop(name, None)
+
+def get(name: Optional[str] = None) -> docxTemplate:
+	# name is a registered name, a template directory or None for the default template
+	if name is None:
+		name = defaultDirectory
+	elif name not in directories:
+		name = os.path.abspath(name)
+	template = templates.get(name)
+	if template is not None:
+		if time.monotonic() - template.checked < checkInterval:
+			return template
+		template.checked = time.monotonic()
+		if not template.isStale():
+			return template
+		logger.info('Template %s has changed, reloading it', template.directory)
+	with lock:
+		if templates.get(name) is template:  # Else another thread has just (re)loaded it
+			try:
+				templates[name] = docxTemplate(directories.get(name, name))
+			except Exception as err:
+				if template is None:
+					raise
+				logger.warning('Cannot reload template %s, keeping the previous one: %s', template.directory, err)
+		return templates[name]
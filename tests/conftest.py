@@ -0,0 +1,82 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Shared fixtures, run the tests with: python3 -m pytest tests
+
+import os, sys, time, threading
+import http.server
+
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+import urlCache, metrics
+
+class standInHandler(http.server.BaseHTTPRequestHandler):
+	# Behaves as told by the server attributes: mode 'ok', 'slow' (sleeps delay seconds) or 'fail' (503)
+
+	def do_GET(self) -> None:
+		server = self.server
+		server.hits.append((self.path, dict(self.headers)))
+		if server.mode == 'slow':
+			time.sleep(server.delay)
+		if server.mode == 'fail':
+			self.send_error(503)
+			return
+		if self.path.endswith('/missing.xml'):
+			self.send_error(404)
+			return
+		if server.etag is not None and self.headers.get('If-None-Match') == server.etag:
+			self.send_response(304)
+			self.end_headers()
+			return
+		self.send_response(200)
+		if server.etag is not None:
+			self.send_header('ETag', server.etag)
+		self.send_header('Content-Length', str(len(server.body)))
+		self.end_headers()
+		self.wfile.write(server.body)
+
+	def log_message(self, format: str, *args) -> None:
+		pass
+
+@pytest.fixture
+def standInServer():
+	# A local HTTP server standing for the IETF ones, server.url(path) gives the URL of a document
+	server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), standInHandler)
+	server.daemon_threads = True
+	server.mode = 'ok'
+	server.delay = 0
+	server.etag = '"v1"'
+	server.body = b'<reference anchor="RFC2119"><front><title>Key words</title></front></reference>'
+	server.hits = []
+	server.url = lambda path: f'http://127.0.0.1:{server.server_address[1]}/{path}'
+	threading.Thread(target = server.serve_forever, daemon = True).start()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+	# An empty cache and a fresh urlCache state for every test
+	monkeypatch.setattr(urlCache, 'cacheDirectory', str(tmp_path / 'cache'))
+	monkeypatch.setattr(urlCache, 'offline', False)
+	monkeypatch.setattr(urlCache, 'mirror', None)
+	urlCache.fetched.clear()
+	urlCache.breakers.clear()
+	metrics.reset()
+	yield urlCache
+	urlCache.fetched.clear()
+	urlCache.breakers.clear()
@@ -0,0 +1,230 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os, sys, io, zipfile, subprocess
+
+import pytest
+
+import xml2docx
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+draftFilename = os.path.join(repository, 'regression', 'v3-structure.xml')
+
+@pytest.fixture
+def draft():
+	with open(draftFilename, 'rb') as f:
+		return f.read()
+
+def run(arguments, environment = None, input = None):
+	# xml2docx.py as process.php runs it, returns its stdout
+	result = subprocess.run([sys.executable, os.path.join(repository, 'xml2docx.py')] + arguments, input = input,
+		stdout = subprocess.PIPE, stderr = subprocess.PIPE, env = dict(os.environ, **(environment or {})), check = True)
+	return result.stdout
+
+def test_source_date_epoch(tmp_path):
+	# Dated by SOURCE_DATE_EPOCH rather than by the clock, so two runs give the same bytes
+	environment = {'SOURCE_DATE_EPOCH': '1700000000', 'XML2DOCX_CACHE': str(tmp_path)}
+	first = run(['-i', draftFilename, '--docx', '-'], environment)
+	with zipfile.ZipFile(io.BytesIO(first)) as package:
+		assert {info.date_time for info in package.infolist()} == {(2023, 11, 14, 22, 13, 20)}
+		assert b'2023-11-14T22:13:20Z' in package.read('docProps/core.xml')
+	assert run(['-i', draftFilename, '--docx', '-'], environment) == first
+
+def test_reproducible_convert(draft, monkeypatch):
+	# Without SOURCE_DATE_EPOCH, the date of the draft is used
+	monkeypatch.delenv('SOURCE_DATE_EPOCH', raising = False)
+	first = xml2docx.convert(draft, 'docx', reproducible = True)
+	with zipfile.ZipFile(io.BytesIO(first)) as package:
+		assert {info.date_time for info in package.infolist()} == {(2026, 2, 1, 0, 0, 0)}
+	assert xml2docx.convert(draft, 'docx', reproducible = True) == first
+	assert xml2docx.convert(draft, 'md', reproducible = True) == xml2docx.convert(draft, 'md', reproducible = True)
+
+@pytest.mark.parametrize('month', ['March', 'Mar'])
+def test_reproducible_month_year(draft, monkeypatch, month):
+	# A draft dated by month and year only is dated the 1st of the month, not 1980
+	monkeypatch.delenv('SOURCE_DATE_EPOCH', raising = False)
+	draft = draft.replace(b'<date day="1" month="February" year="2026"/>', b'<date month="' + month.encode() + b'" year="2026"/>')
+	with zipfile.ZipFile(io.BytesIO(xml2docx.convert(draft, 'docx', reproducible = True))) as package:
+		assert {info.date_time for info in package.infolist()} == {(2026, 3, 1, 0, 0, 0)}
+		assert b'2026-03-01T00:00:00Z' in package.read('docProps/core.xml')
+
+@pytest.mark.parametrize('limits, limit', [
+	({'maxElements': 10}, 'elements'),
+	({'maxDepth': 3}, 'depth'),
+	({'maxInputBytes': 1024}, 'input'),
+	({'deadline': 0}, 'deadline'),
+])
+def test_budget_exceeded(draft, limits, limit):
+	with pytest.raises(xml2docx.budgetExceeded) as info:
+		xml2docx.convert(draft, 'md', budget = xml2docx.resourceBudget(**limits))
+	assert info.value.limit == limit
+
+def test_entity_expansion():
+	laughs = b'<!DOCTYPE rfc [<!ENTITY a "' + b'x' * 1000 + b'"><!ENTITY b "&a;&a;&a;&a;&a;&a;&a;&a;&a;&a;"><!ENTITY c "&b;&b;&b;&b;&b;&b;&b;&b;&b;&b;">]>' + \
+		b'<rfc><front><title>&c;&c;&c;&c;</title></front><middle/></rfc>'
+	with pytest.raises(xml2docx.budgetExceeded) as info:
+		xml2docx.convert(laughs, 'md', budget = xml2docx.resourceBudget(maxInputBytes = 10000))
+	assert info.value.limit == 'expansion'
+
+def test_fetch_budget(cache, standInServer):
+	# The fetch is refused before the host is contacted
+	budget = xml2docx.resourceBudget(maxFetches = 0)
+	source = ('<rfc><front><title>Fetching</title></front><middle><section><name>One</name><t>Text</t></section></middle><back><references>' +
+		'<xi:include xmlns:xi="http://www.w3.org/2001/XInclude" href="' + standInServer.url('reference.RFC.2119.xml') + '"/></references></back></rfc>').encode('utf-8')
+	with pytest.raises(xml2docx.budgetExceeded) as info:
+		xml2docx.convert(source, 'md', budget = budget)
+	assert info.value.limit == 'fetches'
+	assert standInServer.hits == []
+
+def test_within_budget(draft):
+	assert xml2docx.convert(draft, 'md', budget = xml2docx.resourceBudget()) == xml2docx.convert(draft, 'md')
+
+@pytest.mark.parametrize('compression', ['none', 'gzip', 'xz'])
+def test_compressed_stdin(draft, compression):
+	import gzip, lzma
+	compressed = {'none': draft, 'gzip': gzip.compress(draft), 'xz': lzma.compress(draft)}[compression]
+	expected = run(['-i', draftFilename, '--md', '-'])
+	assert run(['--ifile', '-', '--md', '-'], input = compressed) == expected
+	assert xml2docx.convert(compressed, 'md') == xml2docx.convert(io.BytesIO(compressed), 'md') == xml2docx.convert(draft, 'md')
+
+def test_compressed_file(draft, tmp_path):
+	import gzip
+	filename = tmp_path / 'v3-structure.xml.gz'
+	filename.write_bytes(gzip.compress(draft))
+	assert run(['-i', str(filename), '--md', '-']) == run(['-i', draftFilename, '--md', '-'])
+
+anchorsDraft = b'''<rfc version="3" docName="draft-anchors-00"><front><title>Anchors</title></front><middle>
+<section anchor="intro"><name>Introduction</name><t>See <xref target="later"/>, <xref target="fig-one"/>, <xref target="tab-one"/> and <xref target="RFC2119"/>, or <xref target="later">the next one</xref>.</t></section>
+<section anchor="later"><name>Later</name>
+<figure anchor="fig-one"><name>One</name><artwork>a -> b</artwork></figure>
+<table anchor="tab-one"><name>Codes</name><thead><tr><th>Code</th></tr></thead><tbody><tr><td>0</td></tr></tbody></table>
+</section></middle><back><references><name>Normative References</name>
+<reference anchor="RFC2119" target="https://www.rfc-editor.org/info/rfc2119"><front><title>Key words</title><author fullname="S. Bradner"/><date month="March" year="1997"/></front></reference>
+</references></back></rfc>'''
+
+def test_xref_text():
+	# An empty xref gets the number of what it targets
+	assert b'See Section 2, Figure 1, Table 1 and [RFC2119], or the next one.' in xml2docx.convert(anchorsDraft, 'md')
+
+def test_xref_bookmarks():
+	import re
+	with zipfile.ZipFile(io.BytesIO(xml2docx.convert(anchorsDraft, 'docx'))) as package:
+		document = package.read('word/document.xml').decode('utf-8')
+	links = re.findall(r'<w:hyperlink w:anchor="([^"]+)"', document)
+	bookmarks = re.findall(r'<w:bookmarkStart w:id="\d+" w:name="([^"]+)"', document)
+	assert len(links) == 5
+	assert set(links) <= set(bookmarks)
+	assert len(bookmarks) == len(set(bookmarks))
+	# The section link goes to the bookmark of the heading of that section
+	section = re.search(r'<w:hyperlink w:anchor="([^"]+)"[^>]*>(?:(?!</w:hyperlink>).)*Section 2', document, re.DOTALL).group(1)
+	assert re.search(r'<w:bookmarkStart w:id="\d+" w:name="' + section + r'"/>(?:(?!</w:p>).)*>Later<', document, re.DOTALL)
+
+def test_sections_fetch_only_selected_entities(cache, standInServer, monkeypatch):
+	# The external entity of an unselected section is never fetched, nor left in the document
+	monkeypatch.setattr(cache, 'mirror', standInServer.url('').rstrip('/'))  # For the reference host
+	standInServer.body = b'<t>Fetched text.</t>'
+	draft = b'''<?xml version="1.0"?>
+<!DOCTYPE rfc [
+<!ENTITY selected SYSTEM "https://bib.ietf.org/selected.xml">
+<!ENTITY unselected SYSTEM "https://bib.ietf.org/unselected.xml">
+]>
+<rfc version="3" docName="draft-sections-00"><front><title>Sections</title></front><middle>
+<section anchor="one"><name>One</name>&unselected;</section>
+<section anchor="two"><name>Two</name>&selected;</section>
+</middle><back/></rfc>'''
+	result = xml2docx.convert(draft, 'md', sections = ['two'])
+	assert [path for path, headers in standInServer.hits] == ['/bib.ietf.org/selected.xml']
+	assert b'# Two\n\nFetched text.' in result
+	assert b'One' not in result
+	assert '<?xml2docx-entity' not in xml2docx.xmldoc.toxml()
+
+def test_sections_nested(draft):
+	# A nested section comes after the headings of the sections enclosing it, and only once
+	result = xml2docx.convert(draft, 'md', sections = ['nested', 'Tables and Figures'])
+	middle = result[result.index(b'--- middle'):result.index(b'--- back')]
+	assert [line for line in middle.splitlines() if line.startswith(b'#')] == [b'# Lists', b'## An Unnumbered Subsection', b'# Tables and Figures']
+	assert b'A bullet.' not in middle  # Only the heading of the enclosing section
+	with zipfile.ZipFile(io.BytesIO(xml2docx.convert(draft, 'docx', sections = ['nested']))) as package:
+		document = package.read('word/document.xml').decode('utf-8')
+	assert document.index('Heading1') < document.index('>Lists<') < document.index('Heading2') < document.index('>An Unnumbered Subsection<')
+
+def test_log_stream(draft, capsys):
+	# The messages of a conversion go to its log stream, not to sys.stdout which other threads may be using
+	log = io.StringIO()
+	xml2docx.convert(draft, 'md', log = log)
+	assert 'parseDisplayReference not yet implemented' in log.getvalue()
+	xml2docx.convert(draft, 'md')
+	assert capsys.readouterr().out == ''
+	assert all(getattr(handler, 'stream', None) is not log for handler in xml2docx.logger.handlers)  # Only during the call
+
+def test_lazy_imports():
+	# A local draft into markdown needs neither the metrics, the URL parsing nor logging (nothing is logged)
+	code = ('import sys, xml2docx\n'
+		f'xml2docx.convert({anchorsDraft!r}, "md")\n'
+		'print(" ".join(name for name in ("metrics", "urllib.parse", "json", "logging", "threading") if name in sys.modules))\n')
+	result = subprocess.run([sys.executable, '-c', code], cwd = repository, stdout = subprocess.PIPE, check = True)
+	assert result.stdout.strip() == b''
+
+@pytest.mark.parametrize('outputFormat', ['docx', 'md'])
+def test_parallel_same_as_serial(outputFormat, caplog, monkeypatch):
+	# The sections rendered by 2 processes then merged give the same bytes as a serial conversion
+	calls = []
+	renderParallel = xml2docx.renderParallel
+	monkeypatch.setattr(xml2docx, 'renderParallel', lambda middle, back, jobs: calls.append(jobs) or renderParallel(middle, back, jobs))
+	for filename in ('v2-lists.xml', 'v3-structure.xml'):
+		with open(os.path.join(repository, 'regression', filename), 'rb') as f:
+			source = f.read()
+		for source in (source, anchorsDraft):
+			assert xml2docx.convert(source, outputFormat, jobs = 2, reproducible = True) == xml2docx.convert(source, outputFormat, reproducible = True)
+	assert calls == [2] * 4
+	assert 'in parallel' not in caplog.text  # No fragment was rendered serially after a failure
+
+@pytest.mark.parametrize('outputFormat', ['docx', 'md'])
+def test_memory_budget_spools(draft, outputFormat, monkeypatch):
+	# A low budget spools the pending output to temporary files on disk, the result is the same
+	from xmlWriter import xmlWriter
+	spools = []
+	newSpool = xmlWriter.newSpool
+	def recordedSpool(self):
+		spools.append(newSpool(self))
+		return spools[-1]
+	monkeypatch.setattr(xmlWriter, 'newSpool', recordedSpool)
+	budgeted = xml2docx.convert(draft, outputFormat, memoryBudget = 4 * 1024, reproducible = True)
+	assert spools and any(spool._rolled for spool in spools)  # Over budget // 8 bytes, on disk
+	spools.clear()
+	unbudgeted = xml2docx.convert(draft, outputFormat, reproducible = True)
+	assert spools == []
+	if outputFormat == 'md':
+		assert budgeted == unbudgeted
+		return
+	with zipfile.ZipFile(io.BytesIO(budgeted)) as budgetedPackage, zipfile.ZipFile(io.BytesIO(unbudgeted)) as package:
+		assert budgetedPackage.read('word/document.xml') == package.read('word/document.xml')
+		assert budgetedPackage.namelist() == package.namelist()
+
+def test_artwork_rows_are_lazy(monkeypatch):
+	# The artwork is only split into rows while the writer iterates over them
+	from xml.dom import minidom
+	split = []
+	artworkRows = xml2docx._artworkRows
+	def recordedRows(figureLines):
+		for row in artworkRows(figureLines):
+			split.append(row)
+			yield row
+	monkeypatch.setattr(xml2docx, '_artworkRows', recordedRows)
+	figure = xml2docx.figureFigure()
+	xml2docx.parseArtWork(minidom.parseString('<artwork>+--+ \n<![CDATA[|<>|]]>\n\n+--+</artwork>').documentElement, figure)
+	figure.addRow('last')
+	assert split == []
+	assert list(figure.rows) == ['+--+', '|<>|', '', '+--+', 'last']
+	assert len(split) == 4
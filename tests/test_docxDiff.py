@@ -0,0 +1,165 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os, sys, time, zipfile, subprocess
+import xml.dom.minidom
+
+import docxDiff
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+draft = '''<?xml version="1.0" encoding="UTF-8"?>
+<rfc version="3" category="info" submissionType="IETF" docName="draft-diff-00" ipr="trust200902">
+<front>
+<title>Diff</title>
+<author fullname="Carol Example" initials="C." surname="Example"><organization>Example Labs</organization></author>
+<date day="1" month="February" year="2026"/>
+</front>
+<middle>
+<section anchor="intro">
+<name>Introduction</name>
+<t>The first paragraph is never changed.</t>
+<t>The quick brown fox jumps over the lazy dog.</t>
+</section>
+<section anchor="codes">
+<name>Codes</name>
+<t>See <xref target="later"/>.</t>
+<table anchor="tab-codes">
+<name>Codes</name>
+<thead><tr><th>Code</th><th>Meaning</th></tr></thead>
+<tbody><tr><td>0</td><td>Success</td></tr></tbody>
+</table>
+</section>
+<section anchor="later">
+<name>Later</name>
+<t>The last paragraph is never changed.</t>
+</section>
+</middle>
+<back/>
+</rfc>
+'''
+
+def diffDocument(tmp_path, old, new):
+	# The w:body of the docx of new with the changes from old as tracked changes, and the one of new alone
+	for name, text in (('old.xml', old), ('new.xml', new)):
+		(tmp_path / name).write_text(text)
+	environment = dict(os.environ, SOURCE_DATE_EPOCH = '1700000000', XML2DOCX_CACHE = str(tmp_path))
+	bodies = []
+	for arguments in (['--diff', str(tmp_path / 'old.xml')], []):
+		subprocess.run([sys.executable, os.path.join(repository, 'xml2docx.py'), '-i', str(tmp_path / 'new.xml'),
+			'--docx', str(tmp_path / 'new.docx')] + arguments, stdout = subprocess.DEVNULL, env = environment, check = True)
+		with zipfile.ZipFile(tmp_path / 'new.docx') as package:
+			document = xml.dom.minidom.parseString(package.read('word/document.xml'))
+		bodies.append(elements(document.getElementsByTagName('w:body')[0]))
+	return bodies
+
+def elements(node):
+	return [child for child in node.childNodes if child.nodeType == child.ELEMENT_NODE]
+
+def marks(block):
+	return block.getElementsByTagName('w:ins') + block.getElementsByTagName('w:del')
+
+def texts(block, tagName):
+	return [''.join(text.data for text in t.childNodes) for t in block.getElementsByTagName(tagName)]
+
+def changedRuns(paragraph):
+	# [(None/'w:ins'/'w:del', text)] of the runs of a paragraph, in order
+	runs = []
+	for run in paragraph.getElementsByTagName('w:r'):
+		kind = run.parentNode.nodeName if run.parentNode.nodeName in ('w:ins', 'w:del') else None
+		runs.append((kind, ''.join(texts(run, 'w:t') + texts(run, 'w:delText'))))
+	return runs
+
+def test_inserted_paragraph(tmp_path):
+	# An unnumbered subsection shifts every later bookmark id, that must not show as a change
+	new = draft.replace('lazy dog.</t>\n', 'lazy dog.</t>\n<section anchor="aside" numbered="false"><name>Aside</name><t>A brand new paragraph.</t></section>\n')
+	changed, plain = diffDocument(tmp_path, draft, new)
+	assert len(changed) == len(plain)
+	marked = [block for block in changed if marks(block)]
+	assert [texts(block, 'w:t') for block in marked] == [['Aside'], ['A brand new paragraph.']]
+	for block in marked:
+		assert not block.getElementsByTagName('w:del')
+		assert [run.parentNode.nodeName for run in block.getElementsByTagName('w:r')] == ['w:ins']
+		assert [mark.nodeName for mark in elements(block.getElementsByTagName('w:pPr')[0].getElementsByTagName('w:rPr')[0])] == ['w:ins']
+	for changedBlock, plainBlock in zip(changed, plain):
+		if not marks(changedBlock):
+			assert changedBlock.toxml() == plainBlock.toxml()
+	# The bookmarks after the new subsection have other ids than in the old revision
+	later = [block for block in changed if texts(block, 'w:t') == ['Later']][0]
+	assert later.getElementsByTagName('w:bookmarkStart')[0].getAttribute('w:name') == '_Ref4'
+
+def test_changed_word(tmp_path):
+	changed, plain = diffDocument(tmp_path, draft, draft.replace('lazy', 'sleepy'))
+	assert len(changed) == len(plain)
+	marked = [block for block in changed if marks(block)]
+	assert len(marked) == 1
+	assert changedRuns(marked[0]) == [(None, 'The quick brown fox jumps over the '), ('w:del', 'lazy'), ('w:ins', 'sleepy'), (None, ' dog.')]
+	assert texts(marked[0], 'w:delText') == ['lazy']
+	for mark in marks(marked[0]):
+		assert mark.getAttribute('w:author') == 'xml2docx'
+		assert mark.getAttribute('w:date') == '2023-11-14T22:13:20Z'  # SOURCE_DATE_EPOCH
+	assert len({mark.getAttribute('w:id') for mark in marks(marked[0])}) == 2
+
+def test_deleted_table(tmp_path):
+	start = draft.index('<table')
+	end = draft.index('</table>') + len('</table>\n')
+	changed, plain = diffDocument(tmp_path, draft, draft[:start] + draft[end:])
+	marked = [block for block in changed if marks(block)]
+	# The table and its caption are deleted, nothing is inserted
+	assert [block.nodeName for block in marked] == ['w:tbl', 'w:p']
+	assert len(changed) == len(plain) + 2
+	for block in marked:
+		assert not block.getElementsByTagName('w:ins')
+		assert not block.getElementsByTagName('w:t')
+		assert not block.getElementsByTagName('w:bookmarkStart')
+		assert {run.parentNode.nodeName for run in block.getElementsByTagName('w:r')} == {'w:del'}
+	table = marked[0]
+	assert texts(table, 'w:delText') == ['Code', 'Meaning', '0', 'Success']
+	assert [elements(row.getElementsByTagName('w:trPr')[0])[-1].nodeName for row in table.getElementsByTagName('w:tr')] == ['w:del', 'w:del']
+	assert ''.join(texts(marked[1], 'w:delText')).endswith('Codes')
+	# At the place of the table, between the paragraph and the next section
+	position = changed.index(table)
+	assert texts(changed[position - 1], 'w:t') == ['See ', 'Section 3', '.']
+	assert changed[position + 2].toxml() == plain[position].toxml()
+
+def paragraph(document, text):
+	block = document.createElement('w:p')
+	run = block.appendChild(document.createElement('w:r'))
+	run.appendChild(document.createElement('w:t')).appendChild(document.createTextNode(text))
+	return block
+
+def test_large_rewrite():
+	# One word edited in every paragraph of a long draft: the patience diff finds no anchor, the pairing only
+	# looks docxDiff.pairWindow blocks ahead, so this stays fast and every paragraph is paired with its old text
+	document = xml.dom.minidom.Document()
+	count = 3000
+	old = [paragraph(document, f'w{index}a w{index}b w{index}c w{index}d w{index}e') for index in range(count)]
+	new = [paragraph(document, f'w{index}a w{index}b w{index}c w{index}d v{index}e') for index in range(count)]
+	started = time.monotonic()
+	opcodes = docxDiff._patienceOpcodes([docxDiff._blockHash(block) for block in old], [docxDiff._blockHash(block) for block in new])
+	assert opcodes == [('replace', 0, count, 0, count)]
+	assert docxDiff._pairBlocks(old, new) == list(zip(old, new))
+	assert time.monotonic() - started < 10
+	# Without any anchor, blocks moved further than the window are deleted and inserted rather than paired
+	shift = docxDiff.pairWindow + 1
+	pairs = docxDiff._pairBlocks(old, new[shift:] + new[:shift])
+	assert len(pairs) == 2 * count
+	assert all(oldBlock is None or newBlock is None for oldBlock, newBlock in pairs)
+
+def test_patience_anchors():
+	# The blocks found once on each side anchor the diff, the repeated ones (empty paragraphs...) do not
+	old = ['a', 'x', 'b', 'x', 'c', 'd']
+	new = ['x', 'b', 'e', 'x', 'd', 'c']
+	assert docxDiff._patienceOpcodes(old, new) == [('delete', 0, 1, 0, 0), ('equal', 1, 3, 0, 2), ('insert', 3, 3, 2, 3),
+		('equal', 3, 4, 3, 4), ('insert', 4, 4, 4, 5), ('equal', 4, 5, 5, 6), ('delete', 5, 6, 6, 6)]
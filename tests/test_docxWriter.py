@@ -0,0 +1,75 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import docxWriter
+
+def render(sharedProperties):
+	writer = docxWriter.docxWriter()
+	writer.sharedProperties = sharedProperties
+	for i in range(3):
+		writer.newParagraph('Paragraph ' + str(i))
+		writer.newParagraph('Centered ' + str(i), justification = 'center')
+	return writer
+
+def test_interned_properties():
+	writer = render(True)
+	paragraphs = writer.docxBody.childNodes
+	properties = [paragraph.firstChild for paragraph in paragraphs]
+	assert all(node.nodeName == 'w:pPr' for node in properties)
+	assert len(set(map(id, properties))) == len(paragraphs)  # One node per paragraph, each one with its own parent
+	assert all(node.parentNode is paragraph for node, paragraph in zip(properties, paragraphs))
+	assert properties[0].nextSibling is paragraphs[0].childNodes[1]
+	assert len(writer.propertiesCache) == 3  # Both pPr and the rPr of every run
+
+def test_same_output_as_dom_nodes():
+	assert render(True).docxRoot.toprettyxml() == render(False).docxRoot.toprettyxml()
+
+def png(width, height):
+	# A valid grey PNG image
+	import struct, zlib
+	def chunk(kind, data):
+		return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+	rows = b''.join(b'\0' + b'\x80' * width for row in range(height))
+	return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)) + \
+		chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+def test_images():
+	# Inline SVG and PNG in a data: URI, the same SVG twice is a single part and relationship
+	import io, re, base64, zipfile, hashlib
+	import xml2docx
+	svg = '<svg xmlns="http://www.w3.org/2000/svg" width="200" height="100"><rect width="200" height="100"/></svg>'
+	image = png(40, 30)
+	figure = '<figure><name>{}</name><artwork type="svg">' + svg + '</artwork></figure>'
+	draft = ('<rfc version="3" docName="draft-images-00"><front><title>Images</title></front><middle><section><name>Images</name>' +
+		figure.format('First') + figure.format('Again') +
+		'<figure><name>Bitmap</name><artwork src="data:image/png;base64,' + base64.b64encode(image).decode('ascii') + '"/></figure>' +
+		'</section></middle><back/></rfc>').encode('utf-8')
+	with zipfile.ZipFile(io.BytesIO(xml2docx.convert(draft, 'docx'))) as package:
+		media = {name: package.read(name) for name in package.namelist() if name.startswith('word/media/')}
+		document = package.read('word/document.xml').decode('utf-8')
+		relationships = package.read('word/_rels/document.xml.rels').decode('utf-8')
+		contentTypes = package.read('[Content_Types].xml').decode('utf-8')
+	svgDigest = hashlib.sha256(svg.encode('utf-8')).hexdigest()[0:16]
+	pngDigest = hashlib.sha256(image).hexdigest()[0:16]
+	assert media == {'word/media/image-' + svgDigest + '.svg': svg.encode('utf-8'), 'word/media/image-' + pngDigest + '.png': image}
+	assert sorted(re.findall(r'Id="(rIdImage[0-9a-f]+)"[^>]*Target="([^"]+)"', relationships)) == sorted([
+		('rIdImage' + svgDigest, 'media/image-' + svgDigest + '.svg'), ('rIdImage' + pngDigest, 'media/image-' + pngDigest + '.png')])
+	assert '<Default Extension="svg" ContentType="image/svg+xml"/>' in contentTypes
+	assert '<Default Extension="png" ContentType="image/png"/>' in contentTypes
+	# Three drawings, both SVG ones refer to the same relationship (a:blip and asvg:svgBlip)
+	assert re.findall(r'<a:blip r:embed="([^"]+)"', document) == ['rIdImage' + svgDigest] * 2 + ['rIdImage' + pngDigest]
+	assert re.findall(r'<asvg:svgBlip[^>]*r:embed="([^"]+)"', document) == ['rIdImage' + svgDigest] * 2
+	assert len(set(re.findall(r'<wp:docPr id="(\d+)"', document))) == 3
+	extents = re.findall(r'<wp:extent cx="(\d+)" cy="(\d+)"/>', document)
+	assert extents == [(str(200 * docxWriter.emuPerPixel), str(100 * docxWriter.emuPerPixel))] * 2 + [(str(40 * docxWriter.emuPerPixel), str(30 * docxWriter.emuPerPixel))]
@@ -0,0 +1,48 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os, time, threading
+
+import pytest
+
+import fileWatcher
+
+@pytest.mark.parametrize('newWatcher', [fileWatcher.pollingWatcher, fileWatcher.newWatcher])
+def test_one_rebuild_per_burst(tmp_path, monkeypatch, newWatcher):
+	monkeypatch.setattr(fileWatcher, 'debounce', 0.2)
+	monkeypatch.setattr(fileWatcher, 'pollInterval', 0.01)
+	filename = tmp_path / 'draft.xml'
+	filename.write_text('<rfc/>')
+	watcher = newWatcher(str(filename))
+	rebuilds = []
+
+	def watch() -> None:  # As xml2docx.py --watch, until the second rebuild
+		while len(rebuilds) < 2:
+			watcher.waitForChange()
+			rebuilds.append(time.monotonic())
+
+	thread = threading.Thread(target = watch, daemon = True)
+	thread.start()
+	for size in range(5):  # An editor saving in several steps
+		time.sleep(0.05)
+		filename.write_text('<rfc>' + 'x' * size + '</rfc>')
+	lastWrite = time.monotonic()
+	time.sleep(fileWatcher.debounce * 3)
+	assert len(rebuilds) == 1
+	assert rebuilds[0] >= lastWrite + fileWatcher.debounce * 0.9  # Not before the editor is done
+	replacement = tmp_path / 'draft.xml.new'  # Saved as a new file then renamed
+	replacement.write_text('<rfc>renamed</rfc>')
+	os.replace(replacement, filename)
+	thread.join(fileWatcher.debounce * 5)
+	assert len(rebuilds) == 2
@@ -0,0 +1,183 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os, io, json, time, shutil, zipfile, threading, logging
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import http.server, http.client
+import urllib.request, urllib.error
+
+import pytest
+
+import jobServer, templateRegistry
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+	# A corporate template, only different by a comment in its styles
+	directory = tmp_path / 'corporate'
+	shutil.copytree(templateRegistry.defaultDirectory, directory)
+	styles = directory / 'word' / 'styles.xml'
+	styles.write_bytes(styles.read_bytes() + b'<!-- corporate -->')
+	monkeypatch.setattr(jobServer, 'templates', {'corporate': str(directory)})
+	queue = jobServer.jobQueue(1, 2)
+	yield queue
+	queue.pool.shutdown(cancel_futures = True)
+
+def styles(job):
+	with zipfile.ZipFile(io.BytesIO(job.future.result(timeout = 60)[0])) as package:
+		return package.read('word/styles.xml')
+
+def test_template_per_job(queue):
+	with open(os.path.join(repository, 'regression', 'v2-lists.xml'), 'rb') as f:
+		draft = f.read()
+	corporate, isNew = queue.submit(draft, 'docx', 'corporate')
+	default, isNew = queue.submit(draft, 'docx')
+	assert isNew and corporate.id != default.id
+	assert styles(corporate).endswith(b'<!-- corporate -->')
+	assert not styles(default).endswith(b'<!-- corporate -->')
+	assert corporate.status()['template'] == 'corporate'
+
+@pytest.fixture
+def server():
+	# Serves the jobs of the queue given to its start()
+	servers = []
+	def start(queue):
+		jobServer.jobRequestHandler.queue = queue
+		server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), jobServer.jobRequestHandler)
+		threading.Thread(target = server.serve_forever, daemon = True).start()
+		servers.append(server)
+		return server.server_address[1]
+	yield start
+	for server in servers:
+		server.shutdown()
+		server.server_close()
+
+def post(port, query, body = b'<rfc/>', headers = None):
+	# (status, JSON answer) of a raw POST, so that the Content-Length can be left out or wrong
+	connection = http.client.HTTPConnection('127.0.0.1', port, timeout = 10)
+	connection.putrequest('POST', '/jobs' + query)
+	for name, value in (headers if headers is not None else {'Content-Length': str(len(body))}).items():
+		connection.putheader(name, value)
+	connection.endheaders()
+	if body:
+		connection.send(body)
+	response = connection.getresponse()
+	answer = json.load(response)
+	connection.close()
+	return response.status, answer, response.headers
+
+def test_unknown_template(queue, server):
+	port = server(queue)
+	for template in ('other', '..%2Ftemplate', repository):
+		status, answer, headers = post(port, '?template=' + template)
+		assert status == 400
+		assert 'unknown template' in answer['error']
+	assert post(port, '?template=corp%6Frate&format=md')[1]['error'] == 'unknown template corporate for the md format'
+
+@pytest.mark.parametrize('headers, status', [
+	({}, 411),
+	({'Transfer-Encoding': 'chunked'}, 411),
+	({'Content-Length': 'many'}, 400),
+	({'Content-Length': '-1'}, 400),
+	({'Content-Length': '0'}, 400),
+	({'Content-Length': str(jobServer.maxUpload + 1)}, 413),
+])
+def test_content_length(queue, server, headers, status):
+	# Refused before reading the body, none is sent
+	assert post(server(queue), '', b'', headers)[0] == status
+	assert queue.jobs == {}
+
+class heldPool:
+	# Stands in for the pool of workers, its jobs only end when the test ends them
+
+	def __init__(self):
+		self.futures = []
+		self.broken = False
+		self.shutdowns = 0
+
+	def submit(self, function, *args):
+		if self.broken:
+			raise BrokenProcessPool('A child process terminated abruptly')
+		future = concurrent.futures.Future()
+		future.set_running_or_notify_cancel()
+		self.futures.append(future)
+		return future
+
+	def shutdown(self, wait = True, cancel_futures = False):
+		self.shutdowns += 1
+
+class heldQueue(jobServer.jobQueue):
+
+	def _newPool(self):
+		return heldPool()
+
+@pytest.fixture
+def held(monkeypatch):
+	monkeypatch.setattr(jobServer, 'retention', 60)
+	return heldQueue(1, 1)
+
+def test_identical_uploads(held, server):
+	job, isNew = held.submit(b'<rfc/>', 'docx')
+	assert isNew
+	assert held.submit(b'<rfc/>', 'docx') == (job, False)
+	assert held.submit(b'<rfc/>', 'md')[0].id != job.id
+	assert len(held.pool.futures) == 2
+	status, answer, headers = post(server(held), '?format=docx')
+	assert (status, answer['id'], answer['deduplicated']) == (202, job.id, True)
+	assert headers['Location'] == '/jobs/' + job.id
+	# A failed job is converted again, a successful one is shared
+	held.pool.futures[0].set_exception(ValueError('host down'))
+	assert held.submit(b'<rfc/>', 'docx')[1]
+	held.pool.futures[-1].set_result((b'docx', {}))
+	assert not held.submit(b'<rfc/>', 'docx')[1]
+
+def test_backpressure(held, server):
+	port = server(held)
+	assert post(port, '', b'<rfc>1</rfc>')[0] == 202
+	assert post(port, '', b'<rfc>2</rfc>')[0] == 202
+	status, answer, headers = post(port, '', b'<rfc>3</rfc>')
+	assert status == 503
+	assert headers['Retry-After'] == '5'
+	assert post(port, '', b'<rfc>1</rfc>')[0] == 202  # Identical to a queued job, nothing new to convert
+	held.pool.futures[0].set_result((b'docx', {}))
+	assert post(port, '', b'<rfc>3</rfc>')[0] == 202
+
+def test_retention(held, monkeypatch):
+	running, isNew = held.submit(b'<rfc>1</rfc>', 'docx')
+	finished, isNew = held.submit(b'<rfc>2</rfc>', 'docx')
+	held.pool.futures[1].set_result((b'docx', {}))
+	assert finished.status()['expires'] == finished.finished + 60
+	assert held.get(finished.id) is finished
+	now = time.time()
+	monkeypatch.setattr(time, 'time', lambda: now + 61)
+	assert held.get(finished.id) is None
+	assert held.get(running.id) is running  # Only the finished jobs expire
+	assert held.submit(b'<rfc>2</rfc>', 'docx')[1]  # Converted again
+
+def test_broken_pool_is_renewed(held, caplog):
+	caplog.set_level(logging.WARNING, 'xml2docx.jobServer')
+	broken = held.pool
+	job, isNew = held.submit(b'<rfc>1</rfc>', 'docx')
+	broken.futures[0].set_exception(BrokenProcessPool('A child process terminated abruptly'))
+	assert held.pool is not broken and broken.shutdowns == 1
+	assert job.status()['status'] == 'failed'
+	assert 'A worker process died' in caplog.text
+	assert held.pending == 0
+	# Broken but not yet noticed by a finished job
+	broken = held.pool
+	broken.broken = True
+	job, isNew = held.submit(b'<rfc>2</rfc>', 'docx')
+	assert held.pool is not broken and held.pool.futures == [job.future]
@@ -0,0 +1,75 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os, sys, subprocess
+
+import metrics
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def samples(name):
+	# {labels: value} of the lines of a metric in the text format
+	values = {}
+	for line in metrics.render().splitlines():
+		if line.startswith(name + '{') or line.startswith(name + ' '):
+			sample, value = line.rsplit(' ', 1)
+			values[sample[len(name):]] = value
+	return values
+
+def test_histogram_buckets():
+	metrics.reset()
+	for seconds in (0.01, 0.3, 0.3, 120):
+		metrics.conversionSeconds.observe(seconds, 'docx')
+	lines = metrics.render().splitlines()
+	assert '# TYPE xml2docx_conversion_seconds histogram' in lines
+	buckets = samples('xml2docx_conversion_seconds_bucket')
+	# Cumulative counts, +Inf last
+	assert list(buckets.items()) == [
+		('{format="docx",le="0.05"}', '1'), ('{format="docx",le="0.1"}', '1'), ('{format="docx",le="0.25"}', '1'),
+		('{format="docx",le="0.5"}', '3'), ('{format="docx",le="1"}', '3'), ('{format="docx",le="2.5"}', '3'),
+		('{format="docx",le="5"}', '3'), ('{format="docx",le="10"}', '3'), ('{format="docx",le="30"}', '3'),
+		('{format="docx",le="60"}', '3'), ('{format="docx",le="300"}', '4'), ('{format="docx",le="+Inf"}', '4')]
+	assert samples('xml2docx_conversion_seconds_sum') == {'{format="docx"}': '120.61'}
+	assert samples('xml2docx_conversion_seconds_count') == {'{format="docx"}': '4'}
+	# Without labels
+	metrics.inputBytes.observe(5000)
+	assert samples('xml2docx_input_bytes_bucket')['{le="4096"}'] == '0'
+	assert samples('xml2docx_input_bytes_bucket')['{le="16384"}'] == '1'
+	assert samples('xml2docx_input_bytes_count') == {'': '1'}
+
+def test_fetches_by_host(cache, standInServer):
+	# Two host names for the same stand-in server, each with its own labels
+	cache.fetch(standInServer.url('reference.RFC.2119.xml'))
+	cache.fetch(standInServer.url('reference.RFC.2119.xml'))
+	cache.fetch(standInServer.url('reference.RFC.8174.xml').replace('127.0.0.1', 'localhost'))
+	assert samples('xml2docx_fetches_total') == {
+		'{host="127.0.0.1",source="downloaded"}': '1',
+		'{host="127.0.0.1",source="memory"}': '1',
+		'{host="localhost",source="downloaded"}': '1'}
+	counts = samples('xml2docx_fetch_seconds_count')
+	assert counts == {'{host="127.0.0.1"}': '1', '{host="localhost"}': '1'}
+	assert samples('xml2docx_fetch_seconds_bucket')['{host="localhost",le="+Inf"}'] == '1'
+
+def test_label_escaping():
+	metrics.reset()
+	metrics.fetches.inc('a"b\\c', 'error')
+	assert samples('xml2docx_fetches_total') == {'{host="a\\"b\\\\c",source="error"}': '1'}
+
+def test_fetch_without_metrics():
+	# urlCache counts the fetches only once the metrics module is loaded
+	code = ('import sys, urlCache\n'
+		'urlCache._metrics().fetches.inc("host", "memory")\n'
+		'print("metrics" in sys.modules)\n')
+	result = subprocess.run([sys.executable, '-c', code], cwd = repository, stdout = subprocess.PIPE, check = True)
+	assert result.stdout.strip() == b'False'
@@ -0,0 +1,64 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os, sys, json, subprocess
+
+import xml2docx
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_regression_draft():
+	with open(os.path.join(repository, 'regression', 'v3-structure.xml'), 'rb') as f:
+		report = json.loads(xml2docx.convert(f.read(), 'stats'))
+	assert report['metadata']['title'] == ['Regression Corpus: Version 3 Structure and Reference Groups']
+	assert report['metadata']['date'] == ['1 February 2026']
+	assert report['normativeReferences'] == ['BCP14', 'RFC2119', 'BCP14', 'RFC8174']
+	assert report['informativeReferences'] == []  # Only a reference group
+	assert report['words'] == {'abstract': 25, 'middle': 98, 'back': 90, 'total': 213}
+	assert (report['paragraphs'], report['sections'], report['figures'], report['tables']) == (27, 9, 2, 1)
+	assert report['bcp14'] == {'MUST': 1, 'MAY': 1}
+
+def test_batch(tmp_path):
+	# One JSON line per draft, an error line for a draft that cannot be read
+	result = subprocess.run([sys.executable, os.path.join(repository, 'xml2docx.py'), '--offline', '--cache', str(tmp_path), '--stats', '-',
+		os.path.join(repository, 'regression', 'v2-lists.xml'), os.path.join(repository, 'regression', 'v3-structure.xml'), 'missing.xml'],
+		cwd = repository, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, check = True)
+	reports = [json.loads(line) for line in result.stdout.splitlines()]
+	assert [os.path.basename(report['source']) for report in reports] == ['v2-lists.xml', 'v3-structure.xml', 'missing.xml']
+	assert reports[0]['metadata']['title'] == ['Regression Corpus: Version 2 Lists, Tables and Artwork']
+	assert reports[1]['words']['total'] == 213
+	assert 'error' in reports[2]
+
+def test_includes_are_not_fetched(cache, standInServer, monkeypatch):
+	# The included RFCs are counted from their names, nothing is fetched
+	monkeypatch.setattr(cache, 'mirror', standInServer.url('').rstrip('/'))
+	draft = b'''<?xml version="1.0"?>
+<!DOCTYPE rfc [
+<!ENTITY RFC7991 SYSTEM "https://bib.ietf.org/public/rfc/bibxml/reference.RFC.7991.xml">
+]>
+<rfc version="3" docName="draft-stats-00" xmlns:xi="http://www.w3.org/2001/XInclude"><front><title>Stats</title></front><middle>
+<section><name>One</name><t>It MUST work.</t></section></middle><back>
+<references><name>Normative References</name>
+<?rfc include='reference.RFC.8174'?>
+<xi:include href="https://bib.ietf.org/public/rfc/bibxml/reference.RFC.2119.xml"/>
+</references>
+<references><name>Informative References</name>
+&RFC7991;
+<xi:include href="https://bib.ietf.org/public/rfc/bibxml3/reference.I-D.ietf-example-draft.xml"/>
+</references></back></rfc>'''
+	report = json.loads(xml2docx.convert(draft, 'stats'))
+	assert standInServer.hits == []
+	assert report['normativeReferences'] == ['RFC8174', 'RFC2119']
+	assert report['informativeReferences'] == ['RFC7991']
+	assert report['bcp14'] == {'MUST': 1}
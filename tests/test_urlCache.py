@@ -0,0 +1,154 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import time
+import urllib.error
+
+import pytest
+
+import metrics
+
+def sources(host = '127.0.0.1'):
+	return {labels[1]: count for labels, count in metrics.fetches.values.items() if labels[0] == host}
+
+def test_download_then_revalidate(cache, standInServer):
+	url = standInServer.url('reference.RFC.2119.xml')
+	assert cache.fetch(url) == standInServer.body
+	assert 'If-None-Match' not in standInServer.hits[0][1]
+	cache.fetched.clear()  # As a new process would
+	assert cache.fetch(url) == standInServer.body
+	assert standInServer.hits[1][1].get('If-None-Match') == '"v1"'
+	assert sources() == {'downloaded': 1, 'revalidated': 1}
+
+def test_changed_document_is_downloaded_again(cache, standInServer):
+	url = standInServer.url('reference.RFC.2119.xml')
+	cache.fetch(url)
+	cache.fetched.clear()
+	standInServer.etag = '"v2"'
+	standInServer.body = b'<reference anchor="RFC2119"><front><title>Updated</title></front></reference>'
+	assert cache.fetch(url) == standInServer.body
+	cache.fetched.clear()
+	assert cache.fetch(url) == standInServer.body  # Revalidated with the new ETag
+	assert standInServer.hits[-1][1].get('If-None-Match') == '"v2"'
+
+def test_fetched_once_per_process(cache, standInServer):
+	url = standInServer.url('reference.RFC.2119.xml')
+	cache.fetch(url)
+	cache.fetch(url)
+	assert len(standInServer.hits) == 1
+	assert sources() == {'downloaded': 1, 'memory': 1}
+
+def test_offline_serves_the_cache(cache, standInServer):
+	url = standInServer.url('reference.RFC.2119.xml')
+	cache.fetch(url)
+	cache.fetched.clear()
+	cache.offline = True
+	assert cache.fetch(url) == standInServer.body
+	assert len(standInServer.hits) == 1
+
+def test_offline_without_cache_fails(cache, standInServer):
+	cache.offline = True
+	with pytest.raises(urllib.error.URLError):
+		cache.fetch(standInServer.url('reference.RFC.8174.xml'))
+	assert standInServer.hits == []
+
+def test_mismatched_meta_is_not_used(cache, standInServer):
+	# A body replaced by another conversion, before its meta is: the old ETag must not be sent
+	url = standInServer.url('reference.RFC.2119.xml')
+	cache.fetch(url)
+	cache.fetched.clear()
+	bodyPath, metaPath = cache._cachePaths(url)
+	with open(bodyPath, 'wb') as f:
+		f.write(b'<reference anchor="RFC2119"/>')
+	cache.fetch(url)
+	assert 'If-None-Match' not in standInServer.hits[-1][1]
+
+@pytest.fixture
+def impatient(cache, monkeypatch):
+	# Short delays, so that the retries and the circuit breaker can be checked in a few seconds
+	monkeypatch.setattr(cache, 'backoff', 0.01)
+	monkeypatch.setattr(cache, 'retries', 2)
+	monkeypatch.setattr(cache, 'breakerThreshold', 3)
+	monkeypatch.setattr(cache, 'breakerCooldown', 0.3)
+	monkeypatch.setattr(cache, 'timeout', 0.3)
+	return cache
+
+def test_retries_on_503(impatient, standInServer):
+	standInServer.mode = 'fail'
+	with pytest.raises(urllib.error.HTTPError) as info:
+		impatient.fetch(standInServer.url('reference.RFC.2119.xml'))
+	assert info.value.code == 503
+	assert len(standInServer.hits) == impatient.retries + 1
+	assert metrics.fetchRetries.values == {('127.0.0.1',): impatient.retries}
+	assert sources() == {'error': 1}
+
+def test_no_retry_on_404(impatient, standInServer):
+	with pytest.raises(urllib.error.HTTPError):
+		impatient.fetch(standInServer.url('missing.xml'))
+	assert len(standInServer.hits) == 1
+	assert impatient.breakers['127.0.0.1'].failures == 0
+
+def test_breaker_rejects_then_tries_again(impatient, standInServer):
+	standInServer.mode = 'fail'
+	with pytest.raises(urllib.error.HTTPError):
+		impatient.fetch(standInServer.url('reference.RFC.2119.xml'))
+	assert len(standInServer.hits) == impatient.breakerThreshold
+	with pytest.raises(urllib.error.URLError) as info:
+		impatient.fetch(standInServer.url('reference.RFC.8174.xml'))
+	assert 'circuit breaker' in str(info.value.reason)
+	assert len(standInServer.hits) == impatient.breakerThreshold  # The host was not contacted
+	assert sources() == {'error': 1, 'rejected': 1}
+	time.sleep(impatient.breakerCooldown)
+	standInServer.mode = 'ok'
+	assert impatient.fetch(standInServer.url('reference.RFC.8174.xml')) == standInServer.body
+	assert len(standInServer.hits) == impatient.breakerThreshold + 1
+	assert impatient.breakers['127.0.0.1'].openedAt is None
+
+def test_breaker_opened_by_the_fetch_itself(impatient, standInServer, monkeypatch):
+	# Opened by the failures of this very fetch, before its last retry: an error, not a rejection
+	monkeypatch.setattr(impatient, 'retries', 4)
+	monkeypatch.setattr(impatient, 'breakerThreshold', 2)
+	standInServer.mode = 'fail'
+	with pytest.raises(urllib.error.HTTPError) as info:
+		impatient.fetch(standInServer.url('reference.RFC.2119.xml'))
+	assert info.value.code == 503  # The last failure rather than the breaker
+	assert len(standInServer.hits) == 2
+	assert sources() == {'error': 1}
+
+def test_fallback_to_the_cached_copy(impatient, standInServer):
+	url = standInServer.url('reference.RFC.2119.xml')
+	impatient.fetch(url)
+	impatient.fetched.clear()
+	standInServer.mode = 'fail'
+	assert impatient.fetch(url) == standInServer.body
+	assert len(standInServer.hits) == 1 + impatient.retries + 1
+	assert sources() == {'downloaded': 1, 'cache': 1}
+
+def test_read_timeout(impatient, standInServer, monkeypatch):
+	monkeypatch.setattr(impatient, 'retries', 0)
+	standInServer.mode = 'slow'
+	standInServer.delay = 2
+	start = time.monotonic()
+	with pytest.raises(OSError):
+		impatient.fetch(standInServer.url('reference.RFC.2119.xml'))
+	assert time.monotonic() - start < standInServer.delay
+	assert impatient.breakers['127.0.0.1'].failures == 1
+
+def test_request_timeout_bounds_the_retries(impatient, standInServer):
+	standInServer.mode = 'slow'
+	standInServer.delay = 2
+	start = time.monotonic()
+	with pytest.raises(OSError):
+		impatient.fetch(standInServer.url('reference.RFC.2119.xml'), requestTimeout = 0.5)
+	assert time.monotonic() - start < 1.5
@@ -0,0 +1,103 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import io, logging
+import xml.dom.minidom
+
+import pytest
+
+import xmlInclude
+
+base = 'https://example.org/drafts/'
+
+class documents:
+	# Stands in for fetchAll(), serving the given documents by URL and recording what is fetched
+
+	def __init__(self, contents):
+		self.contents = contents
+		self.fetched = []
+
+	def __call__(self, locations):
+		self.fetched.extend(locations)
+		return {location: self.contents.get(location, OSError('not found')) for location in locations}
+
+def parse(source, fetchAll, deferEntities = False):
+	builder = xmlInclude.newBuilder(None, fetchAll, base, deferEntities)
+	return builder.parseFile(io.BytesIO(source))
+
+def resolve(document, fetchAll, roots = None):
+	includeURL = lambda name: base + 'bibxml/' + name + '.xml'
+	xmlInclude.resolveIncludes(document, base, fetchAll, lambda content, location: xml.dom.minidom.parseString(content), includeURL, roots)
+
+def children(element):
+	# The element children as tag[anchor] or the text of a <t>
+	return [child.firstChild.data if child.nodeName == 't' else child.nodeName + (('[' + child.getAttribute('anchor') + ']') if child.getAttribute('anchor') else '')
+		for child in element.childNodes if child.nodeType == child.ELEMENT_NODE]
+
+entityDraft = b'''<?xml version="1.0"?>
+<!DOCTYPE rfc [
+<!ENTITY middle SYSTEM "middle.xml">
+]>
+<rfc><middle><section><t>before</t>&middle;<t>after</t></section></middle></rfc>'''
+
+@pytest.mark.parametrize('deferEntities', [False, True])
+def test_external_entity(deferEntities):
+	# Parsed where it is referenced, either while parsing or by resolveIncludes() when deferred
+	fetchAll = documents({base + 'middle.xml': b'<t>first</t><t>second</t>'})
+	document = parse(entityDraft, fetchAll, deferEntities)
+	if deferEntities:
+		assert fetchAll.fetched == []
+		resolve(document, fetchAll, [document.documentElement])
+	assert children(document.getElementsByTagName('section')[0]) == ['before', 'first', 'second', 'after']
+	assert fetchAll.fetched == [base + 'middle.xml']
+
+def test_xinclude():
+	# In place, and the xi:include of an included document are relative to that document
+	fetchAll = documents({
+		base + 'references/b.xml': b'<reference anchor="B"/>',
+		base + 'group.xml': b'<referencegroup anchor="G" xmlns:xi="http://www.w3.org/2001/XInclude"><xi:include href="references/g1.xml"/></referencegroup>',
+		base + 'references/g1.xml': b'<reference anchor="G1"/>',
+	})
+	document = xml.dom.minidom.parseString(b'<rfc xmlns:xi="http://www.w3.org/2001/XInclude"><back><references>'
+		b'<reference anchor="A"/><xi:include href="references/b.xml"/><xi:include href="group.xml"/>'
+		b'<xi:include href="missing.xml"><xi:fallback><reference anchor="F"/></xi:fallback></xi:include><reference anchor="C"/>'
+		b'</references></back></rfc>')
+	resolve(document, fetchAll)
+	references = document.getElementsByTagName('references')[0]
+	assert children(references) == ['reference[A]', 'reference[B]', 'referencegroup[G]', 'reference[F]', 'reference[C]']
+	assert children(references.getElementsByTagName('referencegroup')[0]) == ['reference[G1]']
+
+def test_rfc_include():
+	fetchAll = documents({base + 'bibxml/reference.RFC.2119.xml': b'<?xml version="1.0"?><reference anchor="RFC2119"/>'})
+	document = xml.dom.minidom.parseString(b"<rfc><back><references><reference anchor='A'/><?rfc include='reference.RFC.2119'?><reference anchor='C'/></references></back></rfc>")
+	resolve(document, fetchAll)
+	assert children(document.getElementsByTagName('references')[0]) == ['reference[A]', 'reference[RFC2119]', 'reference[C]']
+
+def test_include_cycle(caplog):
+	# a.xml -> b.xml -> a.xml: each document is fetched once, the include closing the cycle is replaced by its fallback
+	caplog.set_level(logging.WARNING, 'xml2docx.xmlInclude')
+	fetchAll = documents({
+		base + 'a.xml': b'<section anchor="a" xmlns:xi="http://www.w3.org/2001/XInclude"><xi:include href="b.xml"/></section>',
+		base + 'b.xml': b'<section anchor="b" xmlns:xi="http://www.w3.org/2001/XInclude"><xi:include href="a.xml"><xi:fallback><t>cycle</t></xi:fallback></xi:include></section>',
+		base + 'self.xml': b'<section anchor="self" xmlns:xi="http://www.w3.org/2001/XInclude"><xi:include href="self.xml"/></section>',
+	})
+	document = xml.dom.minidom.parseString(b'<rfc xmlns:xi="http://www.w3.org/2001/XInclude"><middle><xi:include href="a.xml"/><xi:include href="self.xml"/></middle></rfc>')
+	resolve(document, fetchAll)
+	assert sorted(fetchAll.fetched) == [base + 'a.xml', base + 'b.xml', base + 'self.xml']
+	middle = document.getElementsByTagName('middle')[0]
+	assert children(middle) == ['section[a]', 'section[self]']
+	assert children(middle.getElementsByTagName('section')[1]) == ['cycle']  # In b.xml
+	assert children(middle.getElementsByTagName('section')[2]) == []
+	assert document.getElementsByTagNameNS(xmlInclude.XINCLUDE, 'include') == []
+	assert 'Include cycle rejected: ' + base + 'a.xml -> ' + base + 'b.xml -> ' + base + 'a.xml' in caplog.text
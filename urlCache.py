@@ -0,0 +1,344 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Local cache for the drafts and references fetched over HTTP(S)
+# Every URL is stored as <sha256>.xml plus a <sha256>.json file keeping the ETag and Last-Modified
+# headers (and the digest of the body they belong to), so that the next fetch is a conditional GET answered by a
+# 304 when nothing has changed.
+# See https://www.rfc-editor.org/rfc/rfc9110#section-13 for the conditional requests
+# The network accesses have separate connect and read timeouts (per host if needed), a few retries with a jittered
+# exponential backoff for the transient failures, and a circuit breaker per host: after breakerThreshold failures in
+# a row, the host is not contacted anymore for breakerCooldown seconds, then a single trial fetch decides. Meanwhile,
+# the cached copy (even if not revalidated) is used when there is one.
+
+import os, sys, json, hashlib, time, random, threading, functools, tempfile, logging
+import collections
+import http.client
+import urllib.request, urllib.error, urllib.parse
+from typing import Optional, Dict, Tuple, List, Set
+
+logger = logging.getLogger('xml2docx.urlCache')
+
+cacheDirectory = os.environ.get('XML2DOCX_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'xml2docx'))
+offline = False  # When True, never access the network and only serve from the cache
+connectTimeout = 10  # Seconds, including the TLS handshake
+timeout = 30  # Seconds without receiving anything once connected
+hostTimeouts: Dict[str, Tuple[float, float]] = {}  # (connect, read) by host name, e.g., for a slow mirror
+maxSeconds = 90  # For a whole fetch, retries included
+retries = 2  # After the first attempt, only for connection errors, timeouts, 408, 429 and 5xx
+backoff = 0.5  # Seconds, the nth retry waits a random time up to backoff * 2 ** (n - 1)
+breakerThreshold = 5  # Failed attempts in a row before opening the circuit of a host
+breakerCooldown = 60  # Seconds before trying again a host with an open circuit
+mirror = os.environ.get('XML2DOCX_MIRROR')  # e.g., http://127.0.0.1:8088, every URL is then fetched as <mirror>/<host>/<path>
+
+class _noMetric:
+	# Stands in for the counters and histograms of the fetches while the metrics module is not loaded
+
+	def inc(self, *labelValues: str, amount: float = 1) -> None:
+		pass
+
+	def observe(self, value: float, *labelValues: str) -> None:
+		pass
+
+class _noMetrics:
+	fetches = fetchRetries = fetchSeconds = _noMetric()
+
+def _metrics():
+	# Only once the metrics module is loaded, by jobServer.py or for --metrics, the other runs do not pay for it
+	return sys.modules.get('metrics', _noMetrics)
+
+class recentFetches:
+	# The documents already fetched (or revalidated) by this process, so that a conversion does not fetch them twice
+	# Bounded in size and in age: long-running processes (jobServer.py, --watch) revalidate them after maxAge seconds
+
+	def __init__(self, maxBytes: int, maxAge: float) -> None:
+		self.maxBytes = maxBytes
+		self.maxAge = maxAge
+		self.entries: Dict[str, Tuple[float, bytes]] = collections.OrderedDict()  # (time, body), least recently used first
+		self.size = 0
+		self.lock = threading.Lock()
+
+	def get(self, url: str) -> Optional[bytes]:
+		with self.lock:
+			entry = self.entries.get(url)
+			if entry is None:
+				return None
+			if time.monotonic() - entry[0] > self.maxAge:
+				self._remove(url)
+				return None
+			self.entries.move_to_end(url)
+			return entry[1]
+
+	def __contains__(self, url: str) -> bool:
+		return self.get(url) is not None
+
+	def __setitem__(self, url: str, body: bytes) -> None:
+		with self.lock:
+			if url in self.entries:
+				self._remove(url)
+			self.entries[url] = (time.monotonic(), body)
+			self.size += len(body)
+			while self.size > self.maxBytes and len(self.entries) > 1:
+				self._remove(next(iter(self.entries)))
+
+	def _remove(self, url: str) -> None:
+		self.size -= len(self.entries.pop(url)[1])
+
+	def clear(self) -> None:
+		with self.lock:
+			self.entries.clear()
+			self.size = 0
+
+fetched = recentFetches(64 * 1024 * 1024, 600)
+
+def _cachePaths(url: str) -> Tuple[str, str]:
+	digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+	return os.path.join(cacheDirectory, digest + '.xml'), os.path.join(cacheDirectory, digest + '.json')
+
+def _readCache(url: str) -> Tuple[Optional[bytes], Dict[str, str]]:
+	if cacheDirectory is None:
+		return None, {}
+	bodyPath, metaPath = _cachePaths(url)
+	try:
+		with open(metaPath, 'r', encoding='utf-8') as f:
+			meta = json.load(f)
+		with open(bodyPath, 'rb') as f:
+			body = f.read()
+	except (OSError, ValueError):
+		return None, {}
+	if meta.get('sha256', hashlib.sha256(body).hexdigest()) != hashlib.sha256(body).hexdigest():  # Being replaced
+		return None, {}
+	return body, meta
+
+def _writeCache(url: str, body: bytes, meta: Dict[str, str]) -> None:
+	if cacheDirectory is None:
+		return
+	bodyPath, metaPath = _cachePaths(url)
+	try:
+		os.makedirs(cacheDirectory, exist_ok = True)
+		# Write into a file of its own then rename, so that a concurrent conversion never reads a partial file,
+		# the meta last: until then, its digest does not match the new body
+		meta = dict(meta, sha256 = hashlib.sha256(body).hexdigest())
+		for path, data in ((bodyPath, body), (metaPath, json.dumps(meta).encode('utf-8'))):
+			with tempfile.NamedTemporaryFile(dir = cacheDirectory, delete = False) as f:
+				f.write(data)
+			try:
+				os.replace(f.name, path)
+			except OSError:
+				os.remove(f.name)
+				raise
+	except OSError as err:
+		logger.warning('Cannot store %s in the cache %s: %s', url, cacheDirectory, err)
+
+class circuitBreaker:
+	# Failures in a row of one host, shared by the threads of xml2docx.fetchAll()
+
+	def __init__(self) -> None:
+		self.failures = 0
+		self.openedAt: Optional[float] = None
+		self.trial = False  # A trial fetch is in progress after the cooldown (half-open)
+
+	def allow(self) -> bool:
+		if self.openedAt is None:
+			return True
+		if self.trial or time.monotonic() - self.openedAt < breakerCooldown:
+			return False
+		self.trial = True
+		return True
+
+	def success(self) -> None:
+		self.failures = 0
+		self.openedAt = None
+		self.trial = False
+
+	def failure(self) -> bool:
+		# Returns True when the circuit opens (again)
+		self.failures += 1
+		self.trial = False
+		if self.failures >= breakerThreshold:
+			self.openedAt = time.monotonic()
+			return True
+		return False
+
+breakers: Dict[str, circuitBreaker] = {}  # By host name
+breakersLock = threading.Lock()
+
+def setTimeouts(text: str) -> None:
+	# e.g., 'connect=5,read=20,retries=1,xml2rfc.ietf.org=3/10', raises ValueError on invalid text
+	global connectTimeout, timeout, retries
+	for item in text.split(','):
+		name, _, value = item.strip().partition('=')
+		if value == '':
+			raise ValueError('missing value for ' + name)
+		if name == 'connect':
+			connectTimeout = float(value)
+		elif name == 'read':
+			timeout = float(value)
+		elif name == 'retries':
+			retries = int(value)
+		else:
+			connect, _, read = value.partition('/')
+			hostTimeouts[name.lower()] = (float(connect), float(read or connect))
+
+if os.environ.get('XML2DOCX_TIMEOUTS'):  # Same syntax, e.g., for jobServer.py and process.php
+	try:
+		setTimeouts(os.environ['XML2DOCX_TIMEOUTS'])
+	except ValueError as err:
+		logger.warning('Invalid XML2DOCX_TIMEOUTS: %s', err)
+
+class _timedHTTPConnection(http.client.HTTPConnection):
+	# The timeout given by urlopen() is used to connect, then readTimeout for every read
+
+	def __init__(self, *args, readTimeout: Optional[float] = None, **kwargs) -> None:
+		super().__init__(*args, **kwargs)
+		self.readTimeout = readTimeout
+
+	def connect(self) -> None:
+		super().connect()
+		if self.readTimeout is not None:
+			self.sock.settimeout(self.readTimeout)
+
+class _timedHTTPSConnection(_timedHTTPConnection, http.client.HTTPSConnection):
+	pass
+
+class _timedHTTPHandler(urllib.request.HTTPHandler):
+
+	def http_open(self, request):
+		return self.do_open(functools.partial(_timedHTTPConnection, readTimeout = getattr(request, 'readTimeout', None)), request)
+
+class _timedHTTPSHandler(urllib.request.HTTPSHandler):
+
+	def https_open(self, request):
+		return self.do_open(functools.partial(_timedHTTPSConnection, readTimeout = getattr(request, 'readTimeout', None)), request, context = self._context)
+
+class _checkedRedirectHandler(urllib.request.HTTPRedirectHandler):
+	# A redirection must not lead out of the hosts allowed for the original URL
+
+	def redirect_request(self, request, fp, code, msg, headers, newurl):
+		allowedHosts = getattr(request, 'allowedHosts', None)
+		if allowedHosts is not None and (urllib.parse.urlsplit(newurl).hostname or '').lower() not in allowedHosts:
+			raise urllib.error.HTTPError(newurl, code, 'redirection to a host that is not allowed', headers, fp)
+		newRequest = super().redirect_request(request, fp, code, msg, headers, newurl)
+		if newRequest is not None:
+			newRequest.allowedHosts = allowedHosts
+			newRequest.readTimeout = getattr(request, 'readTimeout', None)
+		return newRequest
+
+_opener = urllib.request.build_opener(_timedHTTPHandler, _timedHTTPSHandler, _checkedRedirectHandler)
+
+def _mirrored(url: str) -> str:
+	# The cache still uses the original URL
+	if not mirror:
+		return url
+	parts = urllib.parse.urlsplit(url)
+	return mirror.rstrip('/') + '/' + parts.netloc + parts.path + ('?' + parts.query if parts.query else '')
+
+def _transient(err: Exception) -> bool:
+	# Worth a retry, and a sign that the host is unhealthy
+	if isinstance(err, urllib.error.HTTPError):
+		return err.code in (408, 429) or err.code >= 500
+	return isinstance(err, OSError)  # Connection refused or reset, timeout, DNS failure, ...
+
+def fetch(url: str, requestTimeout: Optional[float] = None, allowedHosts: Optional[Set[str]] = None) -> bytes:
+	# Same exceptions as urllib.request.urlopen() so callers can handle both the same way
+	# requestTimeout bounds the whole fetch, retries included, it defaults to maxSeconds
+	# With allowedHosts, the redirections cannot go to any other host
+	host = urllib.parse.urlsplit(url).hostname or ''
+	body = fetched.get(url)
+	if body is not None:
+		_metrics().fetches.inc(host, 'memory')
+		return body
+	cachedBody, meta = _readCache(url)
+	if offline:
+		if cachedBody is None:
+			_metrics().fetches.inc(host, 'error')
+			raise urllib.error.URLError('offline mode and ' + url + ' is not in the cache')
+		_metrics().fetches.inc(host, 'cache')
+		fetched[url] = cachedBody
+		return cachedBody
+	hostConnectTimeout, hostReadTimeout = hostTimeouts.get(host, (connectTimeout, timeout))
+	deadline = time.monotonic() + (requestTimeout if requestTimeout is not None else maxSeconds)
+	with breakersLock:
+		breaker = breakers.setdefault(host, circuitBreaker())
+	error: Exception = urllib.error.URLError('no attempt to fetch ' + url)
+	rejected = False
+	for attempt in range(retries + 1):
+		with breakersLock:
+			allowed = breaker.allow()
+		if not allowed:
+			if attempt == 0:  # Already open before this fetch, else it opened on the failures of this fetch and
+				# these are an error, not a rejection
+				error = urllib.error.URLError(host + ' is failing, not contacted until its circuit breaker closes')
+				rejected = True
+			break
+		remaining = max(deadline - time.monotonic(), 0.1)
+		request = urllib.request.Request(_mirrored(url))
+		request.readTimeout = min(hostReadTimeout, remaining)
+		request.allowedHosts = allowedHosts
+		if cachedBody is not None:
+			if meta.get('etag'):
+				request.add_header('If-None-Match', meta['etag'])
+			if meta.get('lastModified'):
+				request.add_header('If-Modified-Since', meta['lastModified'])
+		start = time.perf_counter()
+		try:
+			response = _opener.open(request, timeout = min(hostConnectTimeout, remaining))
+			body = response.read()
+		except Exception as err:
+			_metrics().fetchSeconds.observe(time.perf_counter() - start, host)
+			if isinstance(err, urllib.error.HTTPError) and err.code == 304 and cachedBody is not None:  # Not Modified
+				with breakersLock:
+					breaker.success()
+				_metrics().fetches.inc(host, 'revalidated')
+				fetched[url] = cachedBody
+				return cachedBody
+			if isinstance(err, http.client.HTTPException):  # e.g., IncompleteRead, callers only expect OSError
+				err = urllib.error.URLError(err)
+			error = err
+			if not _transient(err):  # e.g., 404, the host itself is fine
+				with breakersLock:
+					breaker.success()
+				_metrics().fetches.inc(host, 'error')
+				raise err
+			with breakersLock:
+				if breaker.failure():
+					logger.warning('%s failed %d times in a row, not contacted for %s seconds', host, breaker.failures, breakerCooldown)
+			delay = random.uniform(0, backoff * 2 ** attempt)  # Full jitter, so that the workers do not retry in lockstep
+			if isinstance(err, urllib.error.HTTPError) and (err.headers.get('Retry-After') or '').isdigit():
+				delay = max(delay, int(err.headers.get('Retry-After')))
+			if attempt == retries or time.monotonic() + delay >= deadline:
+				break
+			logger.warning('Retrying %s in %.1f seconds after: %s', url, delay, err)
+			_metrics().fetchRetries.inc(host)
+			time.sleep(delay)
+			continue
+		with breakersLock:
+			breaker.success()
+		_metrics().fetchSeconds.observe(time.perf_counter() - start, host)
+		_metrics().fetches.inc(host, 'downloaded')
+		meta = {'url': url}
+		if response.headers.get('ETag'):
+			meta['etag'] = response.headers.get('ETag')
+		if response.headers.get('Last-Modified'):
+			meta['lastModified'] = response.headers.get('Last-Modified')
+		_writeCache(url, body, meta)  # Even without validators, it is still useful in offline mode
+		fetched[url] = body
+		return body
+	if cachedBody is not None:  # Better a copy that could not be revalidated than nothing
+		logger.warning('Using the cached copy of %s, %s', url, error)
+		_metrics().fetches.inc(host, 'cache')
+		fetched[url] = cachedBody
+		return cachedBody
+	_metrics().fetches.inc(host, 'rejected' if rejected else 'error')
+	raise error
@@ -19,122 +19,27 @@
 # https://datatracker.ietf.org/doc/html/rfc7998 "xml2rfc" Version 3 Preparation Tool Description
 # https://datatracker.ietf.org/doc/rfc7991/ The "xml2rfc" Version 3 Vocabulary
 # https://datatracker.ietf.org/doc/html/rfc7749 "The XML2RFC Version 2"
-# TODO
-# Handle external entities used notably for references...
-# https://www.w3schools.com/xml/xml_dtd_entities.asp
-#  example 
-#    <?xml version='1.0'?>
-#        <!DOCTYPE rfc SYSTEM 'rfc2629.dtd' [
-#        <!ENTITY rfc2629 PUBLIC '' 'http://xml2rfc.ietf.org/public/rfc/bibxml/reference.RFC.2629.xml'>
-#       ]>
+# External entities, xi:include and <?rfc include?> are resolved by xmlInclude.py before the walk of the tree
    
+# Only the modules needed for every conversion are imported here, the others (network, compression,
+# command line parsing, writers, logging) are imported when needed as a new interpreter is started per conversion
 from xml.dom import minidom, Node
 import xml.dom
-from pprint import pprint
-import sys, getopt
+import xml.parsers.expat
+import sys
 import os
-from typing import Optional, List, Dict, Union, Any
-
-import datetime
-import urllib.request
-# import docxWriter
-# import mdWriter
-
-class xmlWriter:
-	filename = None  # The filename of the to-be-created file
-	inMiddle = True  # True if we are in the middle part of the document, False if in the back part
-
-	def __init__(self, filename: Optional[str] = None) -> None:
-		self.filename = filename
-		self.inMiddle = True  # Start in the middle part
-		# Same states to be kept
-		self.metaData = {}  # A dict for slugs: authors, date, keywords, title
-		self.abstract = []  # A list of paragraphs in the abstract
-		self.normativeReferences = []  # A list of normative references
-		self.informativeReferences = []  # A list of informative references
-
-	def save(self) -> None:
-		pass
-
-	def getMetaData(self, slug: str) -> Optional[List[str]]:
-		if slug in self.metaData:
-			return self.metaData[slug]
-		else:
-			return None
-	
-	def setMetaData(self, slug: str, value: str) -> None:
-		if slug in self.metaData:
-			self.metaData[slug].append(value)
-		else:
-			self.metaData[slug] = [value]
-
-# TODO: this does not allow for parts of the text being in italics or bold...
-# => should use run elements notably in the docxWriter with <w:r> children inside a <w:p> element
-# then update the parsiing of the text to handle the <tt>, <em> and <b> tags 
-	def newParagraph(self, 
-				  textValue: str,
-				  style: str = 'Normal',
-				  justification: Optional[str] = None,
-				  unnumbered: Optional[bool] = None,
-				  numberingID: Optional[str] = None,
-				  indentationLevel: Optional[str] = None,
-				  removeEmpty: bool = True,
-				  language: str = 'en-US',
-				  cdataSection: Optional[bool] = None) -> None:
-		# As parseText() is the same  for front and body elements 
-		if style is not None and style == "Abstract":
-			self.abstract.append(textValue)
-
-	def newTable(self, table: 'tableTable') -> None:
-		pass
-
-	def newFigure(self, figure: 'figureFigure') -> None:
-		pass
-			  
-class tableTable:
-	name: Optional[str] 
-	rows: List['tableRow']
-
-	def __init__(self, name: Optional[str] = None) -> None:
-		self.name = name
-		self.rows = []
-
-	def addRow(self, row: 'tableRow') -> None:
-		self.rows.append(row)
-
-	def setName(self, name: str) -> None:
-		self.name = name
-
-class tableRow:
-	cells: List['tableCell'] = []
-	rowType: Optional[str] = None  # thead, tbody, tfoot
-
-	def __init__(self, rowType: str) -> None:
-		self.cells = []
-		self.rowType = rowType
-
-	def addCell(self, cell: 'tableCell') -> None:
-		self.cells.append(cell)
-		
-class tableCell:
-	text: Optional[str] = None
-
-	def __init__(self, text: Optional[str] = None) -> None:
-		self.text = text
-
-class figureFigure:
-	name: Optional[str] = None
-	rows: List[str]
-
-	def __init__(self, name: Optional[str] = None) -> None:
-		self.name = name
-		self.rows = []
+import io
+import _thread
+import time
+from typing import Optional, List, Dict, Tuple, Union, Any, Iterator, Set
 
-	def addRow(self, row: str) -> None:
-		self.rows.append(row)
+from xmlWriter import xmlWriter, tableTable, tableRow, tableCell, figureFigure, figureImage, anchorTarget, link, myParseDate
+from resourceBudget import resourceBudget, budgetExceeded
+import xmlInclude
+from lazyLogging import lazyLogger
 
-	def setName(self, name: str) -> None:
-		self.name = name
+# The progress and warning messages, shown by the command line and given to the log stream of convert()
+logger = lazyLogger('xml2docx')
 
 # For debugging purpose
 def printTree(front: xml.dom.minidom.Element) -> None:
@@ -157,6 +62,72 @@ def printTree(front: xml.dom.minidom.Element) -> None:
 				print("\t\tTEXT: ", child.nodeValue)
 	print("\n----------\n")
 
+conversionBudget: Optional[resourceBudget] = None  # Limits of the conversion in progress, if any
+localIncludes = False  # May the draft include local files? Only for named local files converted on the command line
+fetchThreads = 8  # Included documents fetched at the same time
+
+def parseXML(stream: io.IOBase, base: Optional[str] = None, deferEntities: bool = False) -> xml.dom.minidom.Document:
+	# base (URL or directory) is used for the relative system ids of the external entities
+	# With deferEntities, the external entities are only fetched later by xmlInclude.resolveIncludes()
+	builder = xmlInclude.newBuilder(conversionBudget, fetchAll, base, deferEntities)
+	if conversionBudget is None:
+		return builder.parseFile(stream)
+	return conversionBudget.parse(stream, builder)
+
+def parseXMLString(data: bytes, location: Optional[str] = None, deferEntities: bool = False) -> xml.dom.minidom.Document:
+	builder = xmlInclude.newBuilder(conversionBudget, fetchAll, xmlInclude.baseOf(location) if location else None, deferEntities)
+	if conversionBudget is None:
+		return builder.parseString(data)
+	return conversionBudget.parseString(data, builder)
+
+def fetchURL(url: str) -> bytes:
+	# All the network accesses of a conversion, counted against its budget
+	import urlCache
+	if conversionBudget is None:
+		return urlCache.fetch(url)
+	if url not in urlCache.fetched:  # Already fetched by fetchAll()
+		conversionBudget.countFetch()
+	return urlCache.fetch(url, requestTimeout = conversionBudget.fetchTimeout(urlCache.maxSeconds))
+
+def _fetchLocation(location: str) -> bytes:
+	# Run by the threads of fetchAll(), which has already counted the fetch against the budget
+	# Unless the draft is a local file of the user, only the reference hosts are contacted: a server (jobServer.py,
+	# process.php) must not fetch internal addresses on behalf of an uploaded draft and return the content
+	import urlCache
+	if location.startswith('https://') or location.startswith('http://'):
+		allowedHosts = None
+		if not localIncludes:
+			import urllib.parse
+			allowedHosts = referenceHosts
+			if (urllib.parse.urlsplit(location).hostname or '').lower() not in allowedHosts:
+				raise ValueError('only the reference hosts (' + ', '.join(sorted(allowedHosts)) + ') can be included')
+		return urlCache.fetch(location, requestTimeout = None if conversionBudget is None else conversionBudget.fetchTimeout(urlCache.maxSeconds), allowedHosts = allowedHosts)
+	if '://' in location or not localIncludes:
+		raise ValueError('only http(s) documents can be included')
+	with open(location, 'rb') as f:
+		return f.read()
+
+def fetchAll(locations: List[str]) -> Dict[str, Union[bytes, Exception]]:
+	# Fetches URLs (or local files) concurrently, the result is the content or the exception raised for each one
+	import concurrent.futures
+	locations = list(dict.fromkeys(locations))
+	if conversionBudget is not None:  # Counted here rather than concurrently by the threads
+		import urlCache
+		for location in locations:
+			if '://' in location and location not in urlCache.fetched:
+				conversionBudget.countFetch()
+	results = {}
+	with concurrent.futures.ThreadPoolExecutor(max_workers = max(min(fetchThreads, len(locations)), 1)) as pool:
+		futures = [(location, pool.submit(_fetchLocation, location)) for location in locations]
+		for location, future in futures:
+			try:
+				results[location] = future.result()
+			except budgetExceeded:
+				raise
+			except Exception as err:
+				results[location] = err
+	return results
+
 libsTable = { 
 	'RFC': 'https://www.rfc-editor.org/refs/bibxml/',
 	'I-D': 'http://xml2rfc.ietf.org/public/rfc/bibxml3/',
@@ -168,29 +139,38 @@ libsTable = {
 	'FYI': 'http://xml2rfc.ietf.org/public/rfc/bibxml9/',
 	'STD': 'http://xml2rfc.ietf.org/public/rfc/bibxml9/',
 }
+# The only hosts an uploaded draft may include documents from
+referenceHosts = frozenset([url.split('/')[2] for url in libsTable.values()] + ['bib.ietf.org'])
 
-def includeExternal(referenceName: str) -> Optional[xml.dom.minidom.Element]:
-	global libsTable
-	
+def includeURL(referenceName: str) -> Optional[str]:
 	referenceTokens = referenceName.split('.')
 	if len(referenceTokens) < 2:
-		print("Reference name " + referenceName + " is malformed...")
+		logger.warning('Reference name %s is malformed...', referenceName)
 		return None
 	if libsTable.get(referenceTokens[1]):
-		libURL = libsTable.get(referenceTokens[1])
-		print("Importing " + referenceName + " from " + libURL + referenceName + '.xml')
+		return libsTable.get(referenceTokens[1]) + referenceName + '.xml'
+	logger.warning('Reference type %s not supported...', referenceTokens[1])
+	return None
+
+def includeExternal(referenceName: str) -> Optional[xml.dom.minidom.Element]:
+	# Normally already done by xmlInclude.resolveIncludes()
+
+	url = includeURL(referenceName)
+	if url is not None:
+		libURL = url[:-len(referenceName + '.xml')]
+		logger.info('Importing %s from %s', referenceName, url)
 		try:
-			response = urllib.request.urlopen(libURL + referenceName + '.xml')
-			importedString = response.read()
-			importedXML = minidom.parseString(importedString)
-		except urllib.error.HTTPError as err:
-			print("Cannot import XML from " +  libURL + referenceName + ".xml, error: ", err)
+			importedString = fetchURL(url)
+			importedXML = parseXMLString(importedString, url)
+		except budgetExceeded:
+			raise
+		except OSError as err:  # Including urllib.error.HTTPError and the timeouts
+			logger.warning('Cannot import XML from %s%s.xml, error: %s', libURL, referenceName, err)
 			return None
-		except:
-			print('Not found or invalid XML in ' + libURL)
+		except xml.parsers.expat.ExpatError as err:
+			logger.warning('Invalid XML in %s: %s', url, err)
 			return None
 		return importedXML.getElementsByTagName('reference')[0]
-	print("Reference type " + referenceTokens[1] + " not supported...")
 	return None
 	
 def parseAbstract(elem: xml.dom.minidom.Element) -> None:
@@ -200,29 +180,61 @@ def parseAbstract(elem: xml.dom.minidom.Element) -> None:
 		elif child.nodeName == 't':
 			parseText(child, style = 'Abstract')
 		else:
-			print('Unexpected tagName in Abstract: ', child.nodeName)
+			logger.warning('Unexpected tagName in Abstract: %s', child.nodeName)
 
 def parseArea(elem: xml.dom.minidom.Element) -> None:
-	textValue = ''
+	textParts = []
 	for text in elem.childNodes:
 		if text.nodeType == Node.TEXT_NODE:
-			textValue += text.nodeValue
+			textParts.append(text.nodeValue)
 		if elem.nodeType == Node.ELEMENT_NODE:
 			if text.nodeName != '#text':
-				print('!!!!! parseArea: Text is ELEMENT_NODE: ', text.nodeName)
-	writer.setMetaData('area', textValue)
+				logger.warning('!!!!! parseArea: Text is ELEMENT_NODE: %s', text.nodeName)
+	writer.setMetaData('area', ''.join(textParts))
 
 def parseArtWork(elem: xml.dom.minidom.Element, figure: figureFigure) -> None:	# See also https://tools.ietf.org/html/rfc7991#section-2.5
+	# SVG and images in a data: URI are kept as images
 	# If there is no type attribute, let's process the element
 	# If there is a type attribute, let's process the element only if type == ascii-art
-	if (not elem.hasAttribute('type')) or (elem.hasAttribute('type') and (elem.getAttribute('type') == 'ascii-art' or elem.getAttribute('type') == '')):
-		figureLines = ''
-		for chunk in elem.childNodes:	
-			text = chunk.nodeValue
-			figureLines += text
-		# Let's split this string into lines and print each line
-		for line in figureLines.splitlines():
-			figure.addRow(line.rstrip(" \t"))  # Remove trailing spaces and tabs
+	if elem.getAttribute('type') == 'svg' or elem.getAttribute('src').startswith('data:image/'):
+		image = _artworkImage(elem)
+		if image is not None:
+			figure.addImage(image)
+	elif (not elem.hasAttribute('type')) or (elem.hasAttribute('type') and (elem.getAttribute('type') == 'ascii-art' or elem.getAttribute('type') == '')):
+		# Let's join the chunks (text and CDATA) once and split this string into lines
+		figureLines = ''.join(chunk.nodeValue for chunk in elem.childNodes)
+		figure.addRows(_artworkRows(figureLines))
+
+def _artworkImage(elem: xml.dom.minidom.Element) -> Optional[figureImage]:
+	# Inline <svg> or a data: URI in src, e.g., src="data:image/png;base64,iVBORw0KGgo..."
+	import urllib.parse
+	alt = elem.getAttribute('alt') or None
+	src = elem.getAttribute('src')
+	if src.startswith('data:'):
+		header, _, data = src[5:].partition(',')
+		contentType = header.split(';')[0]
+		if contentType not in ('image/svg+xml', 'image/png'):
+			logger.warning('!!!! parseArtWork: unsupported image type: %s', contentType)
+			return None
+		if header.endswith(';base64'):
+			return figureImage(contentType, data, True, alt)
+		return figureImage(contentType, urllib.parse.unquote(data), False, alt)
+	for child in elem.childNodes:
+		if child.nodeType == Node.ELEMENT_NODE and child.localName == 'svg':
+			if not child.hasAttribute('xmlns'):  # Declared on an ancestor, but the image is a document on its own
+				child = child.cloneNode(True)
+				child.setAttribute('xmlns', 'http://www.w3.org/2000/svg')
+			return figureImage('image/svg+xml', child.toxml(), False, alt)
+	logger.warning('!!!! parseArtWork: cannot embed the SVG artwork %s, only inline <svg> and data: URIs are supported', src)
+	return None
+
+def _artworkRows(figureLines: str) -> Iterator[str]:
+	# The lines without their trailing spaces and tabs (expat has already normalized the line ends to \n)
+	# The lines are only split while the writer iterates over figure.rows, without any list of them
+	for line in io.StringIO(figureLines):
+		if line.endswith('\n'):
+			line = line[:-1]
+		yield line.rstrip(" \t")  # Remove trailing spaces and tabs
 
 def parseAuthor(elem):	# Per https://tools.ietf.org/html/rfc7991#section-2.7
 	global writer
@@ -263,18 +275,18 @@ def parseBack(elem): # https://tools.ietf.org/html/rfc7991#section-2.8
 		elif child.nodeName == 'section':
 			parseSection(child, 2)
 		else:
-			print('!!!! parseBack: unexpected nodeName: ' + child.nodeName)
+			logger.warning('!!!! parseBack: unexpected nodeName: %s', child.nodeName)
 
 def parseBcp14(elem: xml.dom.minidom.Element) -> Optional[str]:  # https://tools.ietf.org/html/rfc7991#section-2.9 only text
 	if elem.nodeValue != None:
-		print('Bcp14 nodeValue: ' , elem.nodeValue)
+		logger.warning('Bcp14 nodeValue: %s', elem.nodeValue)
 	if elem.nodeType == Node.TEXT_NODE:
-		print('Bcp14 node is TEXT_NODE')
+		logger.warning('Bcp14 node is TEXT_NODE')
 	for child in elem.childNodes:
 		if child.nodeType == Node.TEXT_NODE:
 			return child.nodeValue
 		else:
-			print('!!!! parseBcp14 unexpected nodeType: ' + child.nodeType)
+			logger.warning('!!!! parseBcp14 unexpected nodeType: %s', child.nodeType)
 	
 def parseBlockQuote(elem): # See also https://tools.ietf.org/html/rfc7991#section-2.10 that is similar to old <list> items
 	parseText(elem, style = 'Quote', numberingID = None, indentationLevel = None)
@@ -286,7 +298,7 @@ def parseBoilerPlate(elem):
 		elif child.nodeName == 'section':
 			parseSection(child, 1)
 		else:
-			print('Unexpected tagName in BoilerPlate: ', child.nodeName)
+			logger.warning('Unexpected tagName in BoilerPlate: %s', child.nodeName)
 
 def parseDate(elem: xml.dom.minidom.Element) -> None:
 	global writer
@@ -303,7 +315,7 @@ def parseDate(elem: xml.dom.minidom.Element) -> None:
 	
 def parseDisplayReference(elem): # https://tools.ietf.org/html/rfc7991#section-2.19
 	# Presentation only... skipping it for now
-	print("parseDisplayReference not yet implemented")
+	logger.warning('parseDisplayReference not yet implemented')
 	return
 	
 def parseDList(elem: xml.dom.minidom.Element) -> None:  # See also https://tools.ietf.org/html/rfc7991#section-2.20 
@@ -319,22 +331,22 @@ def parseDList(elem: xml.dom.minidom.Element) -> None:  # See also https://tools
 			# Can contain text + some other elements including complex ones
 			parseText(child)
 		else:
-			print('!!!! parseDList, unexpected child: ', child.nodeName)
+			logger.warning('!!!! parseDList, unexpected child: %s', child.nodeName)
 
 # TODO switch off language to avoid wrong typos ?
 def parseEref(elem: xml.dom.minidom.Element) -> Optional[str]:	# See also https://tools.ietf.org/html/rfc7991#section-2.24
 	if elem.nodeValue != None:
-		print('Eref nodeValue: ' , elem.nodeValue)
+		logger.warning('Eref nodeValue: %s', elem.nodeValue)
 	if elem.hasAttribute('target'):	# one and only mandatory attribute
 		return '[' + elem.getAttribute('target') + ']'
 	# Only target attribute, so, quite useless to parse other attributes
 	if elem.nodeType == Node.TEXT_NODE:
-		print('Eref node is TEXT_NODE')
+		logger.warning('Eref node is TEXT_NODE')
 	for child in elem.childNodes:
 		if child.nodeType == Node.TEXT_NODE:
 			return child.nodeValue
 		if child.nodeName == 't':
-			print("parseEref recurse into t !!!")
+			logger.warning('parseEref recurse into t !!!')
 			parseText(child)
 
 def parseFigure(elem: xml.dom.minidom.Element) -> None: # See https://tools.ietf.org/html/rfc7991#section-2.25
@@ -364,6 +376,7 @@ def parseFigure(elem: xml.dom.minidom.Element) -> None: # See https://tools.ietf
 				figureTitle = nameChild[0].childNodes[0].nodeValue
 	if figureTitle != None:
 		figure.setName(figureTitle)
+	figure.anchor = elem.getAttribute('anchor') or None
 	writer.newFigure(figure)  # Let the writer handle the figure
 	# Figure had postamble (deprecated but let's process it)
 	postambleChildren = elem.getElementsByTagName('postamble')
@@ -379,7 +392,7 @@ def parseKeyword(elem: xml.dom.minidom.Element) -> None:
 			writer.setMetaData('keywords', text.nodeValue)
 		if elem.nodeType == Node.ELEMENT_NODE:
 			if text.nodeName != '#text':
-				print('!!!!! parseKeyword: Text is ELEMENT_NODE: ', text.nodeName)
+				logger.warning('!!!!! parseKeyword: Text is ELEMENT_NODE: %s', text.nodeName)
 
 def parseList(elem: xml.dom.minidom.Element) -> None:  # See also https://tools.ietf.org/html/rfc7991#section-2.29
 	for child in elem.childNodes:
@@ -388,15 +401,15 @@ def parseList(elem: xml.dom.minidom.Element) -> None:  # See also https://tools.
 		elif child.nodeType == Node.TEXT_NODE: # Unexpected, let's hope it is empty space
 			if child.nodeValue.strip(" \t\r\n") == '':
 				continue
-			print("!!!! parseList non empty text = '" + child.nodeValue.strip(" \t\r\n") + "'")
+			logger.warning("!!!! parseList non empty text = '%s'", child.nodeValue.strip(" \t\r\n"))
 			continue
 		elif child.nodeType != Node.ELEMENT_NODE:
-			print('!!!! parseList, unexpected child node type: ', child)
+			logger.warning('!!!! parseList, unexpected child node type: %s', child)
 			continue
 		if child.nodeName == 't':
 			parseText(child, style = 'ListParagraph', numberingID = '2', indentationLevel = '0')  # numID = 2 is defined in numbering.xml as bullet list
 		else:
-			print('!!!! parseList, unexpected child: ', child.nodeName)
+			logger.warning('!!!! parseList, unexpected child: %s', child.nodeName)
 		
 def parseListItem(elem: xml.dom.minidom.Element, 
               style: str = 'ListParagraph', 
@@ -406,37 +419,37 @@ def parseListItem(elem: xml.dom.minidom.Element,
 		attrib = elem.attributes.item(i)
 		if attrib.name == 'pn' or  attrib.name == 'anchor' or  attrib.name == 'derivedCounter': 	# Let's ignore this marking as no obvious requirement or support in Office OpenXML
 			continue
-		print("\tLI unexpected attribute: ", attrib.name, ' = ' , attrib.value)
+		logger.warning('\tLI unexpected attribute: %s = %s', attrib.name, attrib.value)
 
-	textValue = ''
+	textParts = []  # Joined only when a paragraph is emitted to stay linear on long items
 	for text in elem.childNodes:
 		if text.nodeType == Node.TEXT_NODE:
-			textValue += text.nodeValue
+			textParts.append(text.nodeValue)
 		if elem.nodeType == Node.ELEMENT_NODE:
 			if text.nodeName == 'bcp14':
-				textValue = textValue + parseBcp14(text)
+				textParts.append(parseBcp14(text))
 			elif text.nodeName == 'eref':
-				textValue = textValue + parseXref(text)
+				textParts.append(parseEref(text))
 			elif text.nodeName == 'ol':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
-				textValue = ''
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				textParts = []
 				parseOList(text)
 			elif text.nodeName == 't':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
 				parseText(text)
 			elif text.nodeName == 'ul':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
 				parseUList(text)
 			elif text.nodeName == 'xref':
-				textValue = textValue + parseXref(text)
+				textParts.append(parseXref(text))
 			elif text.nodeName != '#text':
-				print('!!!!! parseListItem: Text is ELEMENT_NODE: ', text.nodeName)
+				logger.warning('!!!!! parseListItem: Text is ELEMENT_NODE: %s', text.nodeName)
 #			else:
 #				print('parseListItem ignoring Text is ELEMENT_NODE: ', text.nodeName)
-	writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+	writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
 
 def parseNote(elem: xml.dom.minidom.Element) -> None:  # See https://tools.ietf.org/html/rfc7991#section-2.33
-	print("<note> is an unsupported tag")
+	logger.warning('<note> is an unsupported tag')
 	
 # TODO should reset the numbering to 1... cfr draft-ietf-anima-autonomic-control-plane-29.xml
 def parseOList(elem: xml.dom.minidom.Element) -> None:
@@ -446,7 +459,7 @@ def parseOList(elem: xml.dom.minidom.Element) -> None:
 		if child.nodeName == 'li':
 			parseListItem(child, numberingID = '1', indentationLevel = '0')  # numID = 1 is defined in numbering.xml as enumeration list
 		else:
-			print('!!!! Unexpected List child: ', child.nodeName)
+			logger.warning('!!!! Unexpected List child: %s', child.nodeName)
 
 def parseReferenceGroup(elem: xml.dom.minidom.Element, isNormative: bool = False) -> None:  # See https://tools.ietf.org/html/rfc7991#section-2.40
 	if elem.nodeType != Node.ELEMENT_NODE:
@@ -461,17 +474,17 @@ def parseReferenceGroup(elem: xml.dom.minidom.Element, isNormative: bool = False
 		elif serie == 'STD':
 			text += ' Internet Standard'
 	else:
-		print('!!!! parseReference, missing anchor attribute')
+		logger.warning('!!!! parseReference, missing anchor attribute')
 		return
 	text += f"\nAt the time of writing, this {serie} comprises the following:\n"
-	writer.newParagraph(text)
+	writer.newParagraph(text, anchor = elem.getAttribute('anchor'))
 	for child in elem.childNodes:
 		if child.nodeType != Node.ELEMENT_NODE:
 			continue
 		if child.nodeName == 'reference':
 			parseReference(child, isNormative = isNormative, isSubReference = True)
 		else:
-			print('!!!! Unexpected ReferenceGroup child: ', child.nodeName)
+			logger.warning('!!!! Unexpected ReferenceGroup child: %s', child.nodeName)
 
 def parseReference(elem: xml.dom.minidom.Element, 
                isNormative: bool = False, 
@@ -481,7 +494,7 @@ def parseReference(elem: xml.dom.minidom.Element,
 	if elem.hasAttribute('anchor'):
 		text = '[' + elem.getAttribute('anchor') + ']  '
 	else:
-		print('!!!! parseReference, missing anchor attribute')
+		logger.warning('!!!! parseReference, missing anchor attribute')
 		text = ''
 	# <seriesInfo name="RFC" value="8174"/>
 	seriesInfoText = ''
@@ -498,7 +511,7 @@ def parseReference(elem: xml.dom.minidom.Element,
 			else:
 				seriesInfoText += serieInfo.getAttribute('name') + ', '
 		else:
-			print("!!!! parseReference, no name/value attribute in seriesInfo for " + text)
+			logger.warning('!!!! parseReference, no name/value attribute in seriesInfo for %s', text)
 	frontElems = elem.getElementsByTagName('front')
 	if frontElems.length > 0:
 		frontElem = frontElems[0]
@@ -545,9 +558,9 @@ def parseReference(elem: xml.dom.minidom.Element,
 		text = text[:-2]
 	text += '.'
 	if isSubReference:
-		writer.newParagraph(text, style = 'ListParagraph', numberingID = '2', indentationLevel = '0') # numID = 2 is defined in numbering.xml as bullet list
+		writer.newParagraph(text, style = 'ListParagraph', numberingID = '2', indentationLevel = '0', anchor = elem.getAttribute('anchor') or None) # numID = 2 is defined in numbering.xml as bullet list
 	else:
-		writer.newParagraph(text)
+		writer.newParagraph(text, anchor = elem.getAttribute('anchor') or None)
 
 def parseReferences(elem, headingLevel = 1): # https://tools.ietf.org/html/rfc7991#section-2.42
 	if elem.nodeType != Node.ELEMENT_NODE:
@@ -561,23 +574,29 @@ def parseReferences(elem, headingLevel = 1): # https://tools.ietf.org/html/rfc79
 			if nameChild[0].nodeType == Node.ELEMENT_NODE:
 				sectionTitle = nameChild[0].childNodes[0].nodeValue
 		else:
-			print('??? parseReferences: this references section has not title...')
+			logger.warning('??? parseReferences: this references section has not title...')
 	isNormative = (sectionTitle is not None and sectionTitle.startswith('Normative Reference'))
 	if sectionTitle != None:
-		writer.newParagraph(sectionTitle, 'Heading' + str(headingLevel), unnumbered = None)
+		writer.newParagraph(sectionTitle, 'Heading' + str(headingLevel), unnumbered = None, anchor = elem.getAttribute('anchor') or None)
 	for child in elem.childNodes:
 		if child.nodeType == Node.PROCESSING_INSTRUCTION_NODE: # in this location it is probably <?rfc include='reference.RFC.2119'?> or <?rfc include='reference.I-D.ietf-emu-eaptlscert'?> 
 			if child.target == 'rfc' and (child.data[0:9] == "include='" or child.data[0:9] == 'include="'):
 				includeName = child.data[9:-1]
+				if not writer.resolvesIncludes:
+					countInclude(includeName, isNormative)
+					continue
 				child = includeExternal(includeName)
 				if child is None:
 					continue
+			elif child.target == xmlInclude.deferredEntity and not writer.resolvesIncludes:
+				countInclude(child.data, isNormative)
+				continue
 			else:
-				print("parseReferences: skipping unknown processing instruction: target = " + child.target + ", data = " + child.data[0:9]) 
+				logger.warning('parseReferences: skipping unknown processing instruction: target = %s, data = %s', child.target, child.data[0:9]) 
 		if child.nodeType == Node.TEXT_NODE:  # Let's skip whitespace (assuming it is white space...)
 			continue
 		if child.nodeType != Node.ELEMENT_NODE:
-			print('!!!! parseReferences: unexpected nodeType: ', child)
+			logger.warning('!!!! parseReferences: unexpected nodeType: %s', child)
 			continue
 		if child.nodeName == 'reference':
 			parseReference(child, isNormative = isNormative, isSubReference = False)
@@ -585,8 +604,23 @@ def parseReferences(elem, headingLevel = 1): # https://tools.ietf.org/html/rfc79
 			parseReferences(child, headingLevel + 1)
 		elif child.nodeName == 'referencegroup':
 			parseReferenceGroup(child, isNormative = isNormative)
+		elif child.namespaceURI == xmlInclude.XINCLUDE and child.localName == 'include' and not writer.resolvesIncludes:
+			countInclude(child.getAttribute('href'), isNormative)
 		elif child.nodeName != 'name': # <name> is already processed
-			print('!!!! parseReferences: unexpected nodeName: ' + child.nodeName)
+			logger.warning('!!!! parseReferences: unexpected nodeName: %s', child.nodeName)
+
+def countInclude(location: str, isNormative: bool) -> None:
+	# When the writer does not resolve the includes (see statsWriter), an included RFC, STD, BCP or FYI is still
+	# counted from its name, e.g., reference.RFC.2119 or .../reference.RFC.2119.xml, without fetching it
+	name = location.rsplit('/', 1)[-1]
+	if name.endswith('.xml'):
+		name = name[:-len('.xml')]
+	tokens = name.split('.')
+	if len(tokens) == 3 and tokens[0] == 'reference' and tokens[1] in ('RFC', 'STD', 'BCP', 'FYI') and tokens[2].isdigit():
+		if isNormative:
+			writer.normativeReferences.append(tokens[1] + str(int(tokens[2])))
+		else:
+			writer.informativeReferences.append(tokens[1] + str(int(tokens[2])))
 
 def parseName(elem): 
 	pass # EVY ?
@@ -608,9 +642,8 @@ def parseRfc(elem):  # See also https://tools.ietf.org/html/rfc7991#section-2.45
 		writer.setMetaData('updates', elem.getAttribute('updates'))
 		# docxBody.appendChild(docxNewParagraph('Updates: ' + elem.getAttribute('updates')))
 
-def parseSection(elem: xml.dom.minidom.Element, headingDepth: int) -> None:
-	if elem.nodeType != Node.ELEMENT_NODE:
-		return
+def parseSectionHeading(elem: xml.dom.minidom.Element, headingDepth: int) -> None:
+	# Only the heading, also for the sections (or references) enclosing a selected one, see _renderSection()
 	if elem.hasAttribute('numbered'):
 		unnumbered = (elem.getAttribute('numbered') == 'false')
 	else:
@@ -618,20 +651,27 @@ def parseSection(elem: xml.dom.minidom.Element, headingDepth: int) -> None:
 	sectionTitle = None
 	if elem.hasAttribute('title'):
 		sectionTitle = elem.getAttribute('title')
-	elif elem.nodeName == 'section': # Can be the case for <front> <middle> .... that are also processed by this part
+	elif elem.nodeName in ('section', 'references'): # Can be the case for <front> <middle> .... that are also processed by this part
 		# Look after a child node of tag "name"
 		nameChild = elem.getElementsByTagName('name')
 		if nameChild.length > 0:
 			if nameChild[0].nodeType == Node.ELEMENT_NODE:
 				sectionTitle = nameChild[0].childNodes[0].nodeValue
 		else:
-			print('??? This section has not title...') 
+			logger.warning('??? This section has not title...') 
 	if sectionTitle != None:
-		writer.newParagraph(sectionTitle, 'Heading' + str(headingDepth), unnumbered = unnumbered)
+		writer.newParagraph(sectionTitle, 'Heading' + str(headingDepth), unnumbered = unnumbered, anchor = elem.getAttribute('anchor') or None)
+
+def parseSection(elem: xml.dom.minidom.Element, headingDepth: int) -> None:
+	if elem.nodeType != Node.ELEMENT_NODE:
+		return
+	parseSectionHeading(elem, headingDepth)
 	sectionId = 0
 	for child in elem.childNodes:
 		if child.nodeType != Node.ELEMENT_NODE:
 			continue
+		if conversionBudget is not None:
+			conversionBudget.checkDeadline()
 		if child.nodeName == 'section':
 			sectionId = sectionId + 1 
 			# Should create a docx Child ???
@@ -673,13 +713,13 @@ def parseSection(elem: xml.dom.minidom.Element, headingDepth: int) -> None:
 		elif child.nodeName == 'title':
 			parseTitle(child)
 		elif child.nodeName == 'toc':
-			print('Skipping the ToC')
+			logger.info('Skipping the ToC')
 		elif child.nodeName == 'ul':
 				parseUList(child)
 		elif child.nodeName == 'workgroup':
 			parseWorkgroup(child)
 		else:
-			print('!!!!! Unexpected tag in parseSection: ' + child.tagName)
+			logger.warning('!!!!! Unexpected tag in parseSection: %s', child.tagName)
  
 # TODO handle wrongly formatted    <seriesInfo name="Internet-Draft" value="draft-ietf-anima-autonomic-control-plane-29"/>
 def parseSeriesInfo(elem):
@@ -701,13 +741,13 @@ def parseText(elem: xml.dom.minidom.Element,
            indentationLevel: Optional[str] = None, 
            Verbose: Optional[bool] = None) -> None:  # See https://tools.ietf.org/html/rfc7991#section-2.53
 	if Verbose:
-		print("parseText start: ", elem)
-	textValue = ''
+		logger.info('parseText start: %s', elem)
+	textParts = []  # Joined only when a paragraph is emitted, as repeated concatenation is quadratic on long texts
 	# Mainly for debugging
 	for i in range(elem.attributes.length):
 		attrib = elem.attributes.item(i)
 		if attrib.name == 'hangText':
-			textValue = attrib.value
+			textParts = [attrib.value]
 			continue
 		if attrib.name == 'pn': 	# Let's ignore this marking as no obvious requirement or support in Office OpenXML
 			continue
@@ -715,61 +755,61 @@ def parseText(elem: xml.dom.minidom.Element,
 			continue
 		if attrib.name == 'keepWithNext':	# TODO later if really required
 			continue
-		print("\tparseText unexpected attribute: ", attrib.name, '=' , attrib.value)
+		logger.warning('\tparseText unexpected attribute: %s = %s', attrib.name, attrib.value)
 
 	for text in elem.childNodes:
 		if text.nodeType == Node.TEXT_NODE:
-			textValue += text.nodeValue
+			textParts.append(text.nodeValue)
 			if Verbose:
-				print("parseText adding TEXT_NODE: '", text.nodeValue, "'")
+				logger.info("parseText adding TEXT_NODE: '%s'", text.nodeValue)
 		if elem.nodeType == Node.ELEMENT_NODE:
 			if text.nodeName == 'bcp14':
-				textValue = textValue + parseBcp14(text)
+				textParts.append(parseBcp14(text))
 			elif text.nodeName == 'eref':
-				textValue = textValue + parseEref(text)
+				textParts.append(parseEref(text))
 			elif text.nodeName == 'figure':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
-				textValue = ''
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				textParts = []
 				parseFigure(text)
 			elif text.nodeName == 'list':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
-				textValue = ''
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				textParts = []
 				parseList(text)
 			elif text.nodeName == 'ol':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
-				textValue = ''
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				textParts = []
 				parseOList(text)
 			elif text.nodeName == 't':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
 				if Verbose:
-					print("parseText found <t>: emitting '", textValue, "'")
-				textValue = ''
+					logger.info("parseText found <t>: emitting '%s'", ''.join(textParts))
+				textParts = []
 				parseText(text, style = style, numberingID = numberingID, indentationLevel = indentationLevel, Verbose = Verbose)
 			elif text.nodeName == 'vspace':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
 				# Now force an empty paragraph
 				writer.newParagraph('', style = style, removeEmpty = False)
-				textValue = ''
+				textParts = []
 			elif text.nodeName == 'ul':
-				writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
-				textValue = ''
+				writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				textParts = []
 				parseUList(text)
 			elif text.nodeName == 'xref':
-				textValue = textValue + parseXref(text)
+				textParts.append(parseXref(text))
 			elif text.nodeName == 'tt': # Fixed font
 				# TODO should the concept of 'run' rather than 'paragraph' be used here 
 				# textValue = textValue + parseText(text, style = 'Code', numberingID = None, indentationLevel = None, Verbose = True)
 				# old parseText(text, style = 'Code', numberingID = None, indentationLevel = None)
 				for child in text.childNodes:
 					if child.nodeType == Node.TEXT_NODE:
-						textValue += child.nodeValue
+						textParts.append(child.nodeValue)
 					elif child.nodeType == Node.ELEMENT_NODE:
-						print('!!!!! parseText: Text inside tt element is ELEMENT_NODE: ', child.nodeName)
+						logger.warning('!!!!! parseText: Text inside tt element is ELEMENT_NODE: %s', child.nodeName)
 #			elif text.nodeName == 'em': # italics font
 #				textValue = textValue + parseText(text, style = 'Emphasis', numberingID = None, indentationLevel = None)
 			elif text.nodeName != '#text' and text.nodeName != '#comment':
-				print('!!!!! parseText: Text is ELEMENT_NODE: ', text.nodeName)
-	writer.newParagraph(textValue, style = style, numberingID = numberingID, indentationLevel = indentationLevel)
+				logger.warning('!!!!! parseText: Text is ELEMENT_NODE: %s', text.nodeName)
+	writer.newParagraph(''.join(textParts), style = style, numberingID = numberingID, indentationLevel = indentationLevel)
 
 def parseTable(elem: xml.dom.minidom.Element) -> None:  # See https://tools.ietf.org/html/rfc7991#section-2.54
 	thisTable = tableTable()
@@ -789,12 +829,13 @@ def parseTable(elem: xml.dom.minidom.Element) -> None:  # See https://tools.ietf
 						if cell.nodeName in ['td', 'th']:  # td is a table data cell, th is a table header cell
 							thisRow.addCell(tableCell(cell.childNodes[0].nodeValue))
 						else:
-							print('!!!! parseTable unexpected header cell: ', cell.nodeName)
+							logger.warning('!!!! parseTable unexpected header cell: %s', cell.nodeName)
 				thisTable.addRow(thisRow)
 		elif child.nodeName == 'name':
 			thisTable.setName(child.childNodes[0].nodeValue)
 		else:
-			print('!!!! parseTable unexpected child: ', child.nodeName)
+			logger.warning('!!!! parseTable unexpected child: %s', child.nodeName)
+	thisTable.anchor = elem.getAttribute('anchor') or None
 	writer.newTable(thisTable)  # Let's write the table to the document
 
 def parseTextTable(elem: xml.dom.minidom.Element) -> None:  # See https://tools.ietf.org/html/rfc7991#section-2.55
@@ -827,19 +868,17 @@ def parseTextTable(elem: xml.dom.minidom.Element) -> None:  # See https://tools.
 		elif child.nodeName == 'postamble':
 			postAmble = child.childNodes[0].nodeValue
 		else:
-			print('!!!! parseTextTable unexpected child: ', child.nodeName)
+			logger.warning('!!!! parseTextTable unexpected child: %s', child.nodeName)
 	thisTable.addRow(thisRow) # optimistic...
 	if preAmble is not None:
 		writer.newParagraph(preAmble) 
+	thisTable.anchor = elem.getAttribute('anchor') or None
 	writer.newTable(thisTable)  # Let's write the table to the document
 	if postAmble is not None:
 		writer.newParagraph(postAmble) 
 	
 def parseTitle(elem: xml.dom.minidom.Element) -> None:
-	textValue = ''
-	for text in elem.childNodes:
-		if text.nodeType == Node.TEXT_NODE:
-			textValue += text.nodeValue
+	textValue = ''.join(text.nodeValue for text in elem.childNodes if text.nodeType == Node.TEXT_NODE)
 	writer.newParagraph(textValue, style = 'Title')
 	writer.setMetaData('title', textValue)
 
@@ -850,48 +889,333 @@ def parseUList(elem: xml.dom.minidom.Element) -> None:
 		if child.nodeName == 'li':
 			parseListItem(child, numberingID = '2', indentationLevel = '0')  # numID = 2 is defined in numbering.xml as bullet list
 		else:
-			print('!!!! Unexpected List child: ', child.nodeName)
+			logger.warning('!!!! Unexpected List child: %s', child.nodeName)
 
 def parseWorkgroup(elem: xml.dom.minidom.Element) -> None:
-	textValue = ''
+	textParts = []
 	for text in elem.childNodes:
 		if text.nodeType == Node.TEXT_NODE:
-			textValue += text.nodeValue
+			textParts.append(text.nodeValue)
 		if elem.nodeType == Node.ELEMENT_NODE:
 			if text.nodeName != '#text':
-				print('!!!!! parseWorkgroup: Text is ELEMENT_NODE: ', text.nodeName)
-	writer.setMetaData('workgroup', textValue)
+				logger.warning('!!!!! parseWorkgroup: Text is ELEMENT_NODE: %s', text.nodeName)
+	writer.setMetaData('workgroup', ''.join(textParts))
 
 def parseXref(elem: xml.dom.minidom.Element) -> Optional[str]:	# See also https://tools.ietf.org/html/rfc7991#section-2.66
 	if elem.nodeValue != None:
-		print('Xref nodeValue: ' , elem.nodeValue)
+		logger.warning('Xref nodeValue: %s', elem.nodeValue)
 	if elem.hasAttribute('target'):	# One and only mandatory attribute
-		return '[' + elem.getAttribute('target') + ']'
+		target = elem.getAttribute('target')
+		anchor = anchors.get(target)
+		if anchor is None:  # Possibly an included reference, unknown before the walk
+			return '[' + target + ']'
+		# The content, if any, is the text to display
+		content = ' '.join(''.join(child.nodeValue for child in elem.childNodes if child.nodeType == Node.TEXT_NODE).split())
+		if content != '':
+			return link(target, content)
+		return link(target, _xrefText(elem, target, anchor))
 	if elem.nodeType == Node.TEXT_NODE:
-		print('Xref node is TEXT_NODE')
+		logger.warning('Xref node is TEXT_NODE')
 	# Only target attribute, so, quite useless to parse further for more attributes
 	for child in elem.childNodes:
 		if child.nodeType == Node.TEXT_NODE:
 			return child.nodeValue
-		print('!!!! parseXref, unexpected child.nodeName: ' + child.nodeName)	# Only text is allowed
+		logger.warning('!!!! parseXref, unexpected child.nodeName: %s', child.nodeName)	# Only text is allowed
 							
-def processXML(inFilename: str, outFilename: str = 'xml2docx.xml') -> None:
+def _xrefText(elem: xml.dom.minidom.Element, target: str, anchor: anchorTarget) -> str:
+	# Per https://tools.ietf.org/html/rfc7991#section-2.66.1 format and section/sectionFormat attributes
+	xrefFormat = elem.getAttribute('format') if elem.hasAttribute('format') else 'default'
+	if xrefFormat == 'none':
+		return ''
+	if xrefFormat == 'title' and anchor.title is not None:
+		return anchor.title
+	if anchor.kind == 'reference':
+		citation = '[' + target + ']'
+		if not elem.hasAttribute('section'):
+			return citation
+		sectionFormat = elem.getAttribute('sectionFormat') if elem.hasAttribute('sectionFormat') else 'of'
+		sectionText = 'Section ' + elem.getAttribute('section')
+		if sectionFormat == 'comma':
+			return citation + ', ' + sectionText
+		if sectionFormat == 'parens':
+			return citation + ' (' + sectionText + ')'
+		if sectionFormat == 'bare':
+			return elem.getAttribute('section')
+		return sectionText + ' of ' + citation
+	if anchor.number is None:  # Unnumbered section
+		return '"' + str(anchor.title) + '"'
+	if xrefFormat == 'counter':
+		return anchor.number
+	return anchor.kind.title() + ' ' + anchor.number
+
+anchors: Dict[str, anchorTarget] = {}  # Filled by indexAnchors() before the walk
+sections: List[Tuple[xml.dom.minidom.Element, Optional[str], Optional[str]]] = []  # (element, number, title) of every section and references, in document order
+
+def _elementTitle(elem: xml.dom.minidom.Element) -> Optional[str]:
+	# Same rules as parseSection() and parseFigure(): title attribute or first <name> child
+	if elem.hasAttribute('title'):
+		return elem.getAttribute('title')
+	for child in elem.childNodes:
+		if child.nodeType == Node.ELEMENT_NODE and child.nodeName == 'name':
+			return ' '.join(''.join(text.nodeValue for text in child.childNodes if text.nodeType == Node.TEXT_NODE).split())
+	return None
+
+def _addAnchor(elem: xml.dom.minidom.Element, kind: str, number: Optional[str], title: Optional[str]) -> None:
+	if elem.hasAttribute('anchor') and elem.getAttribute('anchor') not in anchors:
+		anchors[elem.getAttribute('anchor')] = anchorTarget(kind, number, title, len(anchors))
+
+def _indexSection(elem: xml.dom.minidom.Element, number: Optional[str], kind: str, counters: Dict[str, int]) -> None:
+	title = _elementTitle(elem)
+	_addAnchor(elem, kind, number, title)
+	sections.append((elem, number, title))
+	subsection = 0
+	for child in elem.childNodes:
+		if child.nodeType != Node.ELEMENT_NODE:
+			continue
+		if child.nodeName in ('section', 'references'):
+			if number is None or child.getAttribute('numbered') == 'false':
+				_indexSection(child, None, kind, counters)
+			else:
+				subsection += 1
+				_indexSection(child, number + '.' + str(subsection), kind, counters)
+		else:
+			_indexElement(child, number, kind, title, counters)
+
+def _indexElement(elem: xml.dom.minidom.Element, number: Optional[str], kind: str, title: Optional[str], counters: Dict[str, int]) -> None:
+	if elem.nodeName == 'figure':
+		counters['figure'] += 1
+		_addAnchor(elem, 'figure', str(counters['figure']), _elementTitle(elem))
+	elif elem.nodeName in ('table', 'texttable'):
+		counters['table'] += 1
+		_addAnchor(elem, 'table', str(counters['table']), _elementTitle(elem))
+	elif elem.nodeName in ('reference', 'referencegroup'):
+		titles = elem.getElementsByTagName('title')
+		referenceTitle = None
+		if titles.length > 0:
+			referenceTitle = ' '.join(''.join(text.nodeValue for text in titles[0].childNodes if text.nodeType == Node.TEXT_NODE).split())
+		_addAnchor(elem, 'reference', None, referenceTitle)
+		if elem.nodeName == 'reference':
+			return
+	elif elem.nodeName in ('artwork', 'sourcecode'):
+		return
+	else:  # Any other anchored element (paragraph, list item, ...) refers to its section
+		_addAnchor(elem, kind, number, title)
+	for child in elem.childNodes:
+		if child.nodeType == Node.ELEMENT_NODE:
+			_indexElement(child, number, kind, title, counters)
+
+def indexAnchors(middle: xml.dom.minidom.Element, back: xml.dom.minidom.Element) -> None:
+	# Single pass over the document so that parseXref() resolves any target with one dictionary lookup
+	# Numbering as in xml2rfc: middle sections then references are 1, 2, ..., appendices are A, B, ...
+	anchors.clear()
+	sections.clear()
+	counters = {'figure': 0, 'table': 0}
+	topLevel = 0
+	appendix = 0
+	for container in (middle, back):
+		for child in container.childNodes:
+			if child.nodeType != Node.ELEMENT_NODE:
+				continue
+			if child.nodeName == 'section' and container is back:
+				appendix += 1
+				letters = ''
+				index = appendix
+				while index > 0:  # A..Z, AA, AB...
+					index, remainder = divmod(index - 1, 26)
+					letters = chr(ord('A') + remainder) + letters
+				_indexSection(child, letters, 'appendix', counters)
+			elif child.nodeName in ('section', 'references'):
+				if child.getAttribute('numbered') == 'false':
+					_indexSection(child, None, 'section', counters)
+				else:
+					topLevel += 1
+					_indexSection(child, str(topLevel), 'section', counters)
+			else:
+				_indexElement(child, None, 'section', None, counters)
+
+def selectSections(selectors: List[str]) -> List[xml.dom.minidom.Element]:
+	# The sections matching an anchor, a number ('3.2', 'B') or a title (case insensitive) in document order,
+	# a section inside another selected one is rendered with its parent
+	selected = set()
+	for selector in selectors:
+		wanted = selector.strip()
+		matches = [elem for elem, number, title in sections if elem.getAttribute('anchor') == wanted or
+			(number is not None and number == wanted.rstrip('.')) or (title is not None and title.casefold() == wanted.casefold())]
+		if not matches:
+			logger.warning('No section matches %s', selector)
+		selected.update(id(elem) for elem in matches)
+	result = []
+	for elem, number, title in sections:
+		if id(elem) not in selected:
+			continue
+		parent = elem.parentNode
+		while parent is not None and id(parent) not in selected:
+			parent = parent.parentNode
+		if parent is None:
+			result.append(elem)
+	return result
+
+def _renderSection(elem: xml.dom.minidom.Element, rendered: Set[int]) -> None:
+	# A selected section gets the same heading level as when the whole document is converted, after the headings
+	# of the sections enclosing it, written once for all their selected subsections (ids in rendered)
+	enclosing = []
+	parent = elem
+	while parent.nodeName in ('section', 'references'):
+		enclosing.insert(0, parent)
+		parent = parent.parentNode
+	writer.inMiddle = (parent.nodeName == 'middle')
+	for level, section in enumerate(enclosing, 1):
+		offset = 0 if writer.inMiddle or section.nodeName == 'references' else 1  # See parseBack()
+		if section is elem:
+			if elem.nodeName == 'references':
+				parseReferences(elem, level)
+			else:
+				parseSection(elem, level + offset)
+		elif id(section) not in rendered:
+			rendered.add(id(section))
+			parseSectionHeading(section, level + offset)
+
+mmapThreshold = 4 * 1024 * 1024  # Local files larger than this are memory-mapped rather than read
+
+def openInput(source: Union[str, io.IOBase]) -> io.IOBase:
+	# Returns a binary stream for a file name, '-' for stdin or an already open binary stream
+	# gzip and xz inputs are decompressed on the fly while minidom/expat reads the stream chunk by chunk
+	import gzip, lzma, mmap
+	if source == '-':
+		stream = sys.stdin.buffer
+	elif hasattr(source, 'read'):
+		stream = source
+	elif source.endswith('.gz'):
+		return gzip.open(source, 'rb')
+	elif source.endswith('.xz'):
+		return lzma.open(source, 'rb')
+	elif os.path.getsize(source) >= mmapThreshold:
+		with open(source, 'rb') as f:  # The mapping stays valid after closing the file
+			return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+	else:
+		return open(source, 'rb')
+	# For streams, there is no file name extension, so let's look at the magic numbers
+	if hasattr(stream, 'peek'):
+		magic = stream.peek(6)[0:6]
+	elif hasattr(stream, 'seekable') and stream.seekable():
+		position = stream.tell()
+		magic = stream.read(6)
+		stream.seek(position)
+	else:
+		return stream
+	if magic[0:2] == b'\x1f\x8b':
+		return gzip.GzipFile(fileobj = stream, mode = 'rb')
+	if magic == b'\xfd7zXZ\x00':
+		return lzma.LZMAFile(stream, mode = 'rb')
+	return stream
+
+def _fragmentXML(elem: xml.dom.minidom.Element, context: str) -> str:
+	# A single <middle> or <back> child wrapped into its own container, with the namespaces declared on <rfc>
+	rfc = elem.ownerDocument.documentElement
+	namespaces = ''
+	for i in range(rfc.attributes.length):
+		attrib = rfc.attributes.item(i)
+		if attrib.name.startswith('xmlns'):
+			namespaces += ' ' + attrib.name + '="' + attrib.value + '"'
+	return '<' + context + namespaces + '>' + elem.toxml() + '</' + context + '>'
+
+def _renderContainer(container: xml.dom.minidom.Element, context: str) -> None:
+	# Same processing as for the whole <middle> or <back>
+	writer.inMiddle = (context == 'middle')
+	if context == 'middle':
+		parseSection(container, 0)
+	else:
+		parseBack(container)
+
+def _setAnchors(documentAnchors: Dict[str, anchorTarget]) -> None:
+	# Worker initializer, the index is built once by the main process
+	anchors.update(documentAnchors)
+
+def _renderFragment(writerClass: type, context: str, fragmentXML: str) -> Dict[str, Any]:
+	# Runs in a worker process with its own writer
+	global writer
+
+	writer = writerClass()
+	writer.anchors = anchors
+	writer.startFragment()
+	_renderContainer(minidom.parseString(fragmentXML).documentElement, context)
+	return writer.getFragment()
+
+def renderParallel(middle: xml.dom.minidom.Element, back: xml.dom.minidom.Element, jobs: int) -> None:
+	# Every top-level child of <middle> and <back> is rendered on its own by a pool of processes,
+	# the fragments are then merged in document order (including the figure numbers) by the global writer
+	import concurrent.futures
+
+	fragments = []
+	for container, context in ((middle, 'middle'), (back, 'back')):
+		for child in container.childNodes:
+			if child.nodeType == Node.ELEMENT_NODE:
+				fragments.append((context, _fragmentXML(child, context)))
+	with concurrent.futures.ProcessPoolExecutor(max_workers = jobs, initializer = _setAnchors, initargs = (anchors,)) as pool:
+		futures = [pool.submit(_renderFragment, type(writer), context, fragmentXML) for context, fragmentXML in fragments]
+		for (context, fragmentXML), future in zip(fragments, futures):
+			writer.inMiddle = (context == 'middle')
+			if conversionBudget is not None:
+				try:
+					conversionBudget.checkDeadline()
+				except budgetExceeded:
+					pool.shutdown(wait = False, cancel_futures = True)
+					raise
+			try:
+				fragment = future.result()
+			except Exception as err:
+				logger.warning('Cannot render a %s section in parallel, rendering it serially: %s', context, err)
+				_renderContainer(minidom.parseString(fragmentXML).documentElement, context)
+				continue
+			writer.addFragment(fragment)
+
+def processXML(inFilename: Union[str, io.IOBase], outFilename: str = 'xml2docx.xml', jobs: int = 1,
+		selectors: Optional[List[str]] = None) -> None:
+	# With selectors (see selectSections()), only the front and the selected sections are converted,
+	# and only the documents included by them are fetched. Nothing is included for a writer without resolvesIncludes
 	global xmldoc
 	global docxRoot, docxBody, docxDocument
 	
-	if os.path.isfile(inFilename):
-		xmldoc = minidom.parse(inFilename)
+	if inFilename == '-' or hasattr(inFilename, 'read') or os.path.isfile(inFilename):
+		base = xmlInclude.baseOf(inFilename) if isinstance(inFilename, str) and inFilename != '-' else None
+		stream = openInput(inFilename)
+		xmldoc = parseXML(stream, base, deferEntities = bool(selectors) or not writer.resolvesIncludes)
+		if stream is not sys.stdin.buffer and stream is not inFilename:  # Do not close the caller streams
+			stream.close()
 	else:
 		try:
 			url = 'https://datatracker.ietf.org/doc/id/' + inFilename + '.xml'
-			response = urllib.request.urlopen(url)
-		except:
-			print("Cannot fetch the XML document from the IETF site: " + url)
+			draftString = fetchURL(url)
+		except budgetExceeded:
+			raise
+		except OSError as err:
+			logger.error('Cannot fetch the XML document from the IETF site: %s, error: %s', url, err)
 			sys.exit(1)
-		draftString = response.read()
-		xmldoc = minidom.parseString(draftString)
-		print("Fetching the draft from the IETF site, " + url)
+		xmldoc = parseXMLString(draftString, url, deferEntities = bool(selectors) or not writer.resolvesIncludes)
+		base = url
+		logger.info('Fetching the draft from the IETF site, %s', url)
 		
+	if selectors:
+		rfc = xmldoc.documentElement
+		front = rfc.getElementsByTagName('front')[0]
+		middle = rfc.getElementsByTagName('middle')[0]
+		back = rfc.getElementsByTagName('back')[0]
+		indexAnchors(middle, back)  # For the numbers and titles of the selectors
+		selected = selectSections(selectors)
+		if writer.resolvesIncludes:
+			xmlInclude.resolveIncludes(xmldoc, base, fetchAll, parseXMLString, includeURL, [front] + selected)
+		indexAnchors(middle, back)  # Now with the included references
+		writer.anchors = anchors
+		parseRfc(rfc)
+		parseSection(front, 0)
+		rendered = set()
+		for elem in selected:
+			_renderSection(elem, rendered)
+		writer.inMiddle = False
+		return
+
+	if writer.resolvesIncludes:
+		xmlInclude.resolveIncludes(xmldoc, base, fetchAll, parseXMLString, includeURL)
 	rfc = xmldoc.getElementsByTagName('rfc')[0]
 
 	front = rfc.getElementsByTagName('front')[0]
@@ -899,79 +1223,361 @@ def processXML(inFilename: str, outFilename: str = 'xml2docx.xml') -> None:
 	back = rfc.getElementsByTagName('back')[0]
 
 
+	indexAnchors(middle, back)
+	writer.anchors = anchors
 	parseRfc(rfc)
 	parseSection(front, 0)
+	if jobs > 1:
+		renderParallel(middle, back, jobs)
+		writer.inMiddle = False
+		return
 	writer.inMiddle = True
 	parseSection(middle, 0)
 	writer.inMiddle = False
 	parseBack(back)
+	if writer.memoryBudget is not None:  # The source tree is no more needed, let's free it before the writer saves
+		xmldoc.unlink()
+		xmldoc = None
 
-def myParseDate(s: str) -> datetime.datetime:
+def peakMemory() -> Optional[int]:
+	# Peak resident set size of this process in bytes, None when unknown (e.g., on Windows)
 	try:
-		# Let's first try with short month names
-		date = datetime.datetime.strptime(s,'%d %b %Y')
-	except ValueError:
-		# Then try with full length month names
+		import resource
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports kilobytes
+
+def _recordConversion(outputFormat: str, start: float, inputSize: Optional[int], failed: bool) -> None:
+	# Only once the metrics module is loaded, by jobServer.py or for --metrics, the other runs do not pay for it
+	metrics = sys.modules.get('metrics')
+	if metrics is None:
+		return
+	metrics.conversionSeconds.observe(time.perf_counter() - start, outputFormat)
+	metrics.conversions.inc(outputFormat, 'failed' if failed else 'ok')
+	if inputSize is not None:
+		metrics.inputBytes.observe(inputSize)
+
+convertLock = _thread.allocate_lock()  # threading.Lock() without importing threading. The parse functions share the global writer, so one conversion at a time per process (jobServer.py runs a pool of processes)
+
+def convert(source: Union[bytes, io.IOBase],
+		outputFormat: str = 'docx',
+		output: Optional[io.IOBase] = None,
+		templateDirectory: Optional[str] = None,
+		log: Optional[io.IOBase] = None,
+		jobs: int = 1,
+		memoryBudget: Optional[int] = None,
+		budget: Optional[resourceBudget] = None,
+		reproducible: bool = False,
+		sections: Optional[List[str]] = None) -> Optional[bytes]:
+	# Library entry point: converts the XML (bytes or binary stream, possibly gzip/xz compressed) into
+	# 'docx', 'md' or 'stats' (JSON report of the metadata and statistics) without any file or stdout output.
+	# Returns the result as bytes, or None when it is written into the binary output stream.
+	# templateDirectory is a directory or a name registered in templateRegistry, both kept in memory once loaded.
+	# The progress and warning messages go to the 'xml2docx' logger and, during this call only, to the log text
+	# stream if any. sys.stdout is left alone, so other threads keep their own output.
+	# With jobs > 1, the sections are rendered by that many processes.
+	# With a memoryBudget (bytes), the writers spool their pending output to temporary files.
+	# With a budget, a conversion going over one of its limits raises budgetExceeded.
+	# With reproducible, the same source always gives the same bytes.
+	# With sections (anchors, titles or numbers), only the front and those sections are converted.
+	global writer, conversionBudget
+
+	if outputFormat == 'docx':
+		import docxWriter
+		thisWriter = docxWriter.docxWriter()
+		thisWriter.templateDirectory = templateDirectory
+	elif outputFormat == 'md':
+		import mdWriter
+		thisWriter = mdWriter.mdWriter()
+	elif outputFormat == 'stats':
+		import statsWriter
+		thisWriter = statsWriter.statsWriter()
+	else:
+		raise ValueError('Unsupported output format: ' + outputFormat)
+	thisWriter.memoryBudget = memoryBudget
+	thisWriter.reproducible = reproducible
+	inputSize = None  # Unknown for a stream
+	if isinstance(source, (bytes, bytearray, memoryview)):
+		inputSize = len(source)
+		source = io.BytesIO(source)
+	result = io.BytesIO() if output is None else output
+	logHandler = None
+	if log is not None:
+		import logging
+		logHandler = logging.StreamHandler(log)
+		logHandler.setFormatter(logging.Formatter('%(message)s'))
+	with convertLock:
+		writer = thisWriter
+		conversionBudget = budget
+		if budget is not None:
+			budget.start()
+		if logHandler is not None:
+			level = logger.level
+			logger.addHandler(logHandler)
+			if logger.getEffectiveLevel() > logging.INFO:  # The progress messages are wanted as well
+				logger.setLevel(logging.INFO)
+		start = time.perf_counter()
+		failed = True
 		try:
-			date = datetime.datetime.strptime(s,'%d %B %Y')
-		except ValueError:
-			date = datetime.datetime.utcnow()  # Giving up...
-	return date
-	
-if __name__ == '__main__':
+			processXML(source, jobs = jobs, selectors = sections)
+			writer.save(result)
+			failed = False
+		finally:
+			writer = None
+			conversionBudget = None
+			if logHandler is not None:
+				logger.removeHandler(logHandler)
+				logger.setLevel(level)
+			_recordConversion(outputFormat, start, inputSize, failed)
+	if output is None:
+		return result.getvalue()
+	return None
+
+def convertFile(inFilename: str, outFilename: str, docxFilename: Optional[str], mdFilename: Optional[str],
+		templateDirectory: Optional[str], openXMLFilename: Optional[str], jobs: int = 1,
+		memoryBudget: Optional[int] = None, previousFilename: Optional[str] = None,
+		budget: Optional[resourceBudget] = None, reproducible: bool = False,
+		outputStream: Optional[io.IOBase] = None, selectors: Optional[List[str]] = None,
+		statsFilename: Optional[str] = None) -> None:
+	# One conversion as requested on the command line, repeated by --watch after every change of the input
+	# With an outputStream (stdout for '-'), the result is only written there, without any other file
+	global writer, conversionBudget
+
+	conversionBudget = budget
+	if budget is not None:
+		budget.start()
+
+	if docxFilename is not None:
+		import docxWriter
+		outputFormat = 'docx'
+		writer = docxWriter.docxWriter(docxFilename)
+		writer.templateDirectory = templateDirectory
+		writer.openXML = openXMLFilename  # None means the default one in the template directory
+	elif mdFilename is not None:
+		import mdWriter
+		outputFormat = 'md'
+		writer = mdWriter.mdWriter(mdFilename)
+	elif statsFilename is not None:
+		import statsWriter
+		outputFormat = 'stats'
+		writer = statsWriter.statsWriter(statsFilename)
+	else:
+		logger.error('Neither docx nor markdown output file specified')
+		sys.exit(2)
+	writer.memoryBudget = memoryBudget
+	writer.reproducible = reproducible
+
+	start = time.perf_counter()
+	failed = True
+	try:
+		if previousFilename is not None:
+			# Both revisions are needed as a DOM, so no parallel rendering, spooling nor interned properties
+			jobs = 1
+			writer.memoryBudget = None
+			writer.sharedProperties = False
+			thisWriter = writer
+			writer = docxWriter.docxWriter()
+			writer.sharedProperties = False
+			processXML(previousFilename, outFilename, 1, selectors)
+			previousWriter = writer
+			writer = thisWriter
+
+		# Let's generate the openXML word processing 'document.xml' file
+		processXML(inFilename, outFilename, jobs, selectors)
+		if previousFilename is not None:
+			import docxDiff
+			docxDiff.markChanges(previousWriter, writer)
+
+		# Now, let's generate the .DOCX file
+		if outputStream is None:
+			writer.save()
+		else:  # Each zip entry is written as soon as it is compressed, no seek needed
+			writer.save(outputStream)
+			outputStream.flush()
+		failed = False
+	finally:
+		_recordConversion(outputFormat, start, os.path.getsize(inFilename) if os.path.isfile(inFilename) else None, failed)
+	if memoryBudget is not None and peakMemory() is not None:
+		logger.info(f'Peak RSS: {peakMemory() / 1024 / 1024:.1f} MB (budget {memoryBudget / 1024 / 1024:.0f} MB)')
+
+def analyseBatch(inFilenames: List[str], statsFilename: str, budget: Optional[resourceBudget] = None) -> None:
+	# Statistics of many drafts in a single process, one JSON report per line (JSON Lines) with the
+	# input file or draft name as 'source', a draft that cannot be analysed gets an 'error' instead
+	global writer, conversionBudget
+	import json, statsWriter
+
+	output = sys.stdout if statsFilename == '-' else open(statsFilename, 'w', encoding='utf-8')
+	try:
+		for inFilename in inFilenames:
+			writer = statsWriter.statsWriter()
+			conversionBudget = budget
+			if budget is not None:
+				budget.start()
+			try:
+				processXML(inFilename)
+				report = writer.report()
+			except SystemExit:  # processXML() exits when a draft cannot be fetched
+				report = {'error': 'cannot fetch the draft'}
+			except Exception as err:
+				report = {'error': str(err)}
+			output.write(json.dumps(dict(source = inFilename, **report)) + '\n')
+			output.flush()
+	finally:
+		writer = None
+		conversionBudget = None
+		if output is not sys.stdout:
+			output.close()
+
+def main(argv: List[str]) -> None:
+	global localIncludes
+	import getopt, logging
+
 	inFilename = None 
 	outFilename = None
 	templateDirectory = None
 	docxFilename = None
 	mdFilename = None
+	openXMLFilename = None
+	jobs = 1
+	memoryBudget = None
+	previousFilename = None
+	watch = False
+	budget = None
+	reproducible = 'SOURCE_DATE_EPOCH' in os.environ
+	selectors = None
+	statsFilename = None
+	metricsFilename = None
+	noLocalIncludes = False
 	try:
-		opts, args = getopt.getopt(sys.argv[1:],"d:hi:m:o:t:",["ifile=","ofile=","template=", "docx=", "md="])
+		opts, args = getopt.getopt(argv,"d:hi:j:m:o:t:",["ifile=","ofile=","template=", "docx=", "md=", "cache=", "offline", "jobs=", "memory=", "diff=", "watch", "budget=", "reproducible", "sections=", "stats=", "metrics=", "timeouts=", "no-local-includes"])
 	except getopt.GetoptError:
-		print('xml2docx.py -i <inputfile/draft-name> [-o <outputXMLfile>] [--docx <result.docx>] [--md <markdown.md')
+		print('xml2docx.py -i <inputfile/draft-name/-> [-o <outputXMLfile>] [--docx <result.docx/->] [--md <markdown.md/->] [--cache <directory>] [--offline] [--jobs <processes>] [--memory <MB>] [--diff <previous inputfile/draft-name>] [--watch] [--budget input=<bytes>,elements=<count>,depth=<count>,fetches=<count>,deadline=<seconds>] [--reproducible] [--sections <anchor/title/number>,...] [--stats <report.json/-> [more inputfiles/draft-names]] [--metrics <metrics.prom>] [--timeouts connect=<seconds>,read=<seconds>,retries=<count>,<host>=<connect>/<read>] [--no-local-includes]')
 		sys.exit(2)
 	for opt, arg in opts:
 		if opt == '-h':
-			print('xml2docx.py -i <inputfile/draft-name> [-o <outputXMLfile>] [--docx <result.docx>] [--md <markdown.md]')
+			print('xml2docx.py -i <inputfile/draft-name/-> [-o <outputXMLfile>] [--docx <result.docx/->] [--md <markdown.md/->] [--cache <directory>] [--offline] [--jobs <processes>] [--memory <MB>] [--diff <previous inputfile/draft-name>] [--watch] [--budget input=<bytes>,elements=<count>,depth=<count>,fetches=<count>,deadline=<seconds>] [--reproducible] [--sections <anchor/title/number>,...] [--stats <report.json/-> [more inputfiles/draft-names]] [--metrics <metrics.prom>] [--timeouts connect=<seconds>,read=<seconds>,retries=<count>,<host>=<connect>/<read>] [--no-local-includes]')
 			sys.exit()
 		elif opt in ("-i", "--ifile"):
 			inFilename = arg
 		elif opt in ("-o", "--ofile"):
 			outFilename = arg
+			openXMLFilename = arg
 		elif opt in ("-t", "--template"):
 			templateDirectory = arg
 		elif opt in ("-d", "--docx"):
 			docxFilename = arg
 		elif opt in ("-m", "--md"):
 			mdFilename = arg	
+		elif opt in ("-j", "--jobs"):  # Render the sections of very large documents in parallel
+			jobs = int(arg)
+		elif opt == "--memory":  # Budget for the converted output kept in memory, the rest is spooled to disk
+			memoryBudget = int(arg) * 1024 * 1024
+		elif opt == "--diff":  # Previous revision of the draft, the changes are shown as tracked changes
+			previousFilename = arg
+		elif opt == "--watch":  # Convert again whenever the input file changes, until interrupted
+			watch = True
+		elif opt == "--budget":  # Limits of the conversion, e.g., input=8M,elements=100000,depth=64,fetches=50,deadline=60
+			try:
+				budget = resourceBudget.fromString(arg)
+			except ValueError as err:
+				print('Invalid --budget: ', err)
+				sys.exit(2)
+		elif opt == "--reproducible":  # Same output bytes for the same input, dated by the draft or SOURCE_DATE_EPOCH
+			reproducible = True
+		elif opt == "--sections":  # Only the front and these sections, e.g., --sections "sec-security,Security Considerations,3.2,A"
+			selectors = [selector for selector in arg.split(',') if selector.strip() != '']
+		elif opt == "--stats":  # Only the metadata and statistics as JSON, see statsWriter.py
+			statsFilename = arg
+		elif opt == "--metrics":  # Prometheus metrics of all the runs, for the textfile collector of the node exporter
+			metricsFilename = arg
+		elif opt == "--cache":  # Where fetched drafts and references are kept, '' to disable the cache
+			import urlCache
+			urlCache.cacheDirectory = arg if arg != '' else None
+		elif opt == "--offline":  # Only use the drafts and references already in the cache
+			import urlCache
+			urlCache.offline = True
+		elif opt == "--timeouts":  # Of the fetches, e.g., connect=5,read=20,retries=1,xml2rfc.ietf.org=3/10
+			import urlCache
+			try:
+				urlCache.setTimeouts(arg)
+			except ValueError as err:
+				print('Invalid --timeouts: ', err)
+				sys.exit(2)
+		elif opt == "--no-local-includes":  # For uploaded drafts (e.g., process.php), they must not read the server files
+			noLocalIncludes = True
+	# The user running a local draft can read the files anyway, but a draft on stdin may come from anybody
+	inFilenames = ([inFilename] if inFilename is not None else []) + (args if statsFilename is not None else [])
+	localIncludes = not noLocalIncludes and len(inFilenames) > 0 and all(name != '-' and os.path.isfile(name) for name in inFilenames)
+	if statsFilename is not None and args:  # Batch analysis, e.g., of all the active drafts
+		analyseBatch(([inFilename] if inFilename is not None else []) + args, statsFilename, budget)
+		return
 	if inFilename is None:
 		print('Missing input filename')
 		sys.exit(2)
 
-	if outFilename is None and mdFilename is None:
-		if docxFilename is not None:
+	if outFilename is None and mdFilename is None and statsFilename is None:
+		if docxFilename is not None and templateDirectory is not None:
 			outFilename = templateDirectory + '/word/document.xml'
 		else:
 			outFilename = 'xml2docx.xml'
 
 	# OpenXML docx is the preferred output format when no output file is specified
-	if docxFilename is None and mdFilename is None:
-		if inFilename[-4:] == '.xml':
+	if docxFilename is None and mdFilename is None and statsFilename is None:
+		if inFilename == '-':
+			docxFilename = 'xml2docx.docx'
+		elif inFilename[-7:] in ('.xml.gz', '.xml.xz'):
+			docxFilename = inFilename[:-7] + '.docx'
+		elif inFilename[-4:] == '.xml':
 			docxFilename = inFilename.replace('.xml', '.docx')
 		else:
 			docxFilename = inFilename + '.docx'
-	if docxFilename is not None:
-		import docxWriter
-		writer = docxWriter.docxWriter(docxFilename)
-		writer.templateDirectory = templateDirectory
-	elif mdFilename is not None:
-		import mdWriter
-		writer = mdWriter.mdWriter(mdFilename)
-	else:
-		print('Neither docx nor markdown output file specified')
+	if previousFilename is not None and docxFilename is None:
+		print('Tracked changes are only available for the docx output')
 		sys.exit(2)
+	outputStream = None
+	if (docxFilename or mdFilename or statsFilename) == '-':
+		if watch:
+			print('--watch cannot write to the standard output')
+			sys.exit(2)
+		outputStream = sys.stdout.buffer
+	arguments = (inFilename, outFilename, docxFilename, mdFilename, templateDirectory, openXMLFilename, jobs, memoryBudget, previousFilename, budget, reproducible, outputStream, selectors, statsFilename)
+	# When the result goes to stdout, the messages go to stderr
+	logging.basicConfig(format = '%(message)s', level = logging.INFO, stream = sys.stderr if outputStream is not None else sys.stdout)
+	if metricsFilename is not None:
+		import metrics  # Before the first conversion, so that _recordConversion() counts it
+	if not watch:
+		try:
+			convertFile(*arguments)
+		except budgetExceeded as err:
+			logger.error('Conversion aborted: %s', err)
+			sys.exit(3)
+		finally:
+			if metricsFilename is not None:
+				import metrics
+				metrics.addToFile(metricsFilename)
+		return
 
-	# Let's generate the openXML word processing 'document.xml' file
-	processXML(inFilename, outFilename)
+	# Watch mode: the process, the templates and the fetched references stay in memory between two conversions
+	if inFilename == '-' or not os.path.isfile(inFilename):
+		print('--watch needs a local input file')
+		sys.exit(2)
+	import fileWatcher, time
+	watcher = fileWatcher.newWatcher(inFilename)
+	try:
+		while True:
+			start = time.perf_counter()
+			try:
+				convertFile(*arguments)
+				print(f'Rebuilt {docxFilename or mdFilename or statsFilename} in {(time.perf_counter() - start) * 1000:.0f} ms, watching {inFilename} ({watcher.method})')
+			except Exception as err:  # Most probably the draft being edited is not yet valid XML
+				print('Cannot convert ' + inFilename + ': ', err)
+			if metricsFilename is not None:
+				import metrics
+				metrics.addToFile(metricsFilename)
+			watcher.waitForChange()
+	except KeyboardInterrupt:
+		print('Stopped watching ' + inFilename)
 
-	# Now, let's generate the .DOCX file
-	writer.save()
\ No newline at end of file
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,213 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# The three ways a draft pulls in other documents, all resolved before the walk of the tree:
+#	<!ENTITY rfc2119 SYSTEM "https://.../reference.RFC.2119.xml"> then &rfc2119;
+#		The entities are all fetched at once when expat reaches the root element (the DTD is then complete)
+#		and their content is parsed in place, see https://www.w3schools.com/xml/xml_dtd_entities.asp
+#	<xi:include href="https://bib.ietf.org/public/rfc/bibxml/reference.RFC.2119.xml"/>
+#		See https://www.w3.org/TR/xinclude/ (only href, parse="xml|text" and xi:fallback, no xpointer)
+#	<?rfc include='reference.RFC.2119'?>
+# The targets of each round are fetched concurrently by the fetchAll function given by xml2docx.
+
+import os
+import xml.parsers.expat
+from xml.dom import minidom, Node, expatbuilder
+from typing import Optional, List, Dict, Union, Callable
+
+from resourceBudget import budgetedBuilder, resourceBudget, budgetExceeded
+from lazyLogging import lazyLogger
+
+logger = lazyLogger('xml2docx.xmlInclude')
+
+XINCLUDE = 'http://www.w3.org/2001/XInclude'
+deferredEntity = 'xml2docx-entity'  # Target of the processing instruction left in place of a deferred external entity
+maxNesting = 10  # Rounds of xi:include inside included documents, a cycle is rejected before
+
+def absolute(base: Optional[str], href: str) -> str:
+	# base is a URL, a directory or None (current directory)
+	if '://' in href:
+		return href
+	if base is not None and '://' in base:
+		import urllib.parse  # Only for a fetched document, the local drafts do not pay for it
+		return urllib.parse.urljoin(base, href)
+	return os.path.normpath(os.path.join(base if base is not None else os.getcwd(), href))
+
+def baseOf(location: str) -> str:
+	# The base for the relative references of a document at location (URL or file name)
+	if '://' in location:
+		return location
+	return os.path.dirname(os.path.abspath(location))
+
+class entityResolver:
+	# Added to a minidom builder to replace the references to external entities by their parsed content
+
+	def setResolver(self, fetchAll: Callable[[List[str]], Dict[str, Union[bytes, Exception]]], base: Optional[str], deferEntities: bool = False) -> None:
+		# With deferEntities, the references are kept as processing instructions for resolveIncludes()
+		self.deferEntities = deferEntities
+		self.fetchAll = fetchAll
+		self.base = base
+		self.systemIds = []  # Of the external entities, in declaration order
+		self.entities = {}  # Fetched content (or exception) by system id
+
+	def entity_decl_handler(self, entityName, is_parameter_entity, value, base, systemId, publicId, notationName):
+		if systemId is not None and value is None and notationName is None and not is_parameter_entity:
+			self.systemIds.append(absolute(self.base, systemId))
+		return super().entity_decl_handler(entityName, is_parameter_entity, value, base, systemId, publicId, notationName)
+
+	def first_element_handler(self, name, attributes):
+		# The DTD is over, let's fetch all the external entities at once
+		if self.systemIds and not self.deferEntities:
+			logger.info('Fetching %d external entities', len(self.systemIds))
+			self.entities = self.fetchAll(self.systemIds)
+		return super().first_element_handler(name, attributes)
+
+	def external_entity_ref_handler(self, context, base, systemId, publicId):
+		systemId = absolute(self.base, systemId)
+		if self.deferEntities:
+			self.curNode.appendChild(self.document.createProcessingInstruction(deferredEntity, systemId))
+			return 1
+		content = self.entities.get(systemId)
+		if content is None or isinstance(content, Exception):
+			logger.warning('Cannot include the external entity %s: %s', systemId, content)
+			return 1
+		content = _withoutDeclaration(content)
+		# A parser for the entity sharing the handlers, so its nodes are added where the entity is referenced
+		parser = self._parser.ExternalEntityParserCreate(context)
+		try:
+			parser.Parse(content, True)
+		except xml.parsers.expat.ExpatError as err:
+			logger.warning('Invalid XML in the external entity %s: %s', systemId, err)
+		return 1
+
+class resolvingBuilder(entityResolver, expatbuilder.ExpatBuilderNS):
+	pass
+
+class budgetedResolvingBuilder(entityResolver, budgetedBuilder):
+	pass
+
+def newBuilder(budget: Optional[resourceBudget], fetchAll: Callable[[List[str]], Dict[str, Union[bytes, Exception]]],
+		base: Optional[str], deferEntities: bool = False) -> expatbuilder.ExpatBuilderNS:
+	# Without any budget, there is no need to count anything while parsing
+	builder = resolvingBuilder() if budget is None else budgetedResolvingBuilder(budget)
+	builder.setResolver(fetchAll, base, deferEntities)
+	return builder
+
+def _withoutDeclaration(content: bytes) -> bytes:
+	if content.startswith(b'<?xml'):  # Only a text declaration with an encoding is allowed in an entity
+		end = content.find(b'?>')
+		if b'encoding' not in content[0:end]:
+			content = content[end + 2:]
+	return content
+
+def _deferredEntities(node: minidom.Node) -> List[minidom.ProcessingInstruction]:
+	found = []
+	for child in node.childNodes:
+		if child.nodeType == Node.PROCESSING_INSTRUCTION_NODE and child.target == deferredEntity:
+			found.append(child)
+		elif child.nodeType == Node.ELEMENT_NODE:
+			found.extend(_deferredEntities(child))
+	return found
+
+def _fallback(include: minidom.Element) -> List[minidom.Node]:
+	for child in include.childNodes:
+		if child.namespaceURI == XINCLUDE and child.localName == 'fallback':
+			return list(child.childNodes)
+	return []
+
+def resolveIncludes(document: minidom.Document, base: Optional[str],
+		fetchAll: Callable[[List[str]], Dict[str, Union[bytes, Exception]]],
+		parseString: Callable[[bytes, str], minidom.Document],
+		includeURL: Callable[[str], Optional[str]],
+		roots: Optional[List[minidom.Element]] = None) -> None:
+	# Replaces every xi:include, <?rfc include?> and deferred entity by the document it points to
+	# parseString(content, location) parses a fetched document, includeURL(name) gives the URL of <?rfc include='name'?>
+	# Only the subtrees in roots (default: the whole document) are resolved, the deferred entities only exist then:
+	# those outside roots are removed, they are never fetched
+	includeBase = {}  # (base, locations from the document) of the included subtrees, for their own relative xi:include and the cycles
+	if roots is None:
+		roots = [document.documentElement]
+		deferred = []
+	else:
+		deferred = [(node, node.data, ()) for root in roots for node in _deferredEntities(root)]
+		kept = {id(node) for node, location, chain in deferred}
+		for node in _deferredEntities(document.documentElement):
+			if id(node) not in kept:
+				node.parentNode.removeChild(node)
+	for nesting in range(maxNesting):
+		targets = []  # (node, location, locations of the documents including it)
+		includes = [include for root in roots for include in root.getElementsByTagNameNS(XINCLUDE, 'include')]
+		for include in includes:
+			nodeBase, chain = base, ()
+			parent = include
+			while parent is not None:
+				if id(parent) in includeBase:
+					nodeBase, chain = includeBase[id(parent)]
+					break
+				parent = parent.parentNode
+			location = absolute(nodeBase, include.getAttribute('href'))
+			if location in chain:  # Would be included again and again
+				logger.warning('Include cycle rejected: %s', ' -> '.join(chain + (location,)))
+				for replacement in _fallback(include):
+					include.parentNode.insertBefore(replacement, include)
+				include.parentNode.removeChild(include)
+				continue
+			targets.append((include, location, chain))
+		if nesting == 0:
+			targets.extend(deferred)
+			for references in [references for root in roots for references in ([root] if root.nodeName == 'references' else []) + root.getElementsByTagName('references')]:
+				for child in references.childNodes:
+					if child.nodeType == Node.PROCESSING_INSTRUCTION_NODE and child.target == 'rfc' and child.data[0:9] in ("include='", 'include="'):
+						url = includeURL(child.data[9:-1])
+						if url is not None:
+							targets.append((child, url, ()))
+		if not targets:
+			return
+		logger.info('Fetching %d included documents', len(targets))
+		contents = fetchAll([location for node, location, chain in targets])
+		for node, location, chain in targets:
+			content = contents[location]
+			parent = node.parentNode
+			if isinstance(content, Exception):
+				logger.warning('Cannot include %s: %s', location, content)
+				replacements = _fallback(node) if node.nodeType == Node.ELEMENT_NODE else []
+			elif node.nodeType == Node.ELEMENT_NODE and node.getAttribute('parse') == 'text':
+				replacements = [document.createTextNode(content.decode(node.getAttribute('encoding') or 'utf-8'))]
+			elif node.nodeType == Node.PROCESSING_INSTRUCTION_NODE and node.target == deferredEntity:
+				try:  # An entity is not a document, it may be made of several nodes
+					entity = parseString(b'<entity>' + _withoutDeclaration(content) + b'</entity>', location).documentElement
+				except budgetExceeded:
+					raise
+				except Exception as err:
+					logger.warning('Invalid XML in the external entity %s: %s', location, err)
+					replacements = []
+				else:
+					replacements = [document.importNode(child, True) for child in entity.childNodes]
+			else:
+				try:
+					included = parseString(content, location).documentElement
+					if node.nodeType == Node.PROCESSING_INSTRUCTION_NODE and included.nodeName != 'reference':
+						included = included.getElementsByTagName('reference')[0]
+				except budgetExceeded:
+					raise
+				except Exception as err:
+					logger.warning('Invalid XML in %s: %s', location, err)
+					replacements = _fallback(node) if node.nodeType == Node.ELEMENT_NODE else []
+				else:
+					replacements = [document.importNode(included, True)]
+					includeBase[id(replacements[0])] = (baseOf(location), chain + (location,))
+			for replacement in replacements:
+				parent.insertBefore(replacement, node)
+			parent.removeChild(node)
+	logger.warning('Too many nested xi:include, giving up')
@@ -0,0 +1,250 @@
+#   Copyright 2020-2026, Eric Vyncke, evyncke@cisco.com
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+# Base class for the writers and the in-memory objects (tables, figures) passed to them
+# Kept outside of xml2docx.py so that the writers do not load xml2docx a second time when it runs as __main__
+
+import io, os, datetime, itertools
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
+
+# Cross-references travel inside the paragraph text as linkStart + anchor + linkSeparator + text + linkEnd
+# (Unicode private use characters), each writer then renders them as links or keeps only their text
+linkStart = '\ue000'
+linkSeparator = '\ue001'
+linkEnd = '\ue002'
+
+def link(anchor: str, text: str) -> str:
+	return linkStart + anchor + linkSeparator + text + linkEnd
+
+def splitLinks(textValue: str) -> Iterator[Tuple[Optional[str], str]]:
+	# Yields (anchor, text) for the links and (None, text) for the text around them
+	while True:
+		start = textValue.find(linkStart)
+		if start < 0:
+			break
+		separator = textValue.find(linkSeparator, start)
+		end = textValue.find(linkEnd, separator)
+		if start > 0:
+			yield None, textValue[:start]
+		yield textValue[start + 1:separator], textValue[separator + 1:end]
+		textValue = textValue[end + 1:]
+	if textValue != '':
+		yield None, textValue
+
+def plainText(textValue: str) -> str:
+	if textValue is None or linkStart not in textValue:
+		return textValue
+	return ''.join(text for anchor, text in splitLinks(textValue))
+
+class xmlWriter:
+	filename = None  # The filename of the to-be-created file
+	inMiddle = True  # True if we are in the middle part of the document, False if in the back part
+	memoryBudget = None  # Bytes, when set the writers spool their pending output to temporary files
+	spoolItemBytes = 2048  # Rough memory used by one pending paragraph (minidom subtree or kramdown string)
+	reproducible = False  # When True, the same input always gives the same output bytes (no current time anywhere)
+	resolvesIncludes = True  # False: the xi:include, <?rfc include?> and external entities are never fetched
+
+	def __init__(self, filename: Optional[str] = None) -> None:
+		self.filename = filename
+		self.inMiddle = True  # Start in the middle part
+		# Same states to be kept
+		self.metaData = {}  # A dict for slugs: authors, date, keywords, title
+		self.abstract = []  # A list of paragraphs in the abstract
+		self.normativeReferences = []  # A list of normative references
+		self.informativeReferences = []  # A list of informative references
+		self.anchors = {}  # The anchorTarget of every anchor in the document, by anchor
+
+	def save(self, stream: Optional[io.IOBase] = None) -> None:
+		pass
+
+	def buildDate(self) -> datetime.datetime:
+		# Date of the generated files: now or, in reproducible mode, SOURCE_DATE_EPOCH else the date of the draft
+		if not self.reproducible:
+			return datetime.datetime.utcnow()
+		if os.environ.get('SOURCE_DATE_EPOCH'):  # See https://reproducible-builds.org/specs/source-date-epoch/
+			return datetime.datetime.utcfromtimestamp(int(os.environ['SOURCE_DATE_EPOCH']))
+		epoch = datetime.datetime(1980, 1, 1)  # The oldest date in a zip file
+		if self.getMetaData('date') is not None:
+			return myParseDate(self.getMetaData('date')[0], epoch)
+		return epoch
+
+	def overMemoryBudget(self, pendingItems: int) -> bool:
+		# The pending output may only use a small share of the budget, the source tree needs the rest
+		return self.memoryBudget is not None and pendingItems * self.spoolItemBytes >= self.memoryBudget // 8
+
+	def newSpool(self) -> io.IOBase:
+		# Text file kept in memory until it reaches its share of the budget, then rolled over to disk
+		import tempfile
+		return tempfile.SpooledTemporaryFile(max_size = self.memoryBudget // 8, mode = 'w+', encoding = 'utf-8')
+
+	def getMetaData(self, slug: str) -> Optional[List[str]]:
+		if slug in self.metaData:
+			return self.metaData[slug]
+		else:
+			return None
+	
+	def setMetaData(self, slug: str, value: str) -> None:
+		if slug in self.metaData:
+			self.metaData[slug].append(value)
+		else:
+			self.metaData[slug] = [value]
+
+	# Section-parallel rendering: a writer renders a single section in a worker process and returns
+	# its output as a picklable fragment, the main writer then merges the fragments in document order
+	def startFragment(self) -> None:
+		pass
+
+	def getFragment(self) -> Dict[str, Any]:
+		return {'metaData': self.metaData, 'abstract': self.abstract,
+			'normativeReferences': self.normativeReferences, 'informativeReferences': self.informativeReferences}
+
+	def addFragment(self, fragment: Dict[str, Any]) -> None:
+		for slug, values in fragment['metaData'].items():
+			for value in values:
+				xmlWriter.setMetaData(self, slug, value)  # Without the side effects of the subclasses
+		self.abstract.extend(fragment['abstract'])
+		self.normativeReferences.extend(fragment['normativeReferences'])
+		self.informativeReferences.extend(fragment['informativeReferences'])
+
+# TODO: this does not allow for parts of the text being in italics or bold...
+# => should use run elements notably in the docxWriter with <w:r> children inside a <w:p> element
+# then update the parsiing of the text to handle the <tt>, <em> and <b> tags 
+	def newParagraph(self, 
+				  textValue: str,
+				  style: str = 'Normal',
+				  justification: Optional[str] = None,
+				  unnumbered: Optional[bool] = None,
+				  numberingID: Optional[str] = None,
+				  indentationLevel: Optional[str] = None,
+				  removeEmpty: bool = True,
+				  language: str = 'en-US',
+				  cdataSection: Optional[bool] = None,
+				  anchor: Optional[str] = None) -> None:
+		# As parseText() is the same  for front and body elements 
+		if style is not None and style == "Abstract":
+			self.abstract.append(plainText(textValue))
+
+	def newTable(self, table: 'tableTable') -> None:
+		pass
+
+	def newFigure(self, figure: 'figureFigure') -> None:
+		pass
+			  
+class anchorTarget:
+	kind: str  # section, appendix, figure, table or reference
+	number: Optional[str]  # e.g., '3.2', 'A.1' or '4', None for unnumbered sections and references
+	title: Optional[str]
+	id: int  # Unique in the document, e.g., for the docx bookmarks
+
+	def __init__(self, kind: str, number: Optional[str], title: Optional[str], id: int) -> None:
+		self.kind = kind
+		self.number = number
+		self.title = title
+		self.id = id
+
+class tableTable:
+	name: Optional[str] 
+	rows: List['tableRow']
+	anchor: Optional[str] = None
+
+	def __init__(self, name: Optional[str] = None) -> None:
+		self.name = name
+		self.rows = []
+
+	def addRow(self, row: 'tableRow') -> None:
+		self.rows.append(row)
+
+	def setName(self, name: str) -> None:
+		self.name = name
+
+class tableRow:
+	cells: List['tableCell'] = []
+	rowType: Optional[str] = None  # thead, tbody, tfoot
+
+	def __init__(self, rowType: str) -> None:
+		self.cells = []
+		self.rowType = rowType
+
+	def addCell(self, cell: 'tableCell') -> None:
+		self.cells.append(cell)
+		
+class tableCell:
+	text: Optional[str] = None
+
+	def __init__(self, text: Optional[str] = None) -> None:
+		self.text = text
+
+class figureImage:
+	# An artwork that is not ASCII art, kept as found in the draft until the writer saves it
+	contentType: str  # image/svg+xml or image/png
+	data: str  # The SVG document or, when isBase64, the base64 encoded image
+	isBase64: bool
+	alt: Optional[str] = None
+
+	def __init__(self, contentType: str, data: str, isBase64: bool, alt: Optional[str] = None) -> None:
+		import re
+		self.contentType = contentType
+		self.data = re.sub(r'\s+', '', data) if isBase64 and re.search(r'\s', data) else data
+		self.isBase64 = isBase64
+		self.alt = alt
+
+	def chunks(self, size: int = 64 * 1024) -> Iterator[bytes]:
+		# The image bytes piece by piece, so that hashing and compressing never need a decoded copy of the whole
+		# image, but its text (base64 or SVG) is kept in full in data
+		import base64
+		if self.isBase64:
+			size -= size % 4  # Each 4 base64 characters give 3 bytes
+			for start in range(0, len(self.data), size):
+				yield base64.b64decode(self.data[start:start + size])
+		else:
+			for start in range(0, len(self.data), size):
+				yield self.data[start:start + size].encode('utf-8')
+
+class figureFigure:
+	name: Optional[str] = None
+	images: List[figureImage]  # e.g., the SVG alternative of an <artset>, a writer may prefer them to the rows
+	anchor: Optional[str] = None
+
+	def __init__(self, name: Optional[str] = None) -> None:
+		self.name = name
+		self._rows = []  # Iterables of rows, in document order
+		self.images = []
+
+	def addRow(self, row: str) -> None:
+		self._rows.append((row,))
+
+	def addRows(self, rows: Iterable[str]) -> None:
+		# Kept as is, a generator only yields its rows when the writer iterates over them
+		self._rows.append(rows)
+
+	@property
+	def rows(self) -> Iterator[str]:
+		# All the rows, lazily: a writer iterates over them only once
+		return itertools.chain.from_iterable(self._rows)
+
+	def addImage(self, image: figureImage) -> None:
+		self.images.append(image)
+
+	def setName(self, name: str) -> None:
+		self.name = name
+
+def myParseDate(s: str, default: Optional[datetime.datetime] = None) -> datetime.datetime:
+	# default is returned when s cannot be parsed, now if not specified
+	# Short then full length month names, a draft dated by month and year only is dated the 1st of the month
+	for dateFormat in ('%d %b %Y', '%d %B %Y', '%b %Y', '%B %Y'):
+		try:
+			return datetime.datetime.strptime(s.strip(), dateFormat)
+		except ValueError:
+			pass
+	return default if default is not None else datetime.datetime.utcnow()  # Giving up...